@@ -0,0 +1,332 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Bump whenever the scenarios or the result format change, so old baselines are not compared.
+BENCHMARK_VERSION = 2
+
+SCRIPT_PATH = Path(__file__).resolve().parent.parent / "generate_context_markdown.py"
+DEFAULT_OUTPUT = Path(__file__).resolve().parent / "results.json"
+
+# A phase must be this much slower than the baseline (and by at least
+# MIN_REGRESSION_SECONDS) to count as a regression.
+REGRESSION_TOLERANCE = 0.25
+MIN_REGRESSION_SECONDS = 0.05
+
+# --- Scenarios ---
+# files: source files to create; depth: directory nesting; gitignore_patterns:
+# root .gitignore size; binary_blobs / oversized_files: extra special files.
+SCENARIOS: Dict[str, Dict[str, int]] = {
+    "1k": {"files": 1000, "depth": 3, "gitignore_patterns": 20, "binary_blobs": 10, "oversized_files": 1},
+    "10k": {"files": 10000, "depth": 4, "gitignore_patterns": 50, "binary_blobs": 50, "oversized_files": 2},
+    "100k": {"files": 100000, "depth": 5, "gitignore_patterns": 50, "binary_blobs": 200, "oversized_files": 4},
+    "deep_nesting": {"files": 5000, "depth": 40, "gitignore_patterns": 20, "binary_blobs": 0, "oversized_files": 0},
+    "large_gitignore": {"files": 10000, "depth": 4, "gitignore_patterns": 2000, "binary_blobs": 0, "oversized_files": 0},
+    "binary_and_oversized": {"files": 2000, "depth": 3, "gitignore_patterns": 20, "binary_blobs": 500, "oversized_files": 8},
+}
+
+# Options passed to generate_context_markdown. Unlike the runner default, a 1 MiB
+# max_file_bytes is set so that the oversized files exercise the placeholder path.
+GENERATOR_OPTIONS = {
+    "project_name": "Benchmark",
+    "max_output_characters": 500000,
+    "split_output_if_truncated": True,
+    "workers": 8,
+    "max_file_bytes": 1024 * 1024,
+}
+
+PYTHON_TEMPLATE = '''import os
+from typing import List
+
+
+class Widget{index}:
+    """A synthetic class used by the benchmark."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def render(self, items: List[str]) -> str:
+        # Join the items with the widget name
+        return os.sep.join([self.name] + items)
+'''
+
+
+def build_synthetic_repo(root: Path, files: int, depth: int, gitignore_patterns: int, binary_blobs: int, oversized_files: int, seed: int = 0) -> Dict[str, int]:
+    """
+    Creates a deterministic synthetic project under `root`.
+
+    Source files (mostly Python, some JavaScript, JSON and Markdown) are spread
+    over directories nested `depth` levels deep. A root .gitignore holds
+    `gitignore_patterns` patterns of every kind (names, suffixes, anchored
+    paths, `**`), with a few nested .gitignore files and ignored directories
+    full of files that the walk should prune. Binary blobs and oversized
+    text files (larger than STREAMING_THRESHOLD_BYTES) are added on top.
+
+    Args:
+        root (Path): An empty directory to fill.
+        files (int): The number of source files to create.
+        depth (int): How deeply directories are nested.
+        gitignore_patterns (int): The number of patterns in the root .gitignore.
+        binary_blobs (int): The number of binary files to create.
+        oversized_files (int): The number of text files of 2 MiB to create.
+        seed (int): The random seed, so every run builds the same tree.
+
+    Returns:
+        Dict[str, int]: The number of files and total bytes created.
+    """
+    rng = random.Random(seed)
+    # About 25 files per directory, at random depths of 1 to `depth` levels
+    directory_set = set()
+    for _ in range(max(1, files // 25)):
+        directory_set.add("".join(f"d{rng.randrange(4)}/" for _ in range(1 + rng.randrange(depth))))
+    directories = sorted(directory_set)
+
+    created_files = 0
+    created_bytes = 0
+
+    def write(relative_path: str, data: bytes) -> None:
+        nonlocal created_files, created_bytes
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        created_files += 1
+        created_bytes += len(data)
+
+    for index in range(files):
+        directory = directories[index % len(directories)]
+        kind = rng.random()
+        if kind < 0.7:
+            content = PYTHON_TEMPLATE.format(index=index) * rng.randint(1, 6)
+            write(f"{directory}module_{index}.py", content.encode("utf-8"))
+        elif kind < 0.85:
+            content = f"export function widget{index}(name) {{\n  return name + '{index}';\n}}\n" * rng.randint(1, 20)
+            write(f"{directory}widget_{index}.js", content.encode("utf-8"))
+        elif kind < 0.95:
+            write(f"{directory}data_{index}.json", json.dumps({"id": index, "values": list(range(rng.randint(1, 200)))}, indent=2).encode("utf-8"))
+        else:
+            write(f"{directory}notes_{index}.md", f"# Notes {index}\n\n".encode("utf-8") + b"Some text.\n" * rng.randint(1, 50))
+
+    # --- .gitignore rules and the ignored content they prune ---
+    pattern_kinds = [
+        lambda i: f"ignored_name_{i}",
+        lambda i: f"*.ext{i}",
+        lambda i: f"/anchored_{i}/",
+        lambda i: f"**/generated_{i}/**",
+        lambda i: f"build_{i}/*.o",
+        lambda i: f"cache_[0-9]{i}?",
+    ]
+    patterns = ["node_modules/", "*.pyc", "dist/"]
+    patterns += [pattern_kinds[i % len(pattern_kinds)](i) for i in range(max(0, gitignore_patterns - len(patterns)))]
+    write(".gitignore", ("\n".join(patterns) + "\n").encode("utf-8"))
+    for index, directory in enumerate(directories[:: max(1, len(directories) // 10)]):
+        write(f"{directory}.gitignore", f"*.log\n!keep_{index}.log\nlocal_{index}/\n".encode("utf-8"))
+    for index in range(min(files // 10, 2000)):
+        directory = directories[index % len(directories)]
+        write(f"{directory}node_modules/pkg_{index}/index.js", b"module.exports = {};\n")
+        write(f"{directory}debug_{index}.log", b"log line\n")
+
+    # --- Binary blobs and oversized files ---
+    for index in range(binary_blobs):
+        directory = directories[index % len(directories)]
+        header = [b"\x89PNG\r\n\x1a\n", b"PK\x03\x04", b"\x7fELF", b""][index % 4]
+        write(f"{directory}blob_{index}.bin", header + bytes(rng.getrandbits(8) for _ in range(rng.randint(256, 16384))))
+    for index in range(oversized_files):
+        line = f"# Oversized file {index} line with some padding text to make it longer\n".encode("utf-8")
+        write(f"oversized/huge_{index}.py", line * (2 * 1024 * 1024 // len(line)))
+
+    (root / "README.md").write_text("# Benchmark\n\nA synthetic project.\n", encoding="utf-8")
+    return {"files": created_files, "bytes": created_bytes}
+
+
+def load_generator(project_root: Path):
+    """Copies the generator into `project_root/scripts/` (it locates the project from its own path) and imports it."""
+    scripts_dir = project_root / "scripts"
+    scripts_dir.mkdir(exist_ok=True)
+    script_copy = scripts_dir / "generate_context_markdown.py"
+    shutil.copyfile(SCRIPT_PATH, script_copy)
+    spec = importlib.util.spec_from_file_location("generate_context_markdown_benchmark", script_copy)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def peak_memory_kib() -> Optional[int]:
+    """The peak resident set size of this process in KiB, or None where unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak # Bytes on macOS, KiB elsewhere
+
+
+def run_phases(project_root: Path) -> Dict[str, Any]:
+    """
+    Times each phase of a generation against an existing synthetic tree.
+
+    Runs in a child process (see `run_scenario`) so that peak memory belongs
+    to this scenario alone.
+
+    Returns:
+        Dict[str, Any]: Seconds per phase, path counts and peak memory.
+    """
+    generator = load_generator(project_root)
+    phases: Dict[str, float] = {}
+    counts: Dict[str, int] = {}
+
+    # Walk: enumerate everything, no filtering
+    start_time = time.perf_counter()
+    all_files, _ = generator._walk_project(project_root, lambda path_str, is_dir: False, [])
+    phases["walk"] = time.perf_counter() - start_time
+    counts["paths_walked"] = len(all_files)
+
+    # Ignore filtering: a .gitignore decision for every file and directory
+    all_dirs = sorted({os.path.dirname(p) for p in all_files} - {""})
+    matcher = generator.GitIgnoreMatcher(project_root)
+    start_time = time.perf_counter()
+    ignored = sum(1 for p in all_dirs if matcher.is_ignored(p, True)) + sum(1 for p in all_files if matcher.is_ignored(p, False))
+    phases["ignore_filtering"] = time.perf_counter() - start_time
+    counts["ignore_decisions"] = len(all_dirs) + len(all_files)
+    counts["ignored_paths"] = ignored
+
+    # Filtered walk: the walk as the generator does it, pruning ignored directories
+    start_time = time.perf_counter()
+    filtering_matcher = generator.GitIgnoreMatcher(project_root)
+    eligible_files, _ = generator._walk_project(project_root, filtering_matcher.is_ignored, [])
+    phases["filtered_walk"] = time.perf_counter() - start_time
+    counts["eligible_files"] = len(eligible_files)
+
+    # Reads: the raw bytes of every eligible file
+    start_time = time.perf_counter()
+    bytes_read = 0
+    for path_str in eligible_files:
+        with open(project_root / path_str, "rb") as f:
+            bytes_read += len(f.read())
+    phases["read"] = time.perf_counter() - start_time
+    counts["bytes_read"] = bytes_read
+
+    # End-to-end generation, cold and with a warm incremental cache. The
+    # generator's own profile report splits each run into its phases.
+    profile_path = project_root / "output" / "project_context.profile.json"
+    for phase_name in ("generate_cold", "generate_warm"):
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator.generate_context_markdown(use_cache=True, profile=True, **GENERATOR_OPTIONS)
+        phases[phase_name] = time.perf_counter() - start_time
+        with open(profile_path, "r", encoding="utf-8") as f:
+            profile_report = json.load(f)
+        for generator_phase, seconds in profile_report["phase_seconds"].items():
+            phases[f"{phase_name}.{generator_phase}"] = seconds
+        phases[f"{phase_name}.render_summed"] = profile_report["render_seconds_summed"]
+        phases[f"{phase_name}.write"] = profile_report["write_seconds"]
+        counts[f"{phase_name}.gitignore_regex_evaluations"] = profile_report["counts"]["gitignore_regex_evaluations"]
+        counts[f"{phase_name}.bytes_written"] = profile_report["bytes_written"]
+
+    return {"phases": phases, "counts": counts, "peak_memory_kib": peak_memory_kib()}
+
+
+def run_scenario(name: str, work_dir: Path, keep: bool) -> Dict[str, Any]:
+    """Builds the tree of scenario `name`, then times it in a fresh child process."""
+    project_root = work_dir / name
+    if project_root.exists():
+        shutil.rmtree(project_root)
+    project_root.mkdir(parents=True)
+    start_time = time.perf_counter()
+    tree = build_synthetic_repo(project_root, **SCENARIOS[name])
+    build_seconds = time.perf_counter() - start_time
+    try:
+        child = subprocess.run(
+            [sys.executable, __file__, "--measure", str(project_root)],
+            capture_output=True, text=True, check=True
+        )
+    finally:
+        if not keep:
+            shutil.rmtree(project_root, ignore_errors=True)
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+    result["tree"] = tree
+    result["build_seconds"] = build_seconds
+    return result
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """
+    Lists the phases that got slower than the baseline by more than
+    REGRESSION_TOLERANCE and MIN_REGRESSION_SECONDS.
+    """
+    if baseline.get("version") != BENCHMARK_VERSION:
+        return [f"Baseline version {baseline.get('version')} does not match benchmark version {BENCHMARK_VERSION}; not compared."]
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        baseline_scenario = baseline.get("scenarios", {}).get(name)
+        if not baseline_scenario:
+            continue
+        for phase, seconds in scenario["phases"].items():
+            baseline_seconds = baseline_scenario["phases"].get(phase)
+            if baseline_seconds is None:
+                continue
+            if seconds > baseline_seconds * (1 + REGRESSION_TOLERANCE) and seconds - baseline_seconds > MIN_REGRESSION_SECONDS:
+                regressions.append(f"{name}/{phase}: {baseline_seconds:.3f}s -> {seconds:.3f}s ({(seconds / baseline_seconds - 1) * 100:.0f}% slower)")
+    return regressions
+
+
+if __name__ == "__main__":
+    """
+    Builds synthetic trees, times each phase of the generator on them and
+    writes the results to a JSON file that later runs can be compared against.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark generate_context_markdown on synthetic trees.")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS), help="Scenarios to run (default: all).")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="Where to write the JSON results.")
+    parser.add_argument("--baseline", type=Path, help="A previous results file; exits with status 1 if a phase regressed.")
+    parser.add_argument("--work-dir", type=Path, help="Where to build the trees (default: a temporary directory).")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic trees after the run.")
+    parser.add_argument("--measure", type=Path, help=argparse.SUPPRESS) # Internal: time an existing tree in this process
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(run_phases(args.measure)))
+        sys.exit(0)
+
+    work_dir = args.work_dir or Path(tempfile.mkdtemp(prefix="context_benchmark_"))
+    results: Dict[str, Any] = {
+        "version": BENCHMARK_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scenarios": {},
+    }
+    for name in args.scenarios:
+        print(f"--- Scenario '{name}' ---")
+        scenario_result = run_scenario(name, work_dir, args.keep)
+        results["scenarios"][name] = scenario_result
+        for phase, seconds in scenario_result["phases"].items():
+            print(f"  {phase}: {seconds:.3f}s")
+        print(f"  peak memory: {scenario_result['peak_memory_kib']} KiB")
+    if not args.work_dir and not args.keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to '{args.output}'.")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f))
+        if regressions:
+            print("\n--- Regressions against the baseline ---")
+            for regression in regressions:
+                print(f"- {regression}")
+            sys.exit(1)
+        print("No regressions against the baseline.")
@@ -1,10 +1,1787 @@
+import ast
+import codecs
+import hashlib
+import io
+import itertools
+import json
+import math
 import os
+import posixpath
+import stat
 from pathlib import Path
 from datetime import datetime
 import re
-from typing import List, Tuple, Optional
+import struct
+import sys
+import time
+import tokenize
+import types
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Tuple, Optional, Union
 
-def generate_context_markdown(
+# Bump whenever the rendered block format changes so stale caches are discarded.
+CACHE_MANIFEST_VERSION = 6
+
+# Files at least this large are never held in memory as a whole: they are
+# validated and measured in chunks, then copied into the part file in chunks.
+STREAMING_THRESHOLD_BYTES = 1024 * 1024
+COPY_CHUNK_SIZE = 64 * 1024
+
+# How much of each file is probed for binary content before it is read in full.
+SNIFF_BYTES = 8192
+
+# Files rendered per thread-pool task when `workers` > 1
+RENDER_BATCH_SIZE = 16
+
+# Signatures of common binary formats, checked against the start of each file.
+BINARY_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "PNG image"),
+    (b"\xff\xd8\xff", "JPEG image"),
+    (b"GIF87a", "GIF image"),
+    (b"GIF89a", "GIF image"),
+    (b"%PDF-", "PDF document"),
+    (b"PK\x03\x04", "ZIP archive"),
+    (b"\x1f\x8b", "gzip archive"),
+    (b"7z\xbc\xaf\x27\x1c", "7-Zip archive"),
+    (b"Rar!\x1a\x07", "RAR archive"),
+    (b"\x7fELF", "ELF executable"),
+    (b"\x93NUMPY", "NumPy array"),
+    (b"SQLite format 3\x00", "SQLite database"),
+    (b"\x00asm", "WebAssembly module"),
+    (b"OggS", "Ogg media"),
+    (b"RIFF", "RIFF media"),
+    (b"\x1aE\xdf\xa3", "Matroska/WebM video"),
+]
+
+# File names that are always produced by a tool: package manager lockfiles.
+LOCKFILE_NAMES = {
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lock",
+    "composer.lock", "Gemfile.lock", "Cargo.lock", "poetry.lock", "Pipfile.lock", "uv.lock",
+    "pdm.lock", "go.sum", "flake.lock", "mix.lock", "pubspec.lock", "Podfile.lock",
+}
+# Suffixes of generated files, with what they are.
+GENERATED_FILE_SUFFIXES = [
+    (".min.js", "minified bundle"),
+    (".min.css", "minified stylesheet"),
+    (".map", "source map"),
+    (".snap", "test snapshot"),
+    ("_pb2.py", "protobuf module"),
+    (".pb.go", "protobuf module"),
+]
+# Markers that code generators put at the start of a comment line in the
+# file's leading comments: "@generated", Go's "Code generated ... DO NOT EDIT."
+# and protoc's "Generated by the protocol buffer compiler.  DO NOT EDIT!".
+COMMENT_LINE_RE = re.compile(rb"[ \t]*(?:#|//|/\*+|\*|--|<!--|;)[ \t]*(.*?)[ \t]*(?:\*/|-->)?[ \t]*\r?$")
+GENERATED_MARKER_RE = re.compile(rb"@generated\b|Code generated .* DO NOT EDIT\.|Generated by .* DO NOT EDIT\b")
+GENERATED_MARKER_BYTES = 1024
+# Suffixes of files that hold data rather than code.
+DATA_FILE_SUFFIXES = (".csv", ".tsv", ".json", ".jsonl", ".ndjson", ".geojson", ".xml", ".yaml", ".yml", ".sql")
+# Data files at least this large with at least this many (estimated) lines are data-heavy.
+DATA_FILE_MIN_BYTES = 64 * 1024
+DATA_FILE_MIN_LINES = 2000
+# The line-length and entropy heuristics need at least this much of a sample.
+CLASSIFY_MIN_SAMPLE_BYTES = 1024
+# Sampled lines this long on average (or a line this long) with this little
+# whitespace look minified. Prose and code are 20-30% whitespace.
+MINIFIED_AVERAGE_LINE_LENGTH = 200
+MINIFIED_MAX_LINE_LENGTH = 1000
+MINIFIED_MAX_WHITESPACE_RATIO = 0.1
+# Source code and prose sample at 4-5 bits per ASCII byte; base64 at about 6.
+# Non-ASCII bytes are left out, as multi-byte UTF-8 text inflates the figure.
+ENCODED_DATA_MIN_ENTROPY = 5.5
+NON_ASCII_BYTES = bytes(range(128, 256))
+
+# Average number of ASCII characters per model token for each fence language,
+# measured on typical BPE tokenizers. Non-ASCII characters (CJK in particular)
+# are counted as roughly one token each.
+CHARACTERS_PER_TOKEN = {
+    "python": 3.6,
+    "json": 2.8,
+    "markdown": 4.2,
+    "text": 3.8,
+}
+
+
+def _gitignore_glob_to_regex(pattern: str) -> str:
+    """
+    Translates the glob part of a single .gitignore pattern into a regex body.
+
+    `*` and `?` never cross a `/`, `[...]` is a character class and `**`
+    follows Git's rules: a leading `**/` matches in all directories, a
+    trailing `/**` matches everything inside and `/**/` matches zero or
+    more directories.
+    """
+    regex_parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i) and (i == 0 or pattern[i - 1] == '/'):
+                after = i + 2
+                if after == n:
+                    regex_parts.append('.*')
+                    i = after
+                    continue
+                if pattern[after] == '/':
+                    regex_parts.append('(?:.*/)?')
+                    i = after + 1
+                    continue
+            while i < n and pattern[i] == '*':
+                i += 1
+            regex_parts.append('[^/]*')
+            continue
+        if c == '?':
+            regex_parts.append('[^/]')
+        elif c == '[':
+            # A ']' directly after '[' (or '[!') is a literal member of the class
+            end = pattern.find(']', i + 3 if pattern.startswith(('[!', '[^'), i) else i + 2)
+            if end == -1:
+                regex_parts.append(re.escape(c))
+            else:
+                char_class = pattern[i + 1:end]
+                if char_class[0] in '!^':
+                    char_class = '^' + char_class[1:].replace('\\', '\\\\')
+                else:
+                    char_class = char_class.replace('\\', '\\\\')
+                regex_parts.append(f"[{char_class}]")
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            regex_parts.append(re.escape(pattern[i]))
+        else:
+            regex_parts.append(re.escape(c))
+        i += 1
+    return "".join(regex_parts)
+
+
+# Unanchored patterns that are a plain name ("node_modules") or a star followed
+# by a plain dotted suffix ("*.log", "*.tar.gz") are answered by dict lookups
+# instead of regexes, which covers the bulk of real-world .gitignore files.
+_GLOB_SPECIAL_CHARACTERS = re.compile(r"[*?\[\\]")
+_PLAIN_SUFFIX_PATTERN = re.compile(r"\*(\.[^*?\[\\/]+)")
+
+
+class _RegexBuckets:
+    """
+    Glob regexes bucketed by a literal prefix of their subject, so that a
+    subject is only tried against the patterns that could match it. Python's
+    `re` tries the alternatives of an alternation one by one, so one large
+    alternation costs time in proportion to the number of patterns.
+    """
+
+    def __init__(self):
+        self._alternatives: Dict[str, List[str]] = {} # Literal prefix ("" = any) -> alternatives
+        self._regexes: Dict[str, Any] = {}
+        self._prefix_lengths: List[int] = []
+        self.evaluations = 0 # Regexes run so far, for profiling
+
+    def add(self, prefix: str, alternative: str) -> None:
+        self._alternatives.setdefault(prefix, []).append(alternative)
+
+    def compile(self) -> None:
+        # Reversed so that the first alternative that matches has the highest index
+        self._regexes = {prefix: re.compile("|".join(reversed(alternatives))) for prefix, alternatives in self._alternatives.items()}
+        self._prefix_lengths = sorted({len(prefix) for prefix in self._regexes})
+
+    def best_match(self, subject: str) -> Tuple[int, bool]:
+        """Returns the highest matching pattern index and whether it is negated ((-1, False) if none)."""
+        best_index, best_is_negated = -1, False
+        for prefix_length in self._prefix_lengths:
+            regex = self._regexes.get(subject[:prefix_length])
+            if regex is None:
+                continue
+            self.evaluations += 1
+            match = regex.fullmatch(subject)
+            if match is not None:
+                group = match.lastgroup
+                index = int(group[1:])
+                if index > best_index:
+                    best_index, best_is_negated = index, group[0] == 'n'
+        return best_index, best_is_negated
+
+
+def _literal_prefix(glob: str) -> str:
+    """The part of a glob before its first special character."""
+    special = _GLOB_SPECIAL_CHARACTERS.search(glob)
+    return glob[:special.start()] if special else glob
+
+
+class GitIgnoreRules:
+    """
+    The compiled rules of a single .gitignore file.
+
+    Each pattern gets an index, and Git's "last matching pattern wins" rule
+    becomes "highest matching index wins". Plain-name and `*.suffix` patterns
+    are indexed in dicts keyed by the basename and its dotted suffixes, and
+    `**/name/**` patterns in a dict of ancestor directory names. `**/glob`
+    without another slash is the same as `glob`. The remaining patterns are
+    folded into alternation regexes over the basename and over the path,
+    bucketed by their literal prefix (see `_RegexBuckets`). Separate tables
+    are kept for files and directories, since `foo/` only matches
+    directories. Per-path cost is therefore a few dict lookups plus a few
+    regex evaluations, even for files with thousands of patterns.
+    """
+
+    def __init__(self, base_dir: str, lines: List[str]):
+        """
+        Args:
+            base_dir (str): The POSIX path of the directory holding the
+                            .gitignore, relative to the project root ("" for
+                            the root itself).
+            lines (List[str]): The raw lines of the .gitignore file.
+        """
+        self.base_prefix = base_dir + "/" if base_dir else ""
+        # One table per entry kind: index 0 for files, index 1 for directories
+        self._names: Tuple[Dict[str, Tuple[int, bool]], ...] = ({}, {})
+        self._suffixes: Tuple[Dict[str, Tuple[int, bool]], ...] = ({}, {})
+        self._ancestor_names: Tuple[Dict[str, Tuple[int, bool]], ...] = ({}, {})
+        self._basename_buckets = (_RegexBuckets(), _RegexBuckets())
+        self._path_buckets = (_RegexBuckets(), _RegexBuckets())
+        self.pattern_count = 0
+        for index, raw_line in enumerate(lines):
+            line = raw_line.rstrip('\r\n')
+            # Trailing spaces are ignored unless they are escaped with a backslash
+            stripped = line.rstrip(' ')
+            if stripped.endswith('\\') and len(stripped) < len(line):
+                stripped += ' '
+            line = stripped
+            if not line or line.startswith('#'):
+                continue
+
+            is_negated = line.startswith('!')
+            if is_negated:
+                line = line[1:]
+
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            self.pattern_count += 1
+            kinds = (1,) if dir_only else (0, 1)
+
+            # "**/glob" matches at any depth, exactly like "glob" without a slash
+            while line.startswith('**/') and '/' not in line[3:].rstrip('/'):
+                line = line[3:]
+            # "**/name/**" matches everything inside any directory called "name"
+            if line.startswith('**/') and line.endswith('/**') and line.count('/') == 2 and \
+                    not _GLOB_SPECIAL_CHARACTERS.search(line[3:-3]):
+                for kind in kinds:
+                    self._ancestor_names[kind][line[3:-3]] = (index, is_negated)
+                continue
+
+            # A slash at the beginning or in the middle anchors the pattern to
+            # the directory of the .gitignore; otherwise it matches the basename
+            # at any depth.
+            if '/' in line:
+                path_glob = line.lstrip('/')
+                alternative = f"(?P<{'n' if is_negated else 'i'}{index}>{_gitignore_glob_to_regex(path_glob)})"
+                for kind in kinds:
+                    self._path_buckets[kind].add(_literal_prefix(path_glob), alternative)
+                continue
+
+            suffix_match = _PLAIN_SUFFIX_PATTERN.fullmatch(line)
+            if suffix_match:
+                for kind in kinds:
+                    self._suffixes[kind][suffix_match.group(1)] = (index, is_negated)
+            elif not _GLOB_SPECIAL_CHARACTERS.search(line):
+                for kind in kinds:
+                    self._names[kind][line] = (index, is_negated)
+            else:
+                alternative = f"(?P<{'n' if is_negated else 'i'}{index}>{_gitignore_glob_to_regex(line)})"
+                for kind in kinds:
+                    self._basename_buckets[kind].add(_literal_prefix(line), alternative)
+
+        for buckets in self._basename_buckets + self._path_buckets:
+            buckets.compile()
+
+    @property
+    def regex_evaluations(self) -> int:
+        """The number of regexes run by `match` so far."""
+        return sum(buckets.evaluations for buckets in self._basename_buckets + self._path_buckets)
+
+    def match(self, relative_path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Returns True if the path is ignored, False if it is explicitly
+        re-included with `!`, or None if no pattern of this file applies.
+        """
+        if not relative_path.startswith(self.base_prefix):
+            return None
+        local_path = relative_path[len(self.base_prefix):]
+        basename = local_path.rpartition('/')[2]
+        kind = 1 if is_dir else 0
+        best_index, best_is_negated = -1, False
+
+        name_rule = self._names[kind].get(basename)
+        if name_rule is not None:
+            best_index, best_is_negated = name_rule
+
+        suffixes = self._suffixes[kind]
+        if suffixes:
+            dot = basename.find('.')
+            while dot != -1:
+                suffix_rule = suffixes.get(basename[dot:])
+                if suffix_rule is not None and suffix_rule[0] > best_index:
+                    best_index, best_is_negated = suffix_rule
+                dot = basename.find('.', dot + 1)
+
+        ancestor_names = self._ancestor_names[kind]
+        if ancestor_names:
+            for ancestor_name in local_path.split('/')[:-1]:
+                ancestor_rule = ancestor_names.get(ancestor_name)
+                if ancestor_rule is not None and ancestor_rule[0] > best_index:
+                    best_index, best_is_negated = ancestor_rule
+
+        for buckets, subject in ((self._basename_buckets[kind], basename), (self._path_buckets[kind], local_path)):
+            index, is_negated = buckets.best_match(subject)
+            if index > best_index:
+                best_index, best_is_negated = index, is_negated
+
+        if best_index < 0:
+            return None
+        return not best_is_negated
+
+
+class GitIgnoreMatcher:
+    """
+    Resolves ignore decisions against the root .gitignore and every nested
+    .gitignore below it.
+
+    Each directory's chain of applicable rule files is built once and cached,
+    and deeper files take precedence over shallower ones, as in Git. Like Git,
+    the matcher expects callers to prune ignored directories: it does not
+    re-check ancestors, so files inside an ignored directory are only excluded
+    if the walk never descends into it.
+    """
+
+    def __init__(self, project_root: Path, gitignore_filename: str = ".gitignore"):
+        self.project_root = project_root
+        self.gitignore_filename = gitignore_filename
+        self._chains: Dict[str, Tuple[GitIgnoreRules, ...]] = {}
+        self._loaded_rules: List[GitIgnoreRules] = []
+
+    @property
+    def regex_evaluations(self) -> int:
+        """The number of regexes run by all loaded .gitignore files so far."""
+        return sum(rules.regex_evaluations for rules in self._loaded_rules)
+
+    @property
+    def gitignore_files_loaded(self) -> int:
+        return len(self._loaded_rules)
+
+    def _load_rules(self, relative_dir: str) -> Optional[GitIgnoreRules]:
+        gitignore_path = os.path.join(self.project_root, relative_dir, self.gitignore_filename)
+        if not os.path.isfile(gitignore_path):
+            return None
+        with open(gitignore_path, 'r', encoding='utf-8', errors='replace') as f:
+            rules = GitIgnoreRules(relative_dir, f.readlines())
+        if not rules.pattern_count:
+            return None
+        self._loaded_rules.append(rules)
+        return rules
+
+    def rules_for_directory(self, relative_dir: str) -> Tuple[GitIgnoreRules, ...]:
+        """Returns the rule files that apply to entries of `relative_dir`, shallowest first."""
+        chain = self._chains.get(relative_dir)
+        if chain is None:
+            chain = self.rules_for_directory(posixpath.dirname(relative_dir)) if relative_dir else ()
+            rules = self._load_rules(relative_dir)
+            if rules is not None:
+                chain = chain + (rules,)
+            self._chains[relative_dir] = chain
+        return chain
+
+    def is_ignored(self, relative_path: str, is_dir: bool) -> bool:
+        """Checks a POSIX path relative to the project root against the applicable rules."""
+        for rules in reversed(self.rules_for_directory(posixpath.dirname(relative_path))):
+            decision = rules.match(relative_path, is_dir)
+            if decision is not None:
+                return decision
+        return False
+
+
+def _decode_text(data: bytes) -> str:
+    """
+    Decodes file bytes the same way `Path.read_text(encoding="utf-8")` does,
+    including universal newline translation. Raises UnicodeDecodeError.
+    """
+    return data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _detect_language(file_path_str: str) -> str:
+    """Returns the Markdown code fence language for a file path."""
+    if file_path_str.endswith(".py"):
+        return "python"
+    elif file_path_str.endswith(".json"):
+        return "json"
+    elif file_path_str.endswith(".md"):
+        return "markdown"
+    return "text"
+
+
+def estimate_tokens(text: str, lang: str = "text") -> int:
+    """
+    Estimates the number of model tokens in a piece of text without a tokenizer.
+
+    ASCII characters are divided by the per-language ratio in
+    CHARACTERS_PER_TOKEN; dense text with very little whitespace (minified
+    code, base64, data) gets a lower ratio, and every non-ASCII character
+    counts as about one token.
+
+    Args:
+        text (str): The text to estimate.
+        lang (str): The Markdown fence language the text is rendered with.
+
+    Returns:
+        int: The estimated token count.
+    """
+    if not text:
+        return 0
+    total_characters = len(text)
+    non_ascii_characters = total_characters - len(text.encode("ascii", "ignore"))
+    ascii_characters = total_characters - non_ascii_characters
+    characters_per_token = CHARACTERS_PER_TOKEN.get(lang, CHARACTERS_PER_TOKEN["text"])
+    if ascii_characters > 200:
+        whitespace_characters = text.count(" ") + text.count("\n") + text.count("\t")
+        if whitespace_characters < ascii_characters * 0.05:
+            characters_per_token *= 0.75
+    return math.ceil(ascii_characters / characters_per_token) + non_ascii_characters
+
+
+def _token_estimator_key(token_estimator: Callable[[str, str], int]) -> Optional[str]:
+    """
+    Identifies a token estimator in cache entries, whose token counts are only
+    valid for the estimator that produced them.
+
+    Returns:
+        Optional[str]: The qualified name of a module-level function, which
+        stays the same across runs, or None for lambdas, nested functions,
+        bound methods and callable objects, which cannot be told apart by
+        name: their cached counts are never reused.
+    """
+    qualname = getattr(token_estimator, "__qualname__", "<anonymous>")
+    if isinstance(token_estimator, types.FunctionType) and "<" not in qualname:
+        return f"{token_estimator.__module__}.{qualname}"
+    return None
+
+
+def _sniff_binary(header: bytes, is_complete: bool) -> Optional[str]:
+    """
+    Classifies the first bytes of a file without reading the rest of it.
+
+    Args:
+        header (bytes): Up to SNIFF_BYTES from the start of the file.
+        is_complete (bool): True if `header` is the whole file, so a multi-byte
+                            character cut off at its end is an error.
+
+    Returns:
+        Optional[str]: A human-readable reason if the file looks binary, or
+        None if it looks like UTF-8 text.
+    """
+    for signature, kind in BINARY_SIGNATURES:
+        if header.startswith(signature):
+            return f"File starts with a {kind} signature, likely binary"
+    # MP4/QuickTime files carry their signature at offset 4
+    if header[4:8] == b"ftyp":
+        return "File starts with an MP4/QuickTime signature, likely binary"
+    if b"\x00" in header:
+        return "File contains NUL bytes, likely binary"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(header, final=is_complete)
+    except UnicodeDecodeError:
+        return "File is not UTF-8 encoded, likely binary"
+    return None
+
+
+def _classify_generated(file_path_str: str, header: bytes, file_size: int) -> Optional[str]:
+    """
+    Flags lockfiles, generated code, minified bundles, encoded blobs and large
+    data files from their path and the first bytes of the file.
+
+    Args:
+        file_path_str (str): The file's path relative to the project root.
+        header (bytes): Up to SNIFF_BYTES from the start of the file.
+        file_size (int): The size of the whole file in bytes.
+
+    Returns:
+        Optional[str]: A human-readable reason if the file looks generated or
+        data-heavy, or None if it looks like hand-written source.
+    """
+    file_name = posixpath.basename(file_path_str)
+    if file_name in LOCKFILE_NAMES:
+        return f"File is a package lockfile ({file_name}), likely generated"
+    for suffix, kind in GENERATED_FILE_SUFFIXES:
+        if file_name.endswith(suffix):
+            return f"File name ends with {suffix}, likely a {kind}"
+    if "/__snapshots__/" in f"/{file_path_str}":
+        return "File is in a __snapshots__ folder, likely a test snapshot"
+    # Only the comment lines that open the file, after an optional shebang
+    for line_number, line in enumerate(header[:GENERATED_MARKER_BYTES].split(b"\n")):
+        if not line.strip() or (line_number == 0 and line.startswith(b"#!")):
+            continue
+        comment = COMMENT_LINE_RE.fullmatch(line)
+        if comment is None:
+            break
+        marker = GENERATED_MARKER_RE.match(comment.group(1))
+        if marker:
+            return f"File starts with a '{marker.group().decode('utf-8', 'replace')}' comment, likely generated"
+    if len(header) < CLASSIFY_MIN_SAMPLE_BYTES:
+        return None
+
+    # Line lengths, whitespace and ASCII byte entropy of the sample
+    line_count = header.count(b"\n") + 1
+    average_line_length = len(header) / line_count
+    max_line_length = max(len(line) for line in header.split(b"\n"))
+    whitespace_ratio = (header.count(b" ") + header.count(b"\t") + line_count - 1) / len(header)
+    ascii_sample = header.translate(None, NON_ASCII_BYTES)
+    entropy = -sum(
+        count / len(ascii_sample) * math.log2(count / len(ascii_sample))
+        for count in (ascii_sample.count(bytes((byte,))) for byte in set(ascii_sample))
+    )
+    if len(ascii_sample) >= CLASSIFY_MIN_SAMPLE_BYTES and entropy > ENCODED_DATA_MIN_ENTROPY:
+        return f"Content has {entropy:.1f} bits of entropy per byte, likely encoded data"
+    if whitespace_ratio < MINIFIED_MAX_WHITESPACE_RATIO and (
+            average_line_length > MINIFIED_AVERAGE_LINE_LENGTH or max_line_length > MINIFIED_MAX_LINE_LENGTH):
+        return f"Lines average {average_line_length:.0f} characters (longest {str(max_line_length)}) with little whitespace, likely minified"
+    if file_name.endswith(DATA_FILE_SUFFIXES) and file_size >= DATA_FILE_MIN_BYTES:
+        estimated_lines = int(file_size / average_line_length)
+        if estimated_lines >= DATA_FILE_MIN_LINES:
+            return f"File is {str(file_size)} bytes in about {str(estimated_lines)} lines, likely a data file"
+    return None
+
+
+def _scan_text_file(
+    file_path: Path,
+    count_tokens: Optional[Callable[[str], int]] = None
+) -> Tuple[str, Optional[int], int, int]:
+    """
+    Hashes a file and measures its decoded length in chunks.
+
+    Args:
+        file_path (Path): The file to scan.
+        count_tokens (Optional[Callable[[str], int]]): If given, called on each
+                                                       decoded chunk and summed.
+
+    Returns:
+        Tuple[str, Optional[int], int, int]: The SHA-256 of the raw bytes, the
+        number of characters after UTF-8 decoding and newline translation (or
+        None if the file is not valid UTF-8), the summed token estimate and
+        the number of bytes read.
+    """
+    hasher = hashlib.sha256()
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder("utf-8")(), translate=True)
+    character_count: Optional[int] = 0
+    token_count = 0
+    bytes_read = 0
+
+    def consume(text: str) -> None:
+        nonlocal character_count, token_count
+        character_count += len(text)
+        if count_tokens is not None:
+            token_count += count_tokens(text)
+
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+            bytes_read += len(chunk)
+            if character_count is not None:
+                try:
+                    consume(decoder.decode(chunk))
+                except UnicodeDecodeError:
+                    character_count = None
+    if character_count is not None:
+        try:
+            consume(decoder.decode(b"", final=True))
+        except UnicodeDecodeError:
+            character_count = None
+    return hasher.hexdigest(), character_count, token_count, bytes_read
+
+
+class StreamedFileBlock(NamedTuple):
+    """A file block whose content is copied from disk when it is written."""
+    header: str
+    file_path: Path
+    footer: str
+
+
+def _copy_streamed_content(file_path: Path, write: Callable[[str], None]) -> int:
+    """
+    Passes the content of a streamed file to `write` in decoded chunks, or a
+    placeholder if the file can no longer be opened (removed or replaced
+    since it was scanned).
+
+    Returns:
+        int: The number of bytes read from the file.
+    """
+    try:
+        f = open(file_path, "rb")
+    except OSError:
+        write("[Content not included: File could not be read]")
+        return 0
+    # Decoded like a file opened in text mode: UTF-8 with universal newlines
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder("utf-8")(), translate=True)
+    bytes_read = 0
+    with f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            bytes_read += len(chunk)
+            write(decoder.decode(chunk))
+        write(decoder.decode(b"", final=True))
+    return bytes_read
+
+
+class ContextEvent(NamedTuple):
+    """
+    One piece of the generated context, as yielded by `iter_project_context`.
+
+    `kind` is one of:
+    - "part_start": a new part begins; `text` is its header (empty for part 1,
+      whose header is the preamble). `metadata` has the part number, its
+      default output filename and the generation timestamp.
+    - "preamble": a section of the part 1 header; `metadata["section"]` is
+      "title", "readme", "ai_instructions", "doc" (with its "path") or
+      "codebase_heading".
+    - "file": a file block, with its path, part, language, content hash,
+      estimated tokens, how it was emitted ("full", "outline", "placeholder",
+      "duplicate" or "missing") and, if any, `duplicate_of` and `skip_reason`.
+      `text` is a StreamedFileBlock for files too large to hold in memory.
+    - "part_end": the part is complete; `text` holds its closing warnings.
+      `metadata` has the part number, filename, file count and token total.
+    - "index": the Markdown index of a packed output (`pack_parts`).
+    - "summary": the last event; `text` is empty and `metadata` holds the
+      included files, the token total of every part, the warnings that were
+      logged and, with `profile`, the profile report.
+
+    Writing the `text` of the events from one "part_start" to its "part_end",
+    stripped of leading and trailing whitespace, gives that part's Markdown.
+    """
+    kind: str
+    text: Union[str, StreamedFileBlock]
+    metadata: Dict[str, Any]
+
+
+def _block_content(block: str) -> Optional[str]:
+    """
+    Returns the text inside the code fence of a rendered file block, or None
+    for blocks without one (duplicate references and missing-file notes).
+    """
+    fence_start = block.find("\n```")
+    if fence_start == -1:
+        return None
+    content_start = block.find("\n", fence_start + 1)
+    content_end = block.rfind("\n```")
+    if content_end <= content_start:
+        return None
+    return block[content_start + 1:content_end]
+
+
+class _StrippedPartWriter:
+    """
+    Streams text into a part file, producing exactly what writing the
+    concatenation of all pieces through `str.strip()` would, without ever
+    holding the whole part in memory. Trailing whitespace is held back until
+    more text follows it, and dropped on close.
+    """
+
+    def __init__(self, file_path: Path, previous_digest: Optional[str] = None, volatile_text: str = ""):
+        """
+        Args:
+            file_path (Path): The part file to write.
+            previous_digest (Optional[str]): The digest of the part as last written.
+                                             If given, the part is written to a
+                                             temporary file and only replaces
+                                             `file_path` if its digest differs.
+            volatile_text (str): Text left out of the digest, such as the
+                                 generation timestamp in the part header.
+        """
+        self._file_path = file_path
+        self._previous_digest = previous_digest
+        self._volatile_text = volatile_text
+        self._write_path = file_path if previous_digest is None else file_path.with_name(file_path.name + ".tmp")
+        self._file = open(self._write_path, "w", encoding="utf-8")
+        self._digest = hashlib.sha256()
+        self._pending_whitespace = ""
+        self._started = False
+        self.characters_written = 0
+        self.bytes_written = 0
+        self.bytes_read = 0 # Streamed file content copied into the part
+        self.digest: Optional[str] = None
+        self.is_unchanged = False
+
+    @staticmethod
+    def _byte_length(text: str, encoded: Optional[bytes] = None) -> int:
+        """The number of bytes `text` takes in the file, after newline translation."""
+        length = len(text.encode("utf-8") if encoded is None else encoded)
+        return length + text.count("\n") if os.linesep == "\r\n" else length
+
+    def _emit(self, text: str) -> None:
+        encoded = text.encode("utf-8")
+        self._file.write(text)
+        self._digest.update(text.replace(self._volatile_text, "").encode("utf-8") if self._volatile_text else encoded)
+        self.characters_written += len(text)
+        self.bytes_written += self._byte_length(text, encoded)
+
+    def write(self, text: str) -> None:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started = True
+        stripped = text.rstrip()
+        if not stripped:
+            self._pending_whitespace += text
+            return
+        if self._pending_whitespace:
+            self._emit(self._pending_whitespace)
+        self._emit(stripped)
+        self._pending_whitespace = text[len(stripped):]
+
+    def write_block(self, block: Union[str, StreamedFileBlock]) -> Tuple[int, int]:
+        """
+        Writes a rendered block, copying streamed file content in chunks.
+
+        Returns:
+            Tuple[int, int]: The byte offsets in the file where the block
+            starts and where its content ends. Blocks start with their
+            "### File" heading; their trailing whitespace is not counted.
+        """
+        start_offset = self.bytes_written + (self._byte_length(self._pending_whitespace) if self._started else 0)
+        if isinstance(block, str):
+            self.write(block)
+            return start_offset, self.bytes_written
+        self.write(block.header)
+        self.bytes_read += _copy_streamed_content(block.file_path, self.write)
+        self.write(block.footer)
+        return start_offset, self.bytes_written
+
+    def close(self) -> None:
+        self._file.close()
+        self.digest = self._digest.hexdigest()
+        if self._write_path == self._file_path:
+            return
+        if self.digest == self._previous_digest and self._file_path.exists():
+            # Same content as the file on disk: keep it untouched
+            os.remove(self._write_path)
+            self.is_unchanged = True
+        else:
+            os.replace(self._write_path, self._file_path)
+
+
+def _walk_project(
+    project_root: Path,
+    should_ignore: Callable[[str, bool], bool],
+    doc_folders: List[str]
+) -> Tuple[List[str], List[str]]:
+    """
+    Enumerates the project in a single `os.scandir` traversal.
+
+    Paths are handled as plain relative POSIX strings and each `DirEntry`'s
+    cached type information decides between files and directories, so no
+    `Path` objects are created per entry. Ignored directories are pruned,
+    except that the walk still descends into them in a docs-only mode when
+    they lead to a `doc_folders` entry, because preamble docs are collected
+    regardless of ignore rules. Symlinked directories are not followed.
+
+    Args:
+        project_root (Path): The directory to walk.
+        should_ignore (Callable[[str, bool], bool]): Called with (relative path,
+                                                     is_dir) for every entry.
+        doc_folders (List[str]): Folders whose Markdown files belong to the preamble.
+
+    Returns:
+        Tuple[List[str], List[str]]: The sorted eligible code files and the sorted
+        Markdown files found in `doc_folders`.
+    """
+    doc_prefixes = []
+    for folder_str in doc_folders:
+        folder_posix = Path(folder_str).as_posix().strip("/")
+        if (project_root / folder_posix).is_dir():
+            doc_prefixes.append("" if folder_posix == "." else folder_posix + "/")
+
+    def leads_to_docs(relative_dir: str) -> bool:
+        dir_prefix = relative_dir + "/"
+        return any(dir_prefix.startswith(p) or p.startswith(dir_prefix) for p in doc_prefixes)
+
+    code_files: List[str] = []
+    doc_files: List[str] = []
+    # (relative directory, docs-only) pairs still to visit
+    pending_dirs: List[Tuple[str, bool]] = [("", False)]
+    while pending_dirs:
+        relative_dir, docs_only = pending_dirs.pop()
+        dir_prefix = relative_dir + "/" if relative_dir else ""
+        try:
+            entries = os.scandir(os.path.join(project_root, relative_dir))
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                relative_path = dir_prefix + entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if entry.is_symlink():
+                        continue
+                    if docs_only or should_ignore(relative_path, True):
+                        if doc_prefixes and leads_to_docs(relative_path):
+                            pending_dirs.append((relative_path, True))
+                        continue
+                    pending_dirs.append((relative_path, False))
+                elif doc_prefixes and relative_path.endswith(".md") and \
+                        any(relative_path.startswith(p) for p in doc_prefixes):
+                    doc_files.append(relative_path)
+                elif not docs_only and not should_ignore(relative_path, False):
+                    code_files.append(relative_path)
+
+    code_files.sort()
+    doc_files.sort()
+    return code_files, doc_files
+
+
+def _find_git_dir(project_root: Path) -> Optional[Path]:
+    """
+    Returns the Git directory of a working tree, following the `gitdir:` file
+    that worktrees and submodules use instead of a `.git` directory.
+    """
+    dot_git = project_root / ".git"
+    if dot_git.is_dir():
+        return dot_git
+    if dot_git.is_file():
+        content = dot_git.read_text(encoding="utf-8").strip()
+        if content.startswith("gitdir:"):
+            git_dir = Path(content[len("gitdir:"):].strip())
+            return git_dir if git_dir.is_absolute() else project_root / git_dir
+    return None
+
+
+def _decode_ewah_bitmap(data: bytes, offset: int) -> Tuple[List[int], int]:
+    """
+    Decodes an EWAH-compressed bitmap as Git writes it in index extensions.
+
+    Returns:
+        Tuple[List[int], int]: The positions of the set bits, and the offset
+        just past the bitmap.
+    """
+    _, word_count = struct.unpack(">II", data[offset:offset + 8])
+    words = struct.unpack(f">{str(word_count)}Q", data[offset + 8:offset + 8 + word_count * 8])
+    positions: List[int] = []
+    position = 0
+    i = 0
+    while i < word_count:
+        # A marker word: the running bit, the number of 64-bit words that are
+        # all that bit, and the number of literal words that follow it
+        marker = words[i]
+        run_length = (marker >> 1) & 0xFFFFFFFF
+        if marker & 1:
+            positions.extend(range(position, position + run_length * 64))
+        position += run_length * 64
+        literal_count = marker >> 33
+        for word in words[i + 1:i + 1 + literal_count]:
+            while word:
+                lowest_bit = word & -word
+                positions.append(position + lowest_bit.bit_length() - 1)
+                word ^= lowest_bit
+            position += 64
+        i += 1 + literal_count
+    # The offset of the last marker word follows the words
+    return positions, offset + 8 + word_count * 8 + 4
+
+
+def _parse_git_index(index_path: Path) -> Tuple[List[Tuple[bytes, int, int]], Optional[bytes]]:
+    """
+    Parses the entries of one Git index file.
+
+    Returns:
+        Tuple[List[Tuple[bytes, int, int]], Optional[bytes]]: The (name, mode,
+        merge stage) of every entry in file order, and the payload of the
+        `link` extension if this is a split index.
+    """
+    with open(index_path, "rb") as f:
+        data = f.read()
+    if len(data) < 12 or data[:4] != b"DIRC":
+        raise ValueError(f"{index_path} is not a Git index file")
+    version, entry_count = struct.unpack(">II", data[4:12])
+    if version not in (2, 3, 4):
+        raise ValueError(f"Unsupported Git index version {version} in {index_path}")
+
+    entries: List[Tuple[bytes, int, int]] = []
+    offset = 12
+    previous_name = b""
+    for _ in range(entry_count):
+        entry_start = offset
+        # ctime, mtime, dev, ino, mode, uid, gid, size (4 bytes each, seconds
+        # and nanoseconds for the times), then the 20-byte object id and flags
+        mode = struct.unpack(">I", data[offset + 24:offset + 28])[0]
+        flags = struct.unpack(">H", data[offset + 60:offset + 62])[0]
+        offset += 62
+        if flags & 0x4000: # Extended flags (version 3 and later)
+            offset += 2
+
+        if version == 4:
+            # The name is compressed against the previous one: a varint of
+            # bytes to drop from its end, then the NUL-terminated remainder
+            strip_count = data[offset] & 0x7F
+            while data[offset] & 0x80:
+                offset += 1
+                strip_count = ((strip_count + 1) << 7) | (data[offset] & 0x7F)
+            offset += 1
+            name_end = data.index(b"\x00", offset)
+            name = previous_name[:len(previous_name) - strip_count] + data[offset:name_end]
+            offset = name_end + 1
+        else:
+            name_end = data.index(b"\x00", offset)
+            name = data[offset:name_end]
+            # Entries are NUL-padded to a multiple of 8 bytes
+            offset = entry_start + ((name_end - entry_start + 8) // 8) * 8
+        previous_name = name
+        entries.append((name, mode, (flags >> 12) & 0x3))
+
+    # Extensions follow the entries: a 4-byte signature and a 4-byte size each,
+    # then the trailing checksum (20 bytes, or 32 with SHA-256)
+    link = None
+    while offset + 8 <= len(data) - 20:
+        extension_size = struct.unpack(">I", data[offset + 4:offset + 8])[0]
+        if data[offset:offset + 4] == b"link":
+            link = data[offset + 8:offset + 8 + extension_size]
+        offset += 8 + extension_size
+    return entries, link
+
+
+def _merge_split_index(index_path: Path, entries: List[Tuple[bytes, int, int]], link: bytes) -> List[Tuple[bytes, int, int]]:
+    """
+    Applies the entries of a split index (`core.splitIndex`) to its shared
+    index: the `link` extension names the shared index and holds a bitmap of
+    its entries to delete and one of those to replace. Replacements come
+    first in the split index, with empty names, followed by added entries.
+    """
+    for hash_length in (20, 32): # SHA-1 or SHA-256 repositories
+        shared_path = index_path.parent / f"sharedindex.{link[:hash_length].hex()}"
+        if shared_path.is_file():
+            break
+    else:
+        raise ValueError(f"{index_path} is a split index whose shared index is missing")
+    shared_entries, _ = _parse_git_index(shared_path)
+    if len(link) == hash_length:
+        return sorted(shared_entries + entries, key=lambda entry: (entry[0], entry[2]))
+    deleted_positions, bitmap_end = _decode_ewah_bitmap(link, hash_length)
+    replaced_positions, _ = _decode_ewah_bitmap(link, bitmap_end)
+
+    merged = list(shared_entries)
+    for split_position, shared_position in enumerate(replaced_positions):
+        _, mode, stage = entries[split_position]
+        merged[shared_position] = (shared_entries[shared_position][0], mode, stage)
+    deleted = set(deleted_positions)
+    merged = [entry for position, entry in enumerate(merged) if position not in deleted]
+    merged.extend(entries[len(replaced_positions):])
+    return sorted(merged, key=lambda entry: (entry[0], entry[2]))
+
+
+def read_git_index_entries(index_path: Path) -> List[Tuple[str, bool]]:
+    """
+    Parses a Git index file (versions 2, 3 and 4) and returns the tracked paths.
+
+    Only regular files and symlinks are returned: submodules (gitlinks) and the
+    directory entries of a sparse index are skipped, and paths that appear
+    once per merge stage during a conflict are returned once. A split index
+    is merged with its shared index. This reads the binary format directly,
+    so no `git` executable is needed.
+
+    Args:
+        index_path (Path): The path of the index file (usually .git/index).
+
+    Returns:
+        List[Tuple[str, bool]]: The tracked paths as POSIX strings relative to
+        the work tree, in the index's (byte-sorted) order, each with whether
+        it is tracked as a symlink.
+
+    Raises:
+        ValueError: If the file is not a Git index, uses an unknown version or
+                    is a split index whose shared index is missing.
+    """
+    raw_entries, link = _parse_git_index(index_path)
+    if link is not None:
+        raw_entries = _merge_split_index(index_path, raw_entries, link)
+
+    entries: List[Tuple[str, bool]] = []
+    last_kept_name = None
+    for name, mode, _ in raw_entries:
+        object_type = mode >> 12
+        # 0b1000 regular file, 0b1010 symlink; gitlinks and sparse directories are skipped
+        if object_type not in (0b1000, 0b1010):
+            continue
+        # During a conflict a path has one entry per merge stage (1 base, 2 ours,
+        # 3 theirs, any of which may be missing); they are sorted together
+        if not name or name == last_kept_name:
+            continue
+        last_kept_name = name
+        entries.append((name.decode("utf-8", errors="surrogateescape"), object_type == 0b1010))
+    return entries
+
+
+def read_git_index_paths(index_path: Path) -> List[str]:
+    """
+    Returns the tracked paths of a Git index file (see `read_git_index_entries`).
+
+    Raises:
+        ValueError: If the index cannot be read without Git.
+    """
+    return [path_str for path_str, _ in read_git_index_entries(index_path)]
+
+
+# A leading comment block is treated as a license header if it mentions one of these.
+_LICENSE_KEYWORDS = re.compile(r"copyright|licen[cs]e|spdx-license-identifier", re.IGNORECASE)
+# `#` followed by a letter is a C preprocessor directive, not a comment
+_LINE_COMMENT = re.compile(r"(?:#(?![A-Za-z_])|//|--|;)")
+_BLOCK_COMMENT_DELIMITERS = (("/*", "*/"), ("<!--", "-->"))
+_PYTHON_CODING_COOKIE = re.compile(r"^[ \t\f]*#.*?coding[:=][ \t]*[-\w.]+")
+_JSON_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[ \t\r\n]+')
+_MARKDOWN_FENCE = re.compile(r"^[ \t]*(?:```|~~~)")
+_HTML_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+
+
+def _split_license_header(text: str) -> Tuple[str, str, str]:
+    """
+    Splits a leading license comment block off a file.
+
+    The block is a run of line comments and complete block comments. A block
+    comment only counts once its closing delimiter is found with nothing but
+    whitespace after it, so the split never cuts a comment or a line of code
+    in half. A shebang and an encoding cookie must stay on the first lines,
+    so they are returned separately and are never part of the header.
+
+    Returns:
+        Tuple[str, str, str]: The shebang and encoding cookie lines ("" if
+        there are none), the license header ("" if there is none) and the
+        rest of the file.
+    """
+    lines = text.split("\n")
+    start = 0
+    if lines and lines[0].startswith("#!"):
+        start = 1
+    # An encoding cookie only counts on the first or second line
+    if start < len(lines) and start < 2 and _PYTHON_CODING_COOKIE.match(lines[start]):
+        start += 1
+    end = start
+    while end < len(lines):
+        line = lines[end].strip()
+        if _LINE_COMMENT.match(line):
+            end += 1
+            continue
+        delimiters = next((pair for pair in _BLOCK_COMMENT_DELIMITERS if line.startswith(pair[0])), None)
+        if delimiters is None:
+            break
+        opening, closing = delimiters
+        close_row, rest = end, line[len(opening):]
+        while closing not in rest and close_row + 1 < len(lines):
+            close_row += 1
+            rest = lines[close_row]
+        if closing not in rest or rest[rest.index(closing) + len(closing):].strip():
+            break
+        end = close_row + 1
+    header = "\n".join(lines[start:end])
+    if end == start or not _LICENSE_KEYWORDS.search(header):
+        return "", "", text
+    return "\n".join(lines[:start]), header, "\n".join(lines[end:])
+
+
+def _collapse_blank_lines(lines: List[str], protected_rows: Optional[set] = None) -> str:
+    """
+    Joins lines, collapsing runs of blank lines into one and dropping blank
+    lines at the start and end. Lines whose 1-based number is in
+    `protected_rows` are kept verbatim, even if they are blank.
+    """
+    protected_rows = protected_rows or set()
+    output: List[str] = []
+    last_kept_length = 0 # Output up to the last non-blank or protected line
+    previous_blank = True # Drops leading blank lines
+    for row, line in enumerate(lines, start=1):
+        if not line.strip() and row not in protected_rows:
+            if not previous_blank:
+                output.append("")
+            previous_blank = True
+            continue
+        output.append(line)
+        last_kept_length = len(output)
+        previous_blank = False
+    return "\n".join(output[:last_kept_length])
+
+
+def _compact_python(source: str, strip_comments: bool) -> str:
+    """
+    Compacts Python source without changing what it means.
+
+    `tokenize` locates comments, multi-line strings and logical lines; each
+    logical line is re-indented with one space per block level (continuation
+    lines get one more), trailing whitespace is removed outside strings and
+    blank lines are collapsed. Comments are dropped if `strip_comments` is set,
+    except a shebang and an encoding cookie. The result must parse to the same
+    AST as the input, otherwise the input is returned unchanged.
+    """
+    try:
+        original_tree = ast.dump(ast.parse(source))
+        tokens = list(tokenize.generate_tokens(io.StringIO(source).readline))
+    except (SyntaxError, ValueError, tokenize.TokenError):
+        return source
+
+    fstring_start = getattr(tokenize, "FSTRING_START", None)
+    fstring_end = getattr(tokenize, "FSTRING_END", None)
+    protected_rows = set() # Rows inside multi-line strings: kept verbatim
+    string_start_rows = set() # Rows where a multi-line string starts: no rstrip
+    comment_columns: Dict[int, int] = {}
+    row_indents: Dict[int, int] = {}
+    fstring_start_rows: List[int] = []
+    level = 0
+    logical_line_row = None
+    logical_line_level = 0
+    for token in tokens:
+        token_type = token.type
+        if token_type == tokenize.INDENT:
+            level += 1
+            continue
+        if token_type == tokenize.DEDENT:
+            level -= 1
+            continue
+        start_row, start_column = token.start
+        end_row = token.end[0]
+        if token_type == fstring_start:
+            fstring_start_rows.append(start_row)
+        elif token_type == fstring_end and fstring_start_rows:
+            first_row = fstring_start_rows.pop()
+            if end_row > first_row:
+                string_start_rows.add(first_row)
+                protected_rows.update(range(first_row + 1, end_row + 1))
+        elif token_type == tokenize.STRING and end_row > start_row:
+            string_start_rows.add(start_row)
+            protected_rows.update(range(start_row + 1, end_row + 1))
+
+        if token_type == tokenize.COMMENT:
+            comment_columns[start_row] = start_column
+            row_indents.setdefault(start_row, level if logical_line_row is None else logical_line_level + 1)
+        elif token_type in (tokenize.NEWLINE, tokenize.NL, tokenize.ENDMARKER):
+            if token_type == tokenize.NEWLINE:
+                logical_line_row = None
+        elif logical_line_row is None:
+            logical_line_row = start_row
+            logical_line_level = level
+            row_indents[start_row] = level
+        elif start_row != logical_line_row:
+            row_indents.setdefault(start_row, logical_line_level + 1)
+
+    lines = source.split("\n")
+    compacted_lines: List[str] = []
+    for row, line in enumerate(lines, start=1):
+        if row in protected_rows:
+            compacted_lines.append(line)
+            continue
+        if strip_comments and row in comment_columns:
+            is_kept_comment = (row == 1 and line.startswith("#!")) or \
+                (row <= 2 and _PYTHON_CODING_COOKIE.match(line))
+            if not is_kept_comment:
+                line = line[:comment_columns[row]]
+        content = line.lstrip() if row in string_start_rows else line.strip()
+        if not content:
+            compacted_lines.append("")
+            continue
+        compacted_lines.append(" " * row_indents.get(row, 0) + content)
+
+    compacted = _collapse_blank_lines(compacted_lines, protected_rows)
+    try:
+        if ast.dump(ast.parse(compacted)) != original_tree:
+            return source
+    except (SyntaxError, ValueError):
+        return source
+    return compacted
+
+
+def _compact_json(source: str) -> str:
+    """Removes insignificant whitespace from valid JSON; other text only loses trailing blank lines."""
+    try:
+        original_value = json.loads(source)
+        compacted = _JSON_TOKEN.sub(lambda m: m.group() if m.group().startswith('"') else "", source)
+        if json.loads(compacted) == original_value:
+            return compacted
+    except ValueError:
+        pass
+    return _compact_text(source)
+
+
+def _compact_markdown(source: str, strip_comments: bool) -> str:
+    """
+    Collapses blank lines outside fenced code blocks and, if `strip_comments`
+    is set, drops HTML comments there. Fences stay exactly where they are, so
+    no blank line is added around them (which would turn a tight list into a
+    loose one), and blank lines inside an indented code block are kept.
+    Trailing spaces are kept because two of them are a Markdown line break.
+    """
+    lines: List[str] = []
+    protected_rows = set() # Fenced lines, and blank lines between indented lines
+    prose_lines: List[str] = []
+    in_fence = False
+
+    def flush_prose() -> None:
+        if prose_lines:
+            prose = "\n".join(prose_lines)
+            if strip_comments:
+                prose = _HTML_COMMENT.sub("", prose)
+            lines.extend(prose.split("\n"))
+            prose_lines.clear()
+
+    for line in source.split("\n"):
+        is_fence = bool(_MARKDOWN_FENCE.match(line))
+        if in_fence or is_fence:
+            flush_prose()
+            lines.append(line)
+            protected_rows.add(len(lines))
+            if is_fence:
+                in_fence = not in_fence
+        else:
+            prose_lines.append(line)
+    flush_prose()
+
+    blank_rows: List[int] = []
+    previous_indented = False
+    for row, line in enumerate(lines, start=1):
+        if not line.strip():
+            blank_rows.append(row)
+            continue
+        is_indented = row not in protected_rows and line.startswith(("    ", "\t"))
+        if previous_indented and is_indented:
+            protected_rows.update(blank_rows)
+        blank_rows = []
+        previous_indented = is_indented
+    return _collapse_blank_lines(lines, protected_rows)
+
+
+def _compact_text(source: str) -> str:
+    """
+    Only drops blank lines at the end of the file. Whitespace can be
+    significant in languages that are not parsed here (YAML, Makefiles,
+    heredocs, template literals), so everything else is kept verbatim.
+    """
+    lines = source.split("\n")
+    while lines and not lines[-1].strip():
+        lines.pop()
+    return "\n".join(lines)
+
+
+def compact_source(text: str, lang: str, strip_comments: bool = False) -> str:
+    """
+    Returns a smaller rendering of a file that keeps its meaning.
+
+    Python is compacted with `tokenize` and verified against its AST, valid
+    JSON loses insignificant whitespace, Markdown only has blank lines (and
+    optionally HTML comments) removed outside code fences, and any other text
+    is kept verbatim apart from blank lines at the end of the file.
+
+    Args:
+        text (str): The decoded file content.
+        lang (str): The fence language detected for the file.
+        strip_comments (bool): If True, Python comments and Markdown HTML
+                               comments are removed as well.
+
+    Returns:
+        str: The compacted content.
+    """
+    if lang == "python":
+        return _compact_python(text, strip_comments)
+    if lang == "json":
+        return _compact_json(text)
+    if lang == "markdown":
+        return _compact_markdown(text, strip_comments)
+    return _compact_text(text)
+
+
+# Bump whenever the outline format changes, so cached outlines are rebuilt
+OUTLINE_CACHE_VERSION = 1
+
+# Lines kept by the regex outliner: declarations in common languages, and Markdown headings
+_DECLARATION_PATTERN = re.compile(
+    r"^[ \t]*(?:(?:export|default|public|private|protected|internal|static|abstract|final|"
+    r"async|pub(?:\([a-z]+\))?|unsafe|extern|override|virtual|inline|sealed|partial)\s+)*"
+    r"(?:function\*?|class|interface|type|enum|struct|trait|impl|fn|func|def|module|"
+    r"namespace|package|object|record|macro_rules!)\s+[\w$<(]"
+    r"|^[ \t]*(?:export\s+)?(?:const|let|var)\s+[\w$]+\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>|[\w$]+\s*=>)"
+)
+_MARKDOWN_HEADING = re.compile(r"^#{1,6}\s+\S")
+_OUTLINE_VALUE_LIMIT = 80 # Longer assignment values are shown as `...`
+
+
+def _outline_python(source: str) -> Optional[str]:
+    """
+    Outlines Python source with `ast`: the module docstring, imports, simple
+    assignments and every class and function signature (with decorators and
+    docstring), with bodies replaced by `...`.
+
+    Returns:
+        Optional[str]: The outline, or None if the source does not parse.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    lines: List[str] = []
+
+    def add_docstring(node: ast.AST, indent: str) -> None:
+        docstring = ast.get_docstring(node)
+        if docstring:
+            docstring = "\n".join((indent + line).rstrip() for line in docstring.replace('"""', '\\"\\"\\"').split("\n")).lstrip()
+            lines.append(f'{indent}"""{docstring}"""')
+
+    def add_body(body: List[ast.stmt], indent: str) -> None:
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and not indent and lines:
+                lines.append("") # Separate top-level definitions
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                lines.extend(f"{indent}@{ast.unparse(decorator)}" for decorator in node.decorator_list)
+                prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+                returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+                lines.append(f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}:")
+                add_docstring(node, indent + "    ")
+                lines.append(f"{indent}    ...")
+            elif isinstance(node, ast.ClassDef):
+                lines.extend(f"{indent}@{ast.unparse(decorator)}" for decorator in node.decorator_list)
+                bases = [ast.unparse(base) for base in node.bases] + [ast.unparse(keyword) for keyword in node.keywords]
+                lines.append(f"{indent}class {node.name}{'(' + ', '.join(bases) + ')' if bases else ''}:")
+                body_start = len(lines)
+                add_docstring(node, indent + "    ")
+                add_body(node.body, indent + "    ")
+                if len(lines) == body_start:
+                    lines.append(f"{indent}    ...")
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                lines.append(indent + ast.unparse(node))
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None:
+                value = ast.unparse(node.value)
+                if len(value) > _OUTLINE_VALUE_LIMIT or "\n" in value:
+                    value = "..."
+                if isinstance(node, ast.Assign):
+                    targets = " = ".join(ast.unparse(target) for target in node.targets)
+                    lines.append(f"{indent}{targets} = {value}")
+                else:
+                    lines.append(f"{indent}{ast.unparse(node.target)}: {ast.unparse(node.annotation)} = {value}")
+            elif isinstance(node, ast.AnnAssign):
+                lines.append(f"{indent}{ast.unparse(node.target)}: {ast.unparse(node.annotation)}")
+
+    add_docstring(tree, "")
+    add_body(tree.body, "")
+    return "\n".join(lines)
+
+
+def outline_source(text: str, lang: str) -> str:
+    """
+    Returns a structural outline of a file for when its full content does not fit.
+
+    Python is outlined with `ast` (see `_outline_python`). Markdown keeps its
+    headings. Any other text, or Python that does not parse, keeps the lines
+    that look like declarations (classes, functions, interfaces, types, ...)
+    in common languages.
+
+    Args:
+        text (str): The decoded file content.
+        lang (str): The fence language detected for the file.
+
+    Returns:
+        str: The outline, or "" if nothing outline-worthy was found.
+    """
+    if lang == "python":
+        outline = _outline_python(text)
+        if outline is not None:
+            return outline
+    pattern = _MARKDOWN_HEADING if lang == "markdown" else _DECLARATION_PATTERN
+    return "\n".join(line.rstrip() for line in text.split("\n") if pattern.match(line))
+
+
+def outline_file_lines(file_path: Path, lang: str) -> str:
+    """
+    Outlines a file too large to hold in memory one line at a time, keeping
+    the headings or declaration lines that `outline_source` keeps for text
+    it cannot parse. Python is not parsed with `ast` here.
+    """
+    pattern = _MARKDOWN_HEADING if lang == "markdown" else _DECLARATION_PATTERN
+    with open(file_path, "r", encoding="utf-8") as f:
+        return "\n".join(line.rstrip() for line in f if pattern.match(line))
+
+
+# Bump whenever the stored import format changes so stale graph indexes are discarded.
+IMPORT_GRAPH_VERSION = 1
+
+# Source files scanned for imports when selecting files by dependency distance.
+PYTHON_EXTENSIONS = (".py",)
+JS_EXTENSIONS = (".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx")
+
+# Relative module specifiers in `import ... from "x"`, `export ... from "x"`,
+# `import "x"`, `import("x")` and `require("x")`.
+_JS_IMPORT_PATTERN = re.compile(
+    r"""(?:\bimport\s+(?:[\w$*{}\s,]+?\s+from\s+)?|\bexport\s+[\w$*{}\s,]+?\s+from\s+|\b(?:require|import)\s*\(\s*)["'](\.{1,2}/[^"'\n]*|\.{1,2})["']"""
+)
+
+
+def _extract_python_imports(source: str) -> List[List[Any]]:
+    """
+    Returns the imports of a Python module as [level, module, names] triples,
+    using `ast` so that strings and comments are never mistaken for imports.
+    A module that does not parse has no imports.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+    imports: List[List[Any]] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imports.append([0, alias.name, []])
+        elif isinstance(node, ast.ImportFrom):
+            imports.append([node.level, node.module or "", [alias.name for alias in node.names if alias.name != "*"]])
+    return imports
+
+
+def _extract_js_imports(source: str) -> List[str]:
+    """Returns the relative module specifiers imported by a JavaScript/TypeScript file."""
+    return sorted(set(_JS_IMPORT_PATTERN.findall(source)))
+
+
+def _build_import_graph(project_root: Path, file_paths: List[str], graph_cache_path: Optional[Path]) -> Dict[str, List[str]]:
+    """
+    Builds the import graph between the given project files.
+
+    Python imports are resolved through the module names the files define
+    (every path suffix that starts at a directory without an `__init__.py`,
+    so `src/pkg/mod.py` defines both `src.pkg.mod` and `pkg.mod`) and relative
+    imports through the package directory. JavaScript/TypeScript specifiers
+    are resolved against the importing file with the usual extension and
+    `index` fallbacks. The raw imports of each file are cached by size and
+    mtime in `graph_cache_path`, so only changed files are parsed again.
+
+    Returns:
+        Dict[str, List[str]]: The project files each source file imports.
+    """
+    file_set = set(file_paths)
+    source_files = [p for p in file_paths if p.endswith(PYTHON_EXTENSIONS + JS_EXTENSIONS)]
+
+    cached_imports: Dict[str, Dict[str, Any]] = {}
+    if graph_cache_path is not None:
+        try:
+            with open(graph_cache_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if isinstance(manifest, dict) and manifest.get("version") == IMPORT_GRAPH_VERSION:
+                cached_imports = manifest.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    raw_imports: Dict[str, Dict[str, Any]] = {}
+    for file_path_str in source_files:
+        try:
+            file_stat = os.stat(os.path.join(project_root, file_path_str))
+        except OSError:
+            continue
+        cached = cached_imports.get(file_path_str)
+        if cached and cached.get("size") == file_stat.st_size and cached.get("mtime_ns") == file_stat.st_mtime_ns:
+            raw_imports[file_path_str] = cached
+            continue
+        imports: List[Any] = []
+        if file_stat.st_size <= STREAMING_THRESHOLD_BYTES:
+            try:
+                source = _decode_text((project_root / file_path_str).read_bytes())
+            except (OSError, UnicodeDecodeError):
+                source = ""
+            if file_path_str.endswith(PYTHON_EXTENSIONS):
+                imports = _extract_python_imports(source)
+            else:
+                imports = _extract_js_imports(source)
+        raw_imports[file_path_str] = {"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns, "imports": imports}
+
+    if graph_cache_path is not None and raw_imports != cached_imports:
+        graph_cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = graph_cache_path.with_name(graph_cache_path.name + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": IMPORT_GRAPH_VERSION, "files": raw_imports}, f)
+        os.replace(temp_path, graph_cache_path)
+
+    # --- Map every Python module name the project defines to its file ---
+    package_dirs = {posixpath.dirname(p) for p in file_set if p.endswith("/__init__.py")}
+    module_files: Dict[str, str] = {}
+    for file_path_str in sorted(p for p in source_files if p.endswith(PYTHON_EXTENSIONS)):
+        parts = file_path_str[:-len(".py")].split("/")
+        if parts[-1] == "__init__":
+            parts.pop()
+        for start in range(len(parts)):
+            parent_dir = "/".join(parts[:start])
+            if start == 0 or parent_dir not in package_dirs:
+                module_files.setdefault(".".join(parts[start:]), file_path_str)
+
+    def resolve_python_path(base_dir: str, module_parts: List[str]) -> Optional[str]:
+        module_path = "/".join([base_dir] + module_parts if base_dir else module_parts)
+        for candidate in (module_path + ".py", module_path + "/__init__.py"):
+            if candidate in file_set:
+                return candidate
+        return None
+
+    def resolve_js(file_path_str: str, specifier: str) -> Optional[str]:
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(file_path_str), specifier))
+        stems = [target]
+        # TypeScript sources are often imported with the extension of their output
+        for output_extension in (".js", ".jsx", ".mjs", ".cjs"):
+            if target.endswith(output_extension):
+                stems.append(target[:-len(output_extension)])
+        for stem in stems:
+            for candidate in [stem] + [stem + ext for ext in JS_EXTENSIONS] + [stem + "/index" + ext for ext in JS_EXTENSIONS]:
+                if candidate in file_set:
+                    return candidate
+        return None
+
+    graph: Dict[str, List[str]] = {}
+    for file_path_str, record in raw_imports.items():
+        targets: List[str] = []
+        if file_path_str.endswith(PYTHON_EXTENSIONS):
+            for level, module, names in record["imports"]:
+                if level:
+                    # Relative import: start from the package directory of the file
+                    base_dir = posixpath.dirname(file_path_str)
+                    for _ in range(level - 1):
+                        base_dir = posixpath.dirname(base_dir)
+                    module_parts = module.split(".") if module else []
+                    resolved = [resolve_python_path(base_dir, module_parts + [name]) for name in names]
+                    resolved = [r for r in resolved if r] or [resolve_python_path(base_dir, module_parts)]
+                else:
+                    # `from a.b import c` may import the submodule a.b.c or a name from a.b
+                    resolved = [module_files.get(f"{module}.{name}") for name in names]
+                    resolved = [r for r in resolved if r]
+                    if not resolved:
+                        module_parts = module.split(".")
+                        while module_parts and not resolved:
+                            resolved = [module_files.get(".".join(module_parts))]
+                            resolved = [r for r in resolved if r]
+                            module_parts.pop()
+                targets.extend(r for r in resolved if r and r != file_path_str)
+        else:
+            for specifier in record["imports"]:
+                resolved_js = resolve_js(file_path_str, specifier)
+                if resolved_js and resolved_js != file_path_str:
+                    targets.append(resolved_js)
+        graph[file_path_str] = sorted(set(targets))
+    return graph
+
+
+def _order_by_dependency_distance(
+    file_paths: List[str],
+    graph: Dict[str, List[str]],
+    seed_paths: List[str]
+) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Orders files by their dependency distance from the seeds.
+
+    Seeds (files, or directories standing for every file below them) come
+    first, then the files they import, breadth first. Files that only import
+    the seeds (directly or transitively) follow, nearest first, and all
+    unrelated files come last. Ties keep path order.
+
+    Returns:
+        Tuple[List[str], Dict[str, int]]: The ordered files and the forward
+        import distance of every file reachable from the seeds.
+    """
+    file_set = set(file_paths)
+    seed_prefixes = [Path(p).as_posix().strip("/") for p in seed_paths]
+    seeds = [p for p in file_paths if any(p == s or p.startswith(s + "/") for s in seed_prefixes)]
+
+    def breadth_first_distances(edges: Dict[str, List[str]]) -> Dict[str, int]:
+        distances = {seed: 0 for seed in seeds}
+        frontier = deque(seeds)
+        while frontier:
+            current = frontier.popleft()
+            for neighbor in edges.get(current, ()):
+                if neighbor in file_set and neighbor not in distances:
+                    distances[neighbor] = distances[current] + 1
+                    frontier.append(neighbor)
+        return distances
+
+    reverse_graph: Dict[str, List[str]] = {}
+    for source, targets in graph.items():
+        for target in targets:
+            reverse_graph.setdefault(target, []).append(source)
+
+    forward_distances = breadth_first_distances(graph)
+    reverse_distances = breadth_first_distances(reverse_graph)
+
+    def sort_key(file_path_str: str) -> Tuple[int, int, str]:
+        if file_path_str in forward_distances:
+            return (0, forward_distances[file_path_str], file_path_str)
+        if file_path_str in reverse_distances:
+            return (1, reverse_distances[file_path_str], file_path_str)
+        return (2, 0, file_path_str)
+
+    return sorted(file_paths, key=sort_key), forward_distances
+
+
+def _first_fit_decreasing(
+    items: List[Tuple[int, List[str]]],
+    first_part_capacity: int,
+    part_capacity: int
+) -> List[List[str]]:
+    """
+    Packs (cost, file paths) items into as few parts as possible with the
+    first-fit-decreasing heuristic. Part 1 always exists and has its own,
+    smaller capacity because it also carries the preamble. An item larger
+    than any capacity gets a part of its own.
+    """
+    parts: List[List[str]] = [[]]
+    remaining: List[int] = [first_part_capacity]
+    for cost, paths in sorted(items, key=lambda item: item[0], reverse=True):
+        for part_index, part_remaining in enumerate(remaining):
+            if cost <= part_remaining:
+                parts[part_index].extend(paths)
+                remaining[part_index] -= cost
+                break
+        else:
+            parts.append(list(paths))
+            remaining.append(part_capacity - cost)
+    return parts
+
+
+def _pack_files_into_parts(
+    file_costs: List[Tuple[str, int]],
+    first_part_capacity: int,
+    part_capacity: int
+) -> List[List[str]]:
+    """
+    Assigns files to parts so that as few parts as possible are needed, keeping
+    files of the same directory together where possible.
+
+    Directories whose files fit into one part are packed as a single unit;
+    larger directories are broken up into their subdirectories, and the files
+    directly inside them into contiguous runs. The units are then packed with
+    first-fit decreasing. If packing individual files would need fewer parts,
+    that packing wins, since the part count matters more than locality.
+
+    Args:
+        file_costs (List[Tuple[str, int]]): (file path, budget cost) pairs in
+                                            sorted path order.
+        first_part_capacity (int): The budget left in part 1 after its header.
+        part_capacity (int): The budget left in any later part after its header.
+
+    Returns:
+        List[List[str]]: The file paths of each part, each sorted by path. Part 1
+        comes first; the other parts are ordered by their first path.
+    """
+    locality_items: List[Tuple[int, List[str]]] = []
+
+    def add_contiguous_runs(entries: List[Tuple[str, int]]) -> None:
+        run_paths: List[str] = []
+        run_cost = 0
+        for path, cost in entries:
+            if run_paths and run_cost + cost > part_capacity:
+                locality_items.append((run_cost, run_paths))
+                run_paths, run_cost = [], 0
+            run_paths.append(path)
+            run_cost += cost
+        if run_paths:
+            locality_items.append((run_cost, run_paths))
+
+    def add_directory(prefix: str, entries: List[Tuple[str, int]]) -> None:
+        total_cost = sum(cost for _, cost in entries)
+        if total_cost <= part_capacity:
+            locality_items.append((total_cost, [path for path, _ in entries]))
+            return
+        direct_files: List[Tuple[str, int]] = []
+        subdirectories: Dict[str, List[Tuple[str, int]]] = {}
+        for path, cost in entries:
+            child_name, separator, _ = path[len(prefix):].partition("/")
+            if separator:
+                subdirectories.setdefault(child_name, []).append((path, cost))
+            else:
+                direct_files.append((path, cost))
+        add_contiguous_runs(direct_files)
+        for child_name, child_entries in subdirectories.items():
+            add_directory(prefix + child_name + "/", child_entries)
+
+    add_directory("", file_costs)
+    parts = _first_fit_decreasing(locality_items, first_part_capacity, part_capacity)
+    per_file_parts = _first_fit_decreasing(
+        [(cost, [path]) for path, cost in file_costs], first_part_capacity, part_capacity
+    )
+    if len(per_file_parts) < len(parts):
+        parts = per_file_parts
+
+    parts = [sorted(part_paths) for part_paths in parts]
+    return parts[:1] + sorted((part_paths for part_paths in parts[1:] if part_paths), key=lambda part_paths: part_paths[0])
+
+
+# Bump whenever the layout of the profile report changes
+PROFILE_REPORT_VERSION = 1
+# How many of the slowest and largest files the profile report lists
+PROFILE_TOP_FILES = 10
+# Bump whenever the layout of the sidecar index changes
+SIDECAR_INDEX_VERSION = 1
+
+
+def _peak_memory_kib() -> Optional[int]:
+    """Returns the peak resident set size of this process in KiB, or None where unavailable."""
+    try:
+        import resource # Unix only
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak # Bytes on macOS, KiB elsewhere
+
+
+def _load_cache_manifest(cache_path: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Loads the per-file entries of an incremental cache manifest.
+
+    A missing, unreadable or outdated manifest yields an empty cache, so the
+    worst case is simply a full regeneration.
+    """
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("version") != CACHE_MANIFEST_VERSION:
+        return {}
+    files = manifest.get("files")
+    return files if isinstance(files, dict) else {}
+
+
+def _save_cache_manifest(cache_path: Path, entries: Dict[str, Dict[str, Any]]) -> None:
+    """Atomically writes the incremental cache manifest."""
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = cache_path.with_name(cache_path.name + ".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_MANIFEST_VERSION, "files": entries}, f, ensure_ascii=False)
+    os.replace(temp_path, cache_path)
+
+
+class GenerationState:
+    """
+    In-memory state that a long-running process (see `watch_context_generator.py`)
+    passes to every `generate_context_markdown` call, so that a regeneration
+    only redoes the work affected by what changed.
+
+    It holds the compiled .gitignore rules, the enumerated file lists, the
+    rendered blocks and outlines, and a digest of every part file so that
+    unchanged parts are not rewritten. It also records which paths to watch:
+    `tree_paths` (directories, or the Git index with `file_source="git_index"`),
+    whose modification means the file lists must be rebuilt
+    (call `invalidate_tree`), and `content_paths`, the files whose content
+    ends up in the output. The state is only valid for one set of options.
+    """
+
+    def __init__(self):
+        self.gitignore_matcher: Optional[GitIgnoreMatcher] = None
+        self.file_lists: Optional[Tuple[List[str], List[str]]] = None # (code files, doc folder files)
+        self.cache_entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self.outlines: Optional[Dict[str, str]] = None
+        self.part_digests: Dict[str, str] = {}
+        self.tree_paths: set = set()
+        self.content_paths: List[str] = []
+
+    def invalidate_tree(self) -> None:
+        """Forgets the file lists and .gitignore rules after files were added, removed or renamed."""
+        self.gitignore_matcher = None
+        self.file_lists = None
+
+
+def iter_project_context(
     output_filename: str = "output/project_context.md",
     project_name: str = "Unnamed Project",
     readme_filename: str = "README.md",
@@ -14,11 +1791,39 @@ def generate_context_markdown(
     exclude_files: Optional[List[str]] = None,
     exclude_folders: Optional[List[str]] = None,
     max_output_characters: int = 500000,
-    split_output_if_truncated: bool = False
-):
+    split_output_if_truncated: bool = False,
+    use_cache: bool = False,
+    workers: int = 1,
+    max_output_tokens: Optional[int] = None,
+    token_estimator: Optional[Callable[[str, str], int]] = None,
+    pack_parts: bool = False,
+    file_source: str = "walk",
+    deduplicate: bool = False,
+    seed_paths: Optional[List[str]] = None,
+    render_mode: str = "full",
+    strip_comments: bool = False,
+    outline_fallback: bool = False,
+    outline_threshold_bytes: Optional[int] = None,
+    max_file_bytes: Optional[int] = None,
+    truncate_large_files: bool = False,
+    auto_exclude: str = "off",
+    profile: bool = False,
+    output_format: str = "markdown",
+    state: Optional[GenerationState] = None,
+    project_root: Optional[Union[str, Path]] = None,
+    log: Optional[Callable[[str], None]] = None
+) -> Iterator[ContextEvent]:
     """
-    Combines project information and code files into a single Markdown file(s)
-    for AI context preservation.
+    Generates the project context as a stream of events, without writing any
+    output files or printing anything unless `log` is given.
+
+    Preamble sections, file blocks and part boundaries are yielded in output
+    order as soon as they are ready (see ContextEvent), so a service can
+    stream the context straight into a response. Files are only read while
+    the consumer asks for more; stopping early stops the reads. The cache
+    manifest, import graph and outline caches are still kept next to
+    `output_filename` when enabled. `generate_context_markdown` writes these
+    events to the part files.
     
     Args:
         output_filename (str): The base name of the output Markdown file(s).
@@ -39,31 +1844,282 @@ def generate_context_markdown(
                                           be split into multiple numbered files (e.g.,
                                           project_context_part_1.md, project_context_part_2.md).
                                           If False, only one file will be generated and truncated.
+        use_cache (bool): If True, a manifest (e.g., project_context.cache.json) is kept
+                          next to the output holding each file's size, mtime, content hash
+                          and rendered block. Later runs only re-read files whose size or
+                          mtime changed and reuse the cached blocks for the rest.
+        workers (int): The number of threads used to read, decode and render files.
+                       With more than one worker, files are processed ahead of the
+                       writer in a bounded window; the output is identical to a
+                       serial run.
+        max_output_tokens (Optional[int]): If set, parts are budgeted by estimated model
+                                           tokens instead of `max_output_characters`.
+        token_estimator (Optional[Callable[[str, str], int]]): A function taking
+                                           (text, lang) and returning a token count.
+                                           Defaults to the built-in `estimate_tokens`.
+                                           Per-part token totals are always reported.
+                                           Cached counts are only reused for a
+                                           module-level function; a lambda or
+                                           callable object is re-run on every block.
+        pack_parts (bool): If True (and `split_output_if_truncated` is True), all files
+                           are measured first and packed into as few parts as possible,
+                           keeping files of the same directory together where possible.
+                           An index file (e.g., project_context_index.md) lists the part
+                           and size of every file.
+        file_source (str): How candidate files are enumerated. "walk" scans the
+                           directory tree and applies .gitignore rules. "git_index"
+                           reads the tracked files straight from .git/index (no
+                           directory walk, no .gitignore matching) and only applies
+                           `exclude_files` and `exclude_folders`.
+        deduplicate (bool): If True, files with identical content are emitted once;
+                            every later copy becomes a one-line "Identical to" reference
+                            to the first one. The savings are reported in the summary.
+        seed_paths (Optional[List[str]]): Files or directories the AI should focus on.
+                                          If given, code files are added in order of
+                                          import distance from the seeds (Python via
+                                          `ast`, JavaScript/TypeScript via an import
+                                          scanner) instead of alphabetically, so the
+                                          budget is spent on related files first. The
+                                          import graph is cached next to the output.
+                                          Has no effect with `pack_parts`.
+        render_mode (str): "full" (default) emits every file verbatim. "compact"
+                           collapses blank lines, re-indents Python with `tokenize`
+                           (verified against its AST), removes insignificant JSON
+                           whitespace and emits each license header only once.
+                           Files of at least STREAMING_THRESHOLD_BYTES stay verbatim.
+        strip_comments (bool): In "compact" mode, also drop Python comments,
+                               Markdown HTML comments and all license headers.
+        outline_fallback (bool): If True, a file whose block does not fit in the
+                                 current part is emitted as an outline (class and
+                                 function signatures with docstrings via `ast` for
+                                 Python, declaration lines otherwise) if that fits,
+                                 before starting a new part or stopping.
+        outline_threshold_bytes (Optional[int]): Text files larger than this many bytes
+                                                 are always emitted as an outline.
+                                                 Outlines are cached by content hash
+                                                 when `use_cache` is True.
+        max_file_bytes (Optional[int]): Files larger than this many bytes are not read
+                                        in full. They are replaced by a placeholder, or
+                                        by a preview if `truncate_large_files` is True.
+        truncate_large_files (bool): If True, files over `max_file_bytes` are included
+                                     as a preview of their first `max_file_bytes` bytes
+                                     followed by a truncation note.
+        auto_exclude (str): "off" (default) includes every eligible file. "stub" replaces
+                            files that look generated or data-heavy (lockfiles, minified
+                            bundles, source maps, snapshots, files whose leading comments
+                            carry a generated-code marker, encoded blobs and large data
+                            files) with a one-line
+                            placeholder, and "exclude" leaves them out. Files are classified
+                            from their name and first SNIFF_BYTES, before any full read,
+                            and the summary lists every flagged file with the reason.
+        profile (bool): If True, the summary event carries a profile report with the
+                        wall time of each phase, the paths examined and pruned, the
+                        regexes run for .gitignore matching, bytes read, the slowest
+                        and largest files and the peak memory.
+        output_format (str): "markdown" (default) budgets and splits the files into
+                             parts. "jsonl" yields every file into a single part
+                             without a budget, for the JSONL output; outline
+                             thresholds, compact rendering and deduplication still apply.
+        state (Optional[GenerationState]): In-memory state shared by repeated calls
+                                           with the same options. The file lists,
+                                           .gitignore rules, rendered blocks and
+                                           outlines are reused instead of being
+                                           rebuilt or loaded from disk, and the
+                                           cache manifest is not rewritten.
+        project_root (Optional[Union[str, Path]]): The directory to generate the context
+                                                   for. Defaults to the parent of the
+                                                   folder holding this script.
+        log (Optional[Callable[[str], None]]): Called with every warning and summary
+                                               line. Nothing is printed if omitted.
+
+    Yields:
+        ContextEvent: The parts, preamble sections and file blocks in output
+        order, then a "summary" event.
     """
-    project_root = Path(__file__).parent.parent
+    project_root = Path(project_root) if project_root is not None else Path(__file__).parent.parent
+    if log is None:
+        log = lambda message: None
+    warnings: List[str] = [] # Also reported in the summary event
+
+    def warn(message: str) -> None:
+        warnings.append(message)
+        log(f"  [Warning] {message}")
+
+    # --- Phase timings and counters for the profile report ---
+    run_started = time.perf_counter()
+    phase_started = run_started
+    phase_seconds: Dict[str, float] = {}
+    walk_counts = {"paths_examined": 0, "directories_pruned": 0, "files_ignored": 0}
+
+    def end_phase(phase_name: str) -> None:
+        """Charges the time since the previous phase ended to `phase_name`."""
+        nonlocal phase_started
+        now = time.perf_counter()
+        phase_seconds[phase_name] = phase_seconds.get(phase_name, 0.0) + now - phase_started
+        phase_started = now
+
+    # --- Budget: characters by default, estimated model tokens if requested ---
+    if token_estimator is None:
+        token_estimator = estimate_tokens
+    token_estimator_name = _token_estimator_key(token_estimator)
+    use_token_budget = max_output_tokens is not None
+    if use_token_budget:
+        budget_limit = max_output_tokens
+        budget_description = f"`max_output_tokens` limit ({str(max_output_tokens)} tokens)"
+    else:
+        budget_limit = max_output_characters
+        budget_description = f"`max_output_characters` limit ({str(max_output_characters)} characters)"
     
     # --- Process exclusion lists for efficient lookup ---
     files_to_exclude_set = {Path(p) for p in exclude_files} if exclude_files else set()
     folders_to_exclude_set = {Path(p) for p in exclude_folders} if exclude_folders else set()
     
+    # --- Build a set of the fixed preamble files to avoid duplicating them ---
+    # (Markdown files found in `doc_folders` are routed to the preamble by the walk itself.)
+    preamble_files_to_ignore = {Path(p) for p in [readme_filename, ai_instructions_filename]}
+    if optional_docs:
+        preamble_files_to_ignore.update({Path(p) for p in optional_docs})
+
+    # Compile the root .gitignore and any nested ones lazily as the walk reaches them
+    if state is not None and state.gitignore_matcher is not None:
+        gitignore_matcher = state.gitignore_matcher
+    else:
+        gitignore_matcher = GitIgnoreMatcher(project_root)
+        if state is not None:
+            state.gitignore_matcher = gitignore_matcher
+
+    # --- Precompute the fixed exclusions as POSIX strings so each check is a set lookup ---
+    output_stem = Path(output_filename).stem
+    try:
+        script_relative_path_str = Path(__file__).resolve().relative_to(project_root.resolve()).as_posix()
+    except ValueError:
+        script_relative_path_str = None # The script lives outside the project
+    preamble_files_to_ignore_strs = {p.as_posix() for p in preamble_files_to_ignore}
+    files_to_exclude_strs = {p.as_posix() for p in files_to_exclude_set}
+    folders_to_exclude_strs = {p.as_posix() for p in folders_to_exclude_set}
+
+    # Function to check if a path should be ignored. Directories are checked once
+    # as the walk reaches them, so anything below a pruned directory is never seen.
+    def should_ignore(path_str: str, is_dir: bool) -> bool:
+        # --- Check against all exclusion criteria ---
+
+        # 1. Ignore generated output files, the script itself, or preamble docs
+        if output_stem in path_str or \
+           path_str == script_relative_path_str or \
+           path_str in preamble_files_to_ignore_strs:
+            return True
+
+        # 2. Ignore files in the explicit exclusion list
+        if path_str in files_to_exclude_strs:
+            return True
+
+        # 3. Ignore the excluded folders themselves (their contents are pruned with them)
+        if path_str in folders_to_exclude_strs:
+            return True
+
+        # 4. Check against the applicable .gitignore rules
+        return gitignore_matcher.is_ignored(path_str, is_dir)
+
+    def should_ignore_tracked(path_str: str) -> bool:
+        """Applies the non-.gitignore exclusions to a tracked file and its folders."""
+        if output_stem in path_str or \
+           path_str == script_relative_path_str or \
+           path_str in preamble_files_to_ignore_strs or \
+           path_str in files_to_exclude_strs:
+            return True
+        slash = path_str.find("/")
+        while slash != -1:
+            if path_str[:slash] in folders_to_exclude_strs:
+                return True
+            slash = path_str.find("/", slash + 1)
+        return False
+
+    end_phase("setup")
+    regex_evaluations_before = gitignore_matcher.regex_evaluations
+
+    # Find all files that *could* be included, collecting the Markdown files of
+    # `doc_folders` for the preamble on the way
+    if file_source not in ("walk", "git_index"):
+        raise ValueError(f"Unknown file_source '{file_source}'; expected 'walk' or 'git_index'.")
+    git_dir = _find_git_dir(project_root) if file_source == "git_index" else None
+    if file_source == "git_index" and (git_dir is None or not (git_dir / "index").is_file()):
+        warn(f"No Git index found in '{project_root}'; falling back to walking the directory tree.")
+        git_dir = None
+    index_entries: Optional[List[Tuple[str, bool]]] = None
+    if git_dir is not None and (state is None or state.file_lists is None):
+        try:
+            index_entries = read_git_index_entries(git_dir / "index")
+        except ValueError as e:
+            warn(f"{str(e)}; falling back to walking the directory tree.")
+
+    if state is not None and state.file_lists is not None:
+        # Nothing was added, removed or renamed since the last call
+        all_eligible_code_files, doc_folder_files = list(state.file_lists[0]), list(state.file_lists[1])
+    elif index_entries is not None:
+        # Tracked files are already filtered by Git, so only the explicit
+        # exclusions apply, checked against each file's ancestor folders.
+        doc_prefixes = []
+        for folder_str in doc_folders or []:
+            folder_posix = Path(folder_str).as_posix().strip("/")
+            doc_prefixes.append("" if folder_posix == "." else folder_posix + "/")
+        all_eligible_code_files = []
+        doc_folder_files = []
+        for path_str, is_symlink in sorted(index_entries):
+            walk_counts["paths_examined"] += 1
+            if is_symlink and os.path.isdir(os.path.join(project_root, path_str)):
+                # Like the walk, symlinked directories are not followed
+                walk_counts["files_ignored"] += 1
+                continue
+            if path_str.endswith(".md") and any(path_str.startswith(p) for p in doc_prefixes):
+                doc_folder_files.append(path_str)
+                continue
+            if should_ignore_tracked(path_str):
+                walk_counts["files_ignored"] += 1
+                continue
+            all_eligible_code_files.append(path_str)
+        if state is not None:
+            state.tree_paths = {str(git_dir / "index")} # Absolute, the Git dir may be outside the root
+    else:
+        # Walk the project directory once
+        if state is None and not profile:
+            all_eligible_code_files, doc_folder_files = _walk_project(project_root, should_ignore, doc_folders or [])
+        else:
+            # Count the decisions, and remember the directories that were entered:
+            # their mtimes change when entries come or go
+            walked_dirs = {""}
+
+            def should_ignore_and_record(path_str: str, is_dir: bool) -> bool:
+                is_ignored = should_ignore(path_str, is_dir)
+                walk_counts["paths_examined"] += 1
+                if is_dir:
+                    if is_ignored:
+                        walk_counts["directories_pruned"] += 1
+                    else:
+                        walked_dirs.add(path_str)
+                elif is_ignored:
+                    walk_counts["files_ignored"] += 1
+                return is_ignored
+
+            all_eligible_code_files, doc_folder_files = _walk_project(project_root, should_ignore_and_record, doc_folders or [])
+            if state is not None:
+                for doc_path_str in doc_folder_files:
+                    walked_dirs.add(posixpath.dirname(doc_path_str))
+                state.tree_paths = walked_dirs
+    if state is not None and state.file_lists is None:
+        state.file_lists = (list(all_eligible_code_files), list(doc_folder_files))
+
+    end_phase("enumerate")
+    regex_evaluations = gitignore_matcher.regex_evaluations - regex_evaluations_before
+
     # --- Gather all documentation files from both lists ---
-    all_doc_paths = set()
+    all_doc_paths = set(doc_folder_files)
     if optional_docs:
         all_doc_paths.update(optional_docs)
-    
-    if doc_folders:
-        for folder_str in doc_folders:
-            doc_folder_path = project_root / folder_str
-            if doc_folder_path.is_dir():
-                # Recursively find all markdown files in the folder
-                for md_file in doc_folder_path.glob('**/*.md'):
-                    relative_path_str = str(md_file.relative_to(project_root)).replace("\\", "/")
-                    all_doc_paths.add(relative_path_str)
 
     # --- SECTION 1: Project Overview (from README.md) ---
     readme_path = project_root / readme_filename
     readme_content = ""
-    if readme_path.exists():
+    if readme_path.is_file():
         readme_content = readme_path.read_text(encoding="utf-8")
     else:
         readme_content = f"## Project Overview\n\n`{readme_filename}` not found. Please create one with project description."
@@ -71,158 +2127,57 @@ def generate_context_markdown(
     # --- SECTION 2: Instructions for AI Assistant (from ai_instructions.md) ---
     ai_instructions_path = project_root / ai_instructions_filename
     ai_instructions_content = ""
-    if ai_instructions_path.exists():
+    if ai_instructions_path.is_file():
         ai_instructions_content = ai_instructions_path.read_text(encoding="utf-8")
     else:
         ai_instructions_content = f"## Instructions for AI Assistant\n\n`{ai_instructions_filename}` not found. Please create one with instructions for the AI assistant."
     
     # --- SECTION 3: Optional Supplemental Documents ---
-    optional_docs_content_list = []
+    optional_doc_sections = [] # (doc path, section text)
     sorted_doc_paths = sorted(list(all_doc_paths)) # Sort for consistent order
     for doc_path_str in sorted_doc_paths:
         doc_path = project_root / doc_path_str
-        if doc_path.exists():
+        if doc_path.is_file():
             # Add a header for the document based on its filename
             doc_title = Path(doc_path_str).stem.replace('_', ' ').title()
-            optional_docs_content_list.append(f"## {doc_title}\n\n")
-            optional_docs_content_list.append(doc_path.read_text(encoding="utf-8"))
-            optional_docs_content_list.append("\n\n")
-    
-    optional_docs_str = "".join(optional_docs_content_list)
-
-    # --- Build a set of all files that are part of the preamble to avoid duplicating them ---
-    preamble_files_to_ignore = {Path(p) for p in [readme_filename, ai_instructions_filename]}
-    preamble_files_to_ignore.update({Path(p) for p in all_doc_paths})
-
-
-    # Function to parse .gitignore and return a list of regex patterns
-    def get_gitignore_patterns(gitignore_path: Path) -> List[Tuple[re.Pattern, bool]]:
-        patterns = []
-        if gitignore_path.exists():
-            with open(gitignore_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue
-                    
-                    is_negated = line.startswith('!')
-                    if is_negated:
-                        line = line[1:] # Remove '!'
-                    
-                    # Convert .gitignore patterns to regex
-                    # Escape special characters that are not * or ?
-                    pattern_str = re.escape(line)
-                    # Convert * to .* (any characters)
-                    pattern_str = pattern_str.replace(r'\*', '.*')
-                    # Convert ? to . (any single character)
-                    pattern_str = pattern_str.replace(r'\?', '.')
-                    
-                    # Handle directory patterns (ending with /)
-                    if line.endswith('/'):
-                        # Match directory itself and its contents
-                        pattern_str += '.*' 
-                    # If pattern is just a name (e.g., 'foo'), it matches files and dirs named 'foo' anywhere
-                    elif '/' not in line:
-                         pattern_str = f"(^|.*/){pattern_str}" 
-                    
-                    # Handle anchoring to project root (patterns starting with '/')
-                    if line.startswith('/'):
-                        pattern_str = pattern_str.lstrip(r'\/') # Remove escaped leading slash
-                        pattern_str = f"^{pattern_str}" # Anchor to start of relative path
-                    
-                    patterns.append((re.compile(pattern_str), is_negated))
-        return patterns
-
-    # Get .gitignore patterns
-    gitignore_path = project_root / ".gitignore"
-    ignore_patterns = get_gitignore_patterns(gitignore_path)
-
-    
-    # Function to check if a file path should be ignored
-    def should_ignore(relative_path: Path) -> bool:
-        path_str = str(relative_path).replace("\\", "/") # Standardize path separators
-        
-        # --- Check against all exclusion criteria ---
-
-        # 1. Ignore generated output files, the script itself, or preamble docs
-        if Path(output_filename).stem in path_str or \
-           relative_path == Path(__file__).relative_to(project_root) or \
-           relative_path in preamble_files_to_ignore:
-            return True
-
-        # 2. Ignore files in the explicit exclusion list
-        if relative_path in files_to_exclude_set:
-            return True
-
-        # 3. Ignore paths within any of the excluded folders
-        for excluded_folder in folders_to_exclude_set:
-            # Check if the path is the folder itself or is inside the folder
-            if excluded_folder in relative_path.parents or relative_path == excluded_folder:
-                return True
-
-        # 4. Check against .gitignore patterns
-        final_decision_is_ignored = False
-        for pattern_regex, is_negated in ignore_patterns:
-            # Check if the full relative path matches the pattern
-            if pattern_regex.fullmatch(path_str):
-                if is_negated:
-                    final_decision_is_ignored = False # A negation overrides previous ignores
-                else:
-                    final_decision_is_ignored = True # An ignore pattern matches
-            # If the pattern doesn't contain a slash, check if it matches the basename
-            elif '/' not in pattern_regex.pattern.replace(r'.\*', ''): # Check original pattern part
-                 if pattern_regex.fullmatch(os.path.basename(path_str)):
-                    if is_negated:
-                        final_decision_is_ignored = False
-                    else:
-                        final_decision_is_ignored = True
+            optional_doc_sections.append((doc_path_str, f"## {doc_title}\n\n{doc_path.read_text(encoding='utf-8')}\n\n"))
 
-        return final_decision_is_ignored
+    if state is not None:
+        state.content_paths = [readme_filename, ai_instructions_filename] + sorted_doc_paths + all_eligible_code_files
 
-    # Walk the project directory to find all files that *could* be included
-    all_eligible_code_files: List[str] = []
-    for dirpath, dirnames, filenames in os.walk(project_root):
-        current_relative_dir = Path(dirpath).relative_to(project_root)
-
-        # Filter out ignored directories *before* walking into them
-        # Create a copy of dirnames to iterate over while modifying the original list
-        dirs_to_process = dirnames[:] 
-        dirnames.clear() # Clear original list to fill with allowed ones
+    num_of_eligible_files = len(all_eligible_code_files)
 
-        for dname in dirs_to_process:
-            relative_dir_path = current_relative_dir / dname
-            if should_ignore(relative_dir_path):
-                continue
-            dirnames.append(dname)
+    end_phase("preamble")
 
-        for filename in filenames:
-            file_absolute_path = Path(dirpath) / filename
-            file_relative_path = file_absolute_path.relative_to(project_root)
-            
-            if not should_ignore(file_relative_path):
-                all_eligible_code_files.append(str(file_relative_path).replace("\\", "/"))
+    # --- Order files by import distance from the seeds, if any were given ---
+    dependency_distances: Dict[str, int] = {}
+    if seed_paths and not (pack_parts and split_output_if_truncated):
+        graph_cache_path = project_root / Path(output_filename).with_name(Path(output_filename).stem + ".graph.json")
+        import_graph = _build_import_graph(project_root, all_eligible_code_files, graph_cache_path)
+        all_eligible_code_files, dependency_distances = _order_by_dependency_distance(
+            all_eligible_code_files, import_graph, seed_paths
+        )
 
-    all_eligible_code_files.sort() # Sort all eligible files for consistent ordering
-    num_of_eligible_files = len(all_eligible_code_files)
+    end_phase("dependency_order")
 
     # --- Build the initial fixed content sections ---
     generation_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    initial_content_template = f"""
+    preamble_sections: List[Tuple[Dict[str, Any], str]] = [
+        ({"section": "title"}, f"""
 # Project Context for AI Assistant - {project_name}
 
 **Generated On:** {generation_timestamp}
 
 This document consolidates all necessary information for an AI assistant to understand the "{project_name}" project. It includes the project overview, AI instructions, supplemental documentation (if any), and the full current codebase.
 
-{readme_content}
-
-{ai_instructions_content}
-
-{optional_docs_str}
-## Current Codebase Files
-
-"""
+"""),
+        ({"section": "readme", "path": readme_filename}, f"{readme_content}\n\n"),
+        ({"section": "ai_instructions", "path": ai_instructions_filename}, f"{ai_instructions_content}\n\n"),
+    ]
+    preamble_sections.extend(({"section": "doc", "path": doc_path_str}, doc_section) for doc_path_str, doc_section in optional_doc_sections)
+    preamble_sections.append(({"section": "codebase_heading"}, "\n## Current Codebase Files\n\n"))
+    initial_content_template = "".join(section_text for _, section_text in preamble_sections)
     # Define a smaller header for subsequent parts.
     subsequent_part_header = f"""
 # Project Context for AI Assistant - {project_name} (Continued)
@@ -236,22 +2191,70 @@ This document is a continuation of the project codebase. Please ensure all parts
 """
     
     current_part_number = 1
-    current_content_for_part = []
+    current_tokens_of_part = 0
+    is_part_started = False
     code_files_included_in_current_part = [] # Files only for the current part
     all_files_included_across_parts = [] # All files included in total
-    
-    def write_part_file(part_num, content_list, is_truncated=False, total_parts=1, total_files_overall=0, files_in_this_part=0):
+    token_totals_per_part = [] # (part filename, estimated tokens) for the summary
+
+    jsonl_output_filename = Path(output_filename).with_suffix(".jsonl").as_posix()
+
+    def get_part_output_filename(part_num: int) -> str:
+        """Returns the output filename for a part (e.g., adding _part_X)."""
+        if output_format == "jsonl":
+            return jsonl_output_filename
+        if part_num > 1:
+            return Path(output_filename).stem + f"_part_{str(part_num)}" + Path(output_filename).suffix
+        return output_filename
+
+    def start_part() -> Iterator[ContextEvent]:
         """
-        Constructs and writes a single part of the project context to a file.
-        
-        This function handles the naming of the file (e.g., adding _part_X),
-        adding relevant headers and warnings, and printing a summary of the
-        generated file to the console.
+        Yields the start of the current part and its header (the preamble
+        sections for part 1), unless the part was already started.
+        """
+        nonlocal is_part_started
+        if is_part_started:
+            return
+        is_part_started = True
+        part_metadata = {
+            "part": current_part_number,
+            "filename": get_part_output_filename(current_part_number),
+            "generated_on": generation_timestamp,
+        }
+        if current_part_number > 1:
+            yield ContextEvent("part_start", subsequent_part_header, part_metadata)
+            return
+        yield ContextEvent("part_start", "", part_metadata)
+        for section_metadata, section_text in preamble_sections:
+            yield ContextEvent("preamble", section_text, section_metadata)
+
+    def emit_file(file_path_str: str, render_result, file_block: Union[str, StreamedFileBlock], block_tokens: int) -> Iterator[ContextEvent]:
+        """Yields the block of a file with its metadata, starting the current part first if needed."""
+        yield from start_part()
+        cache_entry = render_result[1] if render_result is not None else {}
+        file_metadata = {
+            "path": file_path_str,
+            "part": current_part_number,
+            "lang": cache_entry.get("lang"),
+            "kind": get_emitted_kind(file_path_str, render_result),
+            "sha256": cache_entry.get("sha256"),
+            "tokens": block_tokens,
+        }
+        if file_path_str in duplicate_of:
+            file_metadata["duplicate_of"] = duplicate_of[file_path_str]
+        if cache_entry.get("skip_reason"):
+            file_metadata["skip_reason"] = cache_entry["skip_reason"]
+        yield ContextEvent("file", file_block, file_metadata)
+
+    def finish_part(part_num, is_truncated=False, total_parts=1, total_files_overall=0, files_in_this_part=0, tokens_in_part=0) -> Iterator[ContextEvent]:
+        """
+        Yields the end of a single part of the project context.
+
+        The header and code blocks have already been yielded; this function
+        adds the relevant warnings as the text of the "part_end" event.
 
         Args:
             part_num (int): The number of this part (e.g., 1, 2).
-            content_list (list): A list of strings containing the Markdown-formatted
-                                 code content for this part.
             is_truncated (bool, optional): If True, a warning is added to indicate
                                            that not all files could be included. 
                                            Defaults to False.
@@ -264,12 +2267,12 @@ This document is a continuation of the project codebase. Please ensure all parts
             files_in_this_part (int, optional): The number of files included in
                                                 this specific part. Used in the
                                                 truncation warning. Defaults to 0.
+            tokens_in_part (int, optional): The estimated token total of the
+                                            header and blocks in this part.
+                                            Defaults to 0.
         """
-        # Determine the output filename for the current part
-        if total_parts > 1:
-            part_output_filename = Path(output_filename).stem + f"_part_{str(part_num)}" + Path(output_filename).suffix
-        else:
-            part_output_filename = output_filename
+        nonlocal is_part_started
+        part_output_filename = get_part_output_filename(part_num)
 
         part_header_warning = ""
         if total_parts > 1:
@@ -277,136 +2280,1112 @@ This document is a continuation of the project codebase. Please ensure all parts
         
         truncation_warning = ""
         if is_truncated:
-            truncation_warning = f"\n---\n**WARNING: Not all code files could be included in this part due to the `max_output_characters` limit ({str(max_output_characters)} characters).**\n"
+            truncation_warning = f"\n---\n**WARNING: Not all code files could be included in this part due to the {budget_description}.**\n"
             truncation_warning += f"Only {str(files_in_this_part)} code files are present in this part.\n"
             if total_parts == 1: # Only mention total eligible if it's the only part
                  truncation_warning += f"The project has a total of {str(total_files_overall)} eligible code files.\n"
-            truncation_warning += f"Consider increasing `max_output_characters` or utilizing the multi-file output option.\n"
+            truncation_warning += f"Consider increasing `{'max_output_tokens' if use_token_budget else 'max_output_characters'}` or utilizing the multi-file output option.\n"
             truncation_warning += f"---\n"
 
-        # Choose the correct header content based on the part number
-        header_content = initial_content_template if part_num == 1 else subsequent_part_header
-        full_part_content = header_content + "".join(content_list) + truncation_warning + part_header_warning
-        
-        # Ensure the output directory exists before writing the file.
-        full_output_path = project_root / part_output_filename
-        full_output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(full_output_path, "w", encoding="utf-8") as f:
-            f.write(full_part_content.strip())
-        
-        print(f"Successfully generated '{part_output_filename}' in the project root directory.")
-        print(f"Characters in '{full_output_path}': {len(full_part_content.strip())}")
-        print(f"Code files in this part: {str(files_in_this_part)}")
+        # Make sure the part exists even if it has no code blocks (header only)
+        yield from start_part()
+        token_totals_per_part.append((part_output_filename, tokens_in_part))
+        yield ContextEvent("part_end", truncation_warning + part_header_warning, {
+            "part": part_num,
+            "filename": part_output_filename,
+            "files": files_in_this_part,
+            "tokens": tokens_in_part,
+            "is_truncated": is_truncated,
+        })
+        is_part_started = False
         
         # Clear for next part
-        content_list.clear()
         code_files_included_in_current_part.clear()
         
     
     current_length_of_part = len(initial_content_template) # Start with the length of the main preamble for Part 1
+    current_tokens_of_part = token_estimator(initial_content_template, "markdown")
+    subsequent_part_header_tokens = token_estimator(subsequent_part_header, "markdown")
+
+    # --- Incremental cache of rendered file blocks ---
+    cache_path = project_root / Path(output_filename).with_name(Path(output_filename).stem + ".cache.json")
+    if state is not None and state.cache_entries is not None:
+        cached_entries = state.cache_entries
+    else:
+        cached_entries = _load_cache_manifest(cache_path) if use_cache else {}
+    # Keep entries of eligible files that are not rendered this run (e.g. after truncation)
+    eligible_files_set = set(all_eligible_code_files)
+    new_cache_entries = {path: entry for path, entry in cached_entries.items() if path in eligible_files_set}
+    cache_hits = 0
+    cache_misses = 0
+    # Cached blocks are only valid for the size settings that produced them
+    if render_mode not in ("full", "compact"):
+        raise ValueError(f"Unknown render_mode '{render_mode}'; expected 'full' or 'compact'.")
+    if output_format not in ("markdown", "jsonl"):
+        raise ValueError(f"Unknown output_format '{output_format}'; expected 'markdown' or 'jsonl'.")
+    if auto_exclude not in ("off", "stub", "exclude"):
+        raise ValueError(f"Unknown auto_exclude '{auto_exclude}'; expected 'off', 'stub' or 'exclude'.")
+    render_options_key = f"{max_file_bytes}:{truncate_large_files}:{render_mode}:{strip_comments}:{auto_exclude != 'off'}"
+    skip_reasons_by_file: Dict[str, str] = {} # Files replaced by a placeholder or preview
+
+    def make_streamed_block(file_path_str: str, lang: str) -> StreamedFileBlock:
+        return StreamedFileBlock(
+            header=f"### File: `{file_path_str}`\n\n```{lang}\n",
+            file_path=project_root / file_path_str,
+            footer="\n```\n\n",
+        )
+
+    def count_block_tokens(block: Union[str, StreamedFileBlock], lang: str) -> Tuple[int, int]:
+        """
+        Estimates the tokens of a rendered block, re-scanning streamed files in
+        chunks. Returns the tokens and the number of bytes read from disk.
+        """
+        if isinstance(block, str):
+            return token_estimator(block, lang), 0
+        _, _, content_tokens, scanned_bytes = _scan_text_file(block.file_path, lambda text: token_estimator(text, lang))
+        return token_estimator(block.header, lang) + content_tokens + token_estimator(block.footer, lang), scanned_bytes
+
+    def render_file_block(file_path_str: str) -> Optional[Tuple[Union[str, StreamedFileBlock], Dict[str, Any], bool, int]]:
+        """
+        Reads and renders the Markdown block for a single code file.
+
+        Cached blocks are reused when the file's size and mtime (or, failing
+        that, its content hash) are unchanged. Files of at least
+        STREAMING_THRESHOLD_BYTES are only measured here and rendered as a
+        StreamedFileBlock that the writer copies from disk in chunks. This
+        function has no side effects so it can run on worker threads; the
+        caller does the bookkeeping in file order.
+
+        Returns:
+            Optional[Tuple[Union[str, StreamedFileBlock], Dict[str, Any], bool, int]]:
+            The rendered block, its cache entry, whether it was a cache hit and
+            the number of bytes read from the file, or None if the file
+            disappeared after the scan.
+        """
+        # Plain string paths keep the common cache-hit case to a single stat
+        try:
+            file_stat = os.stat(os.path.join(project_root, file_path_str))
+        except OSError:
+            return None
+        if not stat.S_ISREG(file_stat.st_mode):
+            return None # Replaced by a directory, FIFO or socket since the scan
+
+        def reuse_cached_entry(entry, content_bytes_read: int = 0):
+            if entry.get("is_streamed"):
+                block = make_streamed_block(file_path_str, entry["lang"])
+            else:
+                block = entry["block"]
+            if token_estimator_name is None or entry.get("token_estimator") != token_estimator_name:
+                block_tokens, scanned_bytes = count_block_tokens(block, entry["lang"])
+                entry = dict(entry, token_estimator=token_estimator_name, block_tokens=block_tokens)
+                content_bytes_read += scanned_bytes
+            return block, entry, True, content_bytes_read
+
+        cached = cached_entries.get(file_path_str)
+        if cached and cached.get("render_options") != render_options_key:
+            cached = None
+        if cached and cached.get("size") == file_stat.st_size and cached.get("mtime_ns") == file_stat.st_mtime_ns:
+            try:
+                return reuse_cached_entry(cached)
+            except OSError:
+                return None
 
-    # --- Add codebase files up to the limit ---
-    for file_path_str in all_eligible_code_files:
         file_path = project_root / file_path_str
-        if file_path.exists():
-            lang = "text"
-            if file_path_str.endswith(".py"):
-                lang = "python"
-            elif file_path_str.endswith(".json"):
-                lang = "json"
-            elif file_path_str.endswith(".md"):
-                lang = "markdown"
-            elif file_path_str == ".gitignore":
-                lang = "text"
-            
-            # Handle non-text (binary) files gracefully
+
+        lang = _detect_language(file_path_str)
+
+        def render_placeholder(file_content: str, skip_reason: str, content_bytes_read: int, is_binary: bool = False, content_hash: Optional[str] = None):
+            block_lang = "text" if is_binary else lang # Ensure binary files are treated as plain text
+            block = f"### File: `{file_path_str}`\n\n```{block_lang}\n{file_content}\n```\n\n"
+            entry = {
+                "size": file_stat.st_size,
+                "mtime_ns": file_stat.st_mtime_ns,
+                "sha256": content_hash,
+                "is_binary": is_binary,
+                "is_streamed": False,
+                "lang": block_lang,
+                "token_estimator": token_estimator_name,
+                "render_options": render_options_key,
+                "skip_reason": skip_reason,
+                "block": block,
+                "block_size": len(block),
+                "block_tokens": token_estimator(block, block_lang),
+            }
+            return block, entry, False, content_bytes_read
+
+        # --- Sniff the first few KB and check the size before any full read ---
+        try:
+            with open(file_path, "rb") as f:
+                header_bytes = f.read(SNIFF_BYTES)
+        except OSError:
+            return None
+        is_header_complete = len(header_bytes) >= file_stat.st_size
+        binary_reason = _sniff_binary(header_bytes, is_header_complete)
+        if binary_reason is not None:
+            return render_placeholder(f"[Content not included: {binary_reason}]", binary_reason, len(header_bytes), is_binary=True)
+
+        # Lockfiles, minified bundles and data files are flagged from the same sample
+        if auto_exclude != "off":
+            generated_reason = _classify_generated(file_path_str, header_bytes, file_stat.st_size)
+            if generated_reason is not None:
+                render_result = render_placeholder(f"[Content not included: {generated_reason}]", generated_reason, len(header_bytes))
+                render_result[1]["auto_exclude_reason"] = generated_reason
+                return render_result
+
+        if max_file_bytes is not None and file_stat.st_size > max_file_bytes:
+            if not truncate_large_files:
+                skip_reason = f"File is {str(file_stat.st_size)} bytes, larger than max_file_bytes ({str(max_file_bytes)})"
+                return render_placeholder(f"[Content not included: {skip_reason}]", skip_reason, len(header_bytes))
             try:
-                file_content = file_path.read_text(encoding="utf-8")
+                with open(file_path, "rb") as f:
+                    preview_bytes = f.read(max_file_bytes)
+            except OSError:
+                return None
+            try:
+                # Drop a multi-byte character cut off by the preview limit
+                preview_text = codecs.getincrementaldecoder("utf-8")().decode(preview_bytes, final=False)
             except UnicodeDecodeError:
-                print(f"  [Warning] Skipping non-UTF-8 file: {file_path_str}")
-                # Use a placeholder for binary files
-                file_content = "[Content not included: File is not UTF-8 encoded, likely binary]"
-                lang = "text" # Ensure it's treated as plain text
-            
-            # Estimate the size of this file's markdown block
-            # Add 20 for markdown headers, backticks, newlines (approx)
-            block_size = len(f"### File: `{file_path_str}`\n\n```{lang}\n{file_content}\n```\n\n")
+                binary_reason = "File is not UTF-8 encoded, likely binary"
+                return render_placeholder(
+                    f"[Content not included: {binary_reason}]", binary_reason, len(header_bytes) + len(preview_bytes), is_binary=True
+                )
+            preview_text = preview_text.replace("\r\n", "\n").replace("\r", "\n")
+            skip_reason = f"Truncated to the first {str(max_file_bytes)} of {str(file_stat.st_size)} bytes (max_file_bytes)"
+            return render_placeholder(f"{preview_text}\n[... {skip_reason} ...]", skip_reason, len(header_bytes) + len(preview_bytes))
+
+        is_streamed = file_stat.st_size >= STREAMING_THRESHOLD_BYTES
+        content_bytes_read = len(header_bytes)
+        try:
+            if is_streamed:
+                content_hash, content_length, content_tokens, scanned_bytes = _scan_text_file(
+                    file_path, lambda text: token_estimator(text, lang)
+                )
+                content_bytes_read += scanned_bytes
+            elif is_header_complete:
+                file_bytes = header_bytes
+                content_hash = hashlib.sha256(file_bytes).hexdigest()
+            else:
+                file_bytes = file_path.read_bytes()
+                content_bytes_read += len(file_bytes)
+                content_hash = hashlib.sha256(file_bytes).hexdigest()
+        except OSError:
+            return None
+
+        if cached and cached.get("sha256") == content_hash:
+            # Touched but unchanged: refresh the stat fields and reuse the block
+            try:
+                return reuse_cached_entry(dict(cached, size=file_stat.st_size, mtime_ns=file_stat.st_mtime_ns), content_bytes_read)
+            except OSError:
+                return None
+
+        # Handle non-text (binary) files gracefully
+        is_binary = False
+        if is_streamed:
+            is_binary = content_length is None
+        else:
+            try:
+                file_content = _decode_text(file_bytes)
+            except UnicodeDecodeError:
+                is_binary = True
+        if is_binary:
+            # Use a placeholder for binary files
+            file_content = "[Content not included: File is not UTF-8 encoded, likely binary]"
+            lang = "text" # Ensure it's treated as plain text
+            is_streamed = False
+
+        entry = {
+            "size": file_stat.st_size,
+            "mtime_ns": file_stat.st_mtime_ns,
+            "sha256": content_hash,
+            "is_binary": is_binary,
+            "is_streamed": is_streamed,
+            "lang": lang,
+            "token_estimator": token_estimator_name,
+            "render_options": render_options_key,
+            "skip_reason": "File is not UTF-8 encoded, likely binary" if is_binary else None,
+        }
+        if is_streamed:
+            block = make_streamed_block(file_path_str, lang)
+            entry["block"] = None
+            entry["block_size"] = len(block.header) + content_length + len(block.footer)
+            entry["block_tokens"] = (
+                token_estimator(block.header, lang) + content_tokens + token_estimator(block.footer, lang)
+            )
+        else:
+            block = f"### File: `{file_path_str}`\n\n```{lang}\n{file_content}\n```\n\n"
+            entry["original_block_size"] = len(block)
+            if render_mode == "compact" and not is_binary:
+                prologue, license_header, file_body = _split_license_header(file_content)
+                compact_body = compact_source(file_body, lang, strip_comments)
+                if license_header and not strip_comments:
+                    # Keep a variant without the header for files whose license
+                    # was already emitted; the in-order consumer picks one
+                    entry["license_hash"] = hashlib.sha256(license_header.strip().encode("utf-8")).hexdigest()
+                    stripped_body = f"{prologue}\n{compact_body}" if prologue else compact_body
+                    stripped_block = f"### File: `{file_path_str}`\n\n```{lang}\n{stripped_body}\n```\n\n"
+                    entry["stripped_block"] = stripped_block
+                    entry["stripped_block_size"] = len(stripped_block)
+                    entry["stripped_block_tokens"] = token_estimator(stripped_block, lang)
+                    compact_body = f"{license_header}\n{compact_body}"
+                if prologue:
+                    # The shebang and encoding cookie must stay on the first lines
+                    compact_body = f"{prologue}\n{compact_body}"
+                block = f"### File: `{file_path_str}`\n\n```{lang}\n{compact_body}\n```\n\n"
+            entry["block"] = block
+            entry["block_size"] = len(block)
+            entry["block_tokens"] = token_estimator(block, lang)
+        return block, entry, False, content_bytes_read
+
+    render_seconds_by_file: Dict[str, float] = {} # For the profile report
+
+    def timed_render_file_block(file_path_str: str):
+        render_started = time.perf_counter()
+        render_result = render_file_block(file_path_str)
+        render_seconds_by_file[file_path_str] = render_seconds_by_file.get(file_path_str, 0.0) + time.perf_counter() - render_started
+        return render_result
+
+    def iter_all_rendered_blocks(file_paths: List[str]):
+        """
+        Yields (file_path_str, render_result) pairs in the order of `file_paths`.
+
+        With more than one worker, reading, decoding and rendering run on a
+        thread pool in batches of RENDER_BATCH_SIZE files (so that cache hits,
+        which only cost a stat, are not dominated by per-task overhead) while
+        at most `workers * 2` batches are in flight, so the consumer stays
+        strictly ordered and memory stays bounded.
+        """
+        render = timed_render_file_block if profile else render_file_block
+        if workers <= 1:
+            for file_path_str in file_paths:
+                yield file_path_str, render(file_path_str)
+            return
+
+        def render_batch(batch: List[str]) -> List[Any]:
+            return [render(file_path_str) for file_path_str in batch]
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        pending = deque()
+        batches_iter = (file_paths[i:i + RENDER_BATCH_SIZE] for i in range(0, len(file_paths), RENDER_BATCH_SIZE))
+        try:
+            for batch in itertools.islice(batches_iter, workers * 2):
+                pending.append((batch, executor.submit(render_batch, batch)))
+            while pending:
+                batch, future = pending.popleft()
+                next_batch = next(batches_iter, None)
+                if next_batch is not None:
+                    pending.append((next_batch, executor.submit(render_batch, next_batch)))
+                yield from zip(batch, future.result())
+        finally:
+            # Stop queued reads early if the consumer stopped (e.g. truncation)
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def iter_rendered_blocks(file_paths: List[str]):
+        """
+        Like `iter_all_rendered_blocks`, but with `auto_exclude="exclude"` the
+        files flagged as generated or data-heavy are recorded and left out,
+        and no longer count as eligible.
+        """
+        nonlocal num_of_eligible_files
+        rendered_blocks = iter_all_rendered_blocks(file_paths)
+        if auto_exclude != "exclude":
+            yield from rendered_blocks
+            return
+        try:
+            for file_path_str, render_result in rendered_blocks:
+                if render_result is not None and render_result[1].get("auto_exclude_reason"):
+                    if file_path_str not in auto_exclude_reasons:
+                        take_render_result(file_path_str, render_result)
+                        num_of_eligible_files -= 1
+                    continue
+                yield file_path_str, render_result
+        finally:
+            rendered_blocks.close()
+
+    # --- Compact rendering state ---
+    first_file_by_license_hash: Dict[str, str] = {}
+    compaction_sizes: Dict[str, Tuple[int, int]] = {} # File -> (full block size, emitted block size)
+
+    # --- Content-hash deduplication state ---
+    first_file_by_content_hash: Dict[str, str] = {}
+    duplicate_of: Dict[str, str] = {} # Duplicate file -> first file with the same content
+    dedup_bytes_saved = 0
+    dedup_characters_saved = 0
+    dedup_tokens_saved = 0
+
+    # --- Files flagged as generated or data-heavy ---
+    auto_exclude_reasons: Dict[str, str] = {} # Stubbed or excluded file -> why
+
+    bytes_read = 0 # File content read while rendering and outlining, for the profile report
+    file_sizes_by_path: Dict[str, int] = {}
+
+    def take_render_result(
+        file_path_str: str,
+        render_result,
+        record: bool = True,
+        keep_license: bool = False
+    ) -> Tuple[Union[str, StreamedFileBlock], int, int]:
+        """
+        Does the in-order bookkeeping for a render result (cache counters and
+        entries, binary warnings, deduplication) and returns the block with its
+        size and estimated tokens. A file that disappeared after the scan
+        becomes a NOT FOUND note, and with `deduplicate` a file whose content
+        was already seen becomes a one-line reference. With `record=False` only
+        the block is returned, for files that were already accounted for in a
+        measuring pass. With `keep_license=True` the file is measured with its
+        license header even if that header was already emitted, for a measuring
+        pass whose order is not the emission order.
+        """
+        nonlocal cache_hits, cache_misses
+        if render_result is None:
+            # This case indicates a file listed by the walk did not exist when read
+            error_msg = f"### File: `{file_path_str}` - NOT FOUND (Error: File disappeared after scan)\n\n"
+            return error_msg, len(error_msg), token_estimator(error_msg, "markdown")
+
+        file_block, cache_entry, is_cache_hit, content_bytes_read = render_result
+        if record:
+            if is_cache_hit:
+                cache_hits += 1
+            else:
+                cache_misses += 1
+            if profile:
+                nonlocal bytes_read
+                bytes_read += content_bytes_read
+                file_sizes_by_path[file_path_str] = cache_entry["size"]
+            if use_cache or state is not None:
+                new_cache_entries[file_path_str] = cache_entry
+            if cache_entry.get("auto_exclude_reason"):
+                auto_exclude_reasons[file_path_str] = cache_entry["auto_exclude_reason"]
+            elif cache_entry.get("skip_reason"):
+                skip_reasons_by_file[file_path_str] = cache_entry["skip_reason"]
+                if cache_entry["is_binary"]:
+                    warn(f"Skipping binary file: {file_path_str} ({cache_entry['skip_reason']})")
+                else:
+                    warn(f"Not including full content of: {file_path_str} ({cache_entry['skip_reason']})")
+
+        # The exact size and estimated tokens of this file's markdown block
+        block_size, block_tokens = cache_entry["block_size"], cache_entry["block_tokens"]
+
+        # In compact mode each distinct license header is only emitted with the
+        # first file whose full block carries it (see `register_full_block`)
+        license_hash = cache_entry.get("license_hash")
+        is_repeated_license = False
+        if license_hash and not keep_license:
+            is_repeated_license = first_file_by_license_hash.get(license_hash, file_path_str) != file_path_str
+            if is_repeated_license:
+                file_block = cache_entry["stripped_block"]
+                block_size, block_tokens = cache_entry["stripped_block_size"], cache_entry["stripped_block_tokens"]
+        if (record or is_repeated_license) and render_mode == "compact" and cache_entry.get("original_block_size"):
+            compaction_sizes[file_path_str] = (cache_entry["original_block_size"], block_size)
+
+        # Emit each distinct content once; later copies only reference the first
+        # copy whose full block was emitted (see `register_full_block`)
+        content_hash = cache_entry.get("sha256")
+        if deduplicate and content_hash:
+            if record:
+                first_file_path_str = first_file_by_content_hash.get(content_hash, file_path_str)
+            else:
+                first_file_path_str = duplicate_of.get(file_path_str, file_path_str)
+            if first_file_path_str != file_path_str:
+                reference_block = f"### File: `{file_path_str}`\n\nIdentical to `{first_file_path_str}` (content not repeated).\n\n"
+                if len(reference_block) < block_size:
+                    reference_tokens = token_estimator(reference_block, "markdown")
+                    if record:
+                        nonlocal dedup_bytes_saved, dedup_characters_saved, dedup_tokens_saved
+                        duplicate_of[file_path_str] = first_file_path_str
+                        dedup_bytes_saved += cache_entry["size"]
+                        dedup_characters_saved += block_size - len(reference_block)
+                        dedup_tokens_saved += block_tokens - reference_tokens
+                    return reference_block, len(reference_block), reference_tokens
+
+        return file_block, block_size, block_tokens
+
+    def register_full_block(file_path_str: str, render_result, register_license: bool = True) -> None:
+        """
+        Makes a file the copy that later files with the same content refer to,
+        and the owner of its license header, once it is certain that its full
+        block is emitted. Files that were skipped, outlined or replaced by a
+        reference are never referred to and never own a license header.
+        """
+        if render_result is None or file_path_str in outline_reasons or file_path_str in duplicate_of:
+            return
+        cache_entry = render_result[1]
+        if register_license and cache_entry.get("license_hash"):
+            first_file_by_license_hash.setdefault(cache_entry["license_hash"], file_path_str)
+        if deduplicate and cache_entry.get("sha256"):
+            first_file_by_content_hash.setdefault(cache_entry["sha256"], file_path_str)
+
+    # --- Outline fallback state ---
+    outline_cache_path = project_root / Path(output_filename).with_name(Path(output_filename).stem + ".outlines.json")
+    cached_outlines: Dict[str, str] = state.outlines if state is not None and state.outlines is not None else {}
+    if use_cache and not cached_outlines and (outline_fallback or outline_threshold_bytes is not None):
+        try:
+            with open(outline_cache_path, "r", encoding="utf-8") as f:
+                outline_manifest = json.load(f)
+            if isinstance(outline_manifest, dict) and outline_manifest.get("version") == OUTLINE_CACHE_VERSION:
+                cached_outlines = outline_manifest.get("outlines", {})
+        except (OSError, ValueError):
+            pass
+    used_outlines: Dict[str, str] = {} # Content hash -> outline, for the files outlined this run
+    outline_reasons: Dict[str, str] = {} # Outlined file -> why it was outlined
+
+    def render_outline_block(file_path_str: str, render_result) -> Optional[Tuple[str, int, int]]:
+        """
+        Renders the outline block of a file, reusing outlines cached by content
+        hash. Streamed files are outlined line by line instead of being read
+        whole. Returns None for missing, binary and placeholder files, and for
+        files whose outline would not be smaller than their full block.
+        """
+        if render_result is None:
+            return None
+        cache_entry = render_result[1]
+        content_hash = cache_entry.get("sha256")
+        if not content_hash or cache_entry.get("skip_reason"):
+            return None
+        lang = cache_entry["lang"]
+        outline = used_outlines.get(content_hash)
+        if outline is None:
+            outline = cached_outlines.get(content_hash)
+        if outline is None:
+            try:
+                if cache_entry.get("is_streamed"):
+                    outline = outline_file_lines(project_root / file_path_str, lang)
+                    outline_bytes_read = cache_entry["size"] # Read to the end, line by line
+                else:
+                    file_bytes = (project_root / file_path_str).read_bytes()
+                    outline_bytes_read = len(file_bytes)
+                    outline = outline_source(_decode_text(file_bytes), lang)
+            except (OSError, UnicodeDecodeError):
+                return None
+            if profile:
+                nonlocal bytes_read
+                bytes_read += outline_bytes_read
+        used_outlines[content_hash] = outline
+        outline_block = (
+            f"### File: `{file_path_str}` (outline)\n\n"
+            f"Outline only ({str(cache_entry['size'])} bytes in full): signatures and docstrings, bodies omitted.\n\n"
+            f"```{lang}\n{outline or '[No outline available]'}\n```\n\n"
+        )
+        if len(outline_block) >= cache_entry["block_size"]:
+            return None
+        return outline_block, len(outline_block), token_estimator(outline_block, lang)
+
+    def is_over_outline_threshold(render_result) -> bool:
+        return outline_threshold_bytes is not None and render_result is not None and render_result[1]["size"] > outline_threshold_bytes
+
+    def get_emitted_kind(file_path_str: str, render_result) -> str:
+        """How a file was emitted: in full, as an outline, placeholder or duplicate reference, or missing."""
+        if render_result is None:
+            return "missing"
+        if file_path_str in outline_reasons:
+            return "outline"
+        if file_path_str in duplicate_of:
+            return "duplicate"
+        if render_result[1].get("skip_reason"):
+            return "placeholder"
+        return "full"
+
+    def recheck_streamed_block(file_path_str: str, render_result):
+        """
+        Streamed content is copied from disk when it is written, so a file that
+        changed since it was measured could overflow its part; it is replaced
+        by a placeholder instead.
+        """
+        cache_entry = render_result[1]
+        try:
+            file_stat = os.stat(os.path.join(project_root, file_path_str))
+        except OSError:
+            return None
+        if file_stat.st_size == cache_entry["size"] and file_stat.st_mtime_ns == cache_entry["mtime_ns"]:
+            return render_result
+        skip_reason = "File changed while the output was generated"
+        warn(f"Not including full content of: {file_path_str} ({skip_reason})")
+        skip_reasons_by_file[file_path_str] = skip_reason
+        block = f"### File: `{file_path_str}`\n\n```text\n[Content not included: {skip_reason}]\n```\n\n"
+        cache_entry = dict(cache_entry, sha256=None, skip_reason=skip_reason, block_size=len(block), block_tokens=token_estimator(block, "text"))
+        return block, cache_entry, render_result[2], render_result[3]
+
+    if output_format == "jsonl":
+        # --- Every file in one part, without a budget ---
+        for file_path_str, render_result in iter_rendered_blocks(all_eligible_code_files):
+            file_block, _, block_tokens = take_render_result(file_path_str, render_result)
+            if is_over_outline_threshold(render_result) and file_path_str not in duplicate_of:
+                outline_result = render_outline_block(file_path_str, render_result)
+                if outline_result is not None:
+                    file_block, _, block_tokens = outline_result
+                    outline_reasons[file_path_str] = f"larger than outline_threshold_bytes ({str(outline_threshold_bytes)})"
+            register_full_block(file_path_str, render_result)
+            yield from emit_file(file_path_str, render_result, file_block, block_tokens)
+            current_tokens_of_part += block_tokens
+            if render_result is not None:
+                all_files_included_across_parts.append(file_path_str)
+                code_files_included_in_current_part.append(file_path_str)
+        yield from finish_part(
+            current_part_number,
+            total_files_overall=num_of_eligible_files,
+            files_in_this_part=len(code_files_included_in_current_part),
+            tokens_in_part=current_tokens_of_part
+        )
+
+    elif pack_parts and split_output_if_truncated:
+        # --- Measure every block first, then pack the files into as few parts as possible ---
+        file_costs = []
+        file_sizes = {}
+        # Kept for the emission pass so that no file is read twice; large files
+        # are only held as a StreamedFileBlock
+        render_results = {}
+        for file_path_str, render_result in iter_rendered_blocks(all_eligible_code_files):
+            render_results[file_path_str] = render_result
+            # Measured with their license header: owners are only known in packed order
+            _, block_size, block_tokens = take_render_result(file_path_str, render_result, keep_license=True)
+            if is_over_outline_threshold(render_result) and file_path_str not in duplicate_of:
+                outline_result = render_outline_block(file_path_str, render_result)
+                if outline_result is not None:
+                    _, block_size, block_tokens = outline_result
+                    outline_reasons[file_path_str] = f"larger than outline_threshold_bytes ({str(outline_threshold_bytes)})"
+            # Packing never drops a file; license owners are chosen in packed order below
+            register_full_block(file_path_str, render_result, register_license=False)
+            file_sizes[file_path_str] = (block_size, block_tokens)
+            file_costs.append((file_path_str, block_tokens if use_token_budget else block_size))
+
+        if use_token_budget:
+            first_part_capacity = budget_limit - current_tokens_of_part
+            part_capacity = budget_limit - subsequent_part_header_tokens
+        else:
+            first_part_capacity = budget_limit - current_length_of_part
+            part_capacity = budget_limit - len(subsequent_part_header)
+        packed_parts = _pack_files_into_parts(file_costs, first_part_capacity, part_capacity)
+
+        # --- Emit the measured blocks part by part, streaming each block into its part ---
+        for part_index, part_files in enumerate(packed_parts, start=1):
+            current_part_number = part_index
+            if part_index > 1:
+                current_tokens_of_part = subsequent_part_header_tokens
+            for file_path_str in part_files:
+                render_result = render_results.pop(file_path_str)
+                if render_result is not None and isinstance(render_result[0], StreamedFileBlock) and \
+                        file_path_str not in outline_reasons and file_path_str not in duplicate_of:
+                    render_result = recheck_streamed_block(file_path_str, render_result)
+                file_block, block_size, block_tokens = take_render_result(file_path_str, render_result, record=False)
+                if file_path_str in outline_reasons:
+                    file_block, block_size, block_tokens = render_outline_block(file_path_str, render_result)
+                file_sizes[file_path_str] = (block_size, block_tokens) # Smaller if its license was stripped
+                register_full_block(file_path_str, render_result)
+                yield from emit_file(file_path_str, render_result, file_block, block_tokens)
+                current_tokens_of_part += block_tokens
+                if render_result is not None:
+                    all_files_included_across_parts.append(file_path_str) # Track all files
+                    code_files_included_in_current_part.append(file_path_str) # Track files in current part
+            yield from finish_part(
+                part_index,
+                is_truncated=False,
+                total_parts=len(packed_parts),
+                total_files_overall=num_of_eligible_files,
+                files_in_this_part=len(code_files_included_in_current_part),
+                tokens_in_part=current_tokens_of_part
+            )
+
+        # --- Write a compact index of which file lives in which part ---
+        index_output_filename = Path(output_filename).with_name(Path(output_filename).stem + "_index" + Path(output_filename).suffix).as_posix()
+        index_lines = [
+            f"# Project Context Index - {project_name}",
+            "",
+            f"**Generated On:** {generation_timestamp}",
+            "",
+            f"The codebase is split into {str(len(packed_parts))} parts. This index lists the part holding each file and the size of its block.",
+            "",
+            "| File | Part | Characters | Est. Tokens |",
+            "| ---- | ---- | ---------- | ----------- |",
+        ]
+        for part_index, part_files in enumerate(packed_parts, start=1):
+            for file_path_str in part_files:
+                block_size, block_tokens = file_sizes[file_path_str]
+                index_lines.append(f"| `{file_path_str}` | {str(part_index)} | {str(block_size)} | {str(block_tokens)} |")
+        yield ContextEvent("index", "\n".join(index_lines), {"filename": index_output_filename})
+        current_part_number = len(packed_parts)
+
+    else:
+        # --- Add codebase files up to the limit, streaming each block into its part ---
+        for file_path_str, render_result in iter_rendered_blocks(all_eligible_code_files):
+            file_block, block_size, block_tokens = take_render_result(file_path_str, render_result)
+            if render_result is None:
+                yield from emit_file(file_path_str, render_result, file_block, block_tokens)
+                current_length_of_part += block_size
+                current_tokens_of_part += block_tokens
+                continue
+
+            is_duplicate = file_path_str in duplicate_of
+            if is_over_outline_threshold(render_result) and not is_duplicate:
+                outline_result = render_outline_block(file_path_str, render_result)
+                if outline_result is not None:
+                    file_block, block_size, block_tokens = outline_result
+                    outline_reasons[file_path_str] = f"larger than outline_threshold_bytes ({str(outline_threshold_bytes)})"
 
             # Check if adding this file exceeds the limit for the current part
-            if current_length_of_part + block_size > max_output_characters:
+            current_usage = current_tokens_of_part if use_token_budget else current_length_of_part
+            if outline_fallback and not is_duplicate and file_path_str not in outline_reasons and \
+                    current_usage + (block_tokens if use_token_budget else block_size) > budget_limit:
+                # Fall back to an outline of the file before starting a new part
+                outline_result = render_outline_block(file_path_str, render_result)
+                if outline_result is not None and \
+                        current_usage + (outline_result[2] if use_token_budget else outline_result[1]) <= budget_limit:
+                    file_block, block_size, block_tokens = outline_result
+                    outline_reasons[file_path_str] = "did not fit in full"
+            if current_usage + (block_tokens if use_token_budget else block_size) > budget_limit:
                 if split_output_if_truncated:
                     # Write the current part and start a new one
-                    write_part_file(
+                    yield from finish_part(
                         current_part_number, 
-                        current_content_for_part, 
                         is_truncated=True, 
                         total_parts=current_part_number, # Will be updated for next part
                         total_files_overall=num_of_eligible_files,
-                        files_in_this_part=len(code_files_included_in_current_part)
+                        files_in_this_part=len(code_files_included_in_current_part),
+                        tokens_in_part=current_tokens_of_part
                     )
                     current_part_number += 1
                     # CRITICAL: Reset length for the new part using the smaller header
                     current_length_of_part = len(subsequent_part_header) 
+                    current_tokens_of_part = subsequent_part_header_tokens
+                elif outline_fallback:
+                    # Skip this file but keep trying the rest, whose outlines may still fit
+                    continue
                 else:
                     # If not splitting, just truncate and exit loop
-                    print(f"Stopping content generation for a single file due to character limit ({str(max_output_characters)}).")
+                    log(f"Stopping content generation for a single file due to {'token' if use_token_budget else 'character'} limit ({str(budget_limit)}).")
                     break # Stop adding files
 
-            current_content_for_part.append(f"### File: `{file_path_str}`\n\n")
-            current_content_for_part.append(f"```{lang}\n")
-            current_content_for_part.append(file_content)
-            current_content_for_part.append(f"\n```\n\n")
+            register_full_block(file_path_str, render_result)
+            yield from emit_file(file_path_str, render_result, file_block, block_tokens)
             
             current_length_of_part += block_size
+            current_tokens_of_part += block_tokens
             all_files_included_across_parts.append(file_path_str) # Track all files
             code_files_included_in_current_part.append(file_path_str) # Track files in current part
-        else:
-            # This case indicates a file listed by os.walk did not exist when read
-            error_msg = f"### File: `{file_path_str}` - NOT FOUND (Error: File disappeared after scan)\n\n"
-            current_content_for_part.append(error_msg)
-            current_length_of_part += len(error_msg)
-    
-    # Write the last part if there's any content left
-    if current_content_for_part:
-        is_final_part_truncated = (len(all_files_included_across_parts) < num_of_eligible_files) and not split_output_if_truncated
-        write_part_file(
-            current_part_number, 
-            current_content_for_part, 
-            is_truncated=is_final_part_truncated, 
-            total_parts=current_part_number,
-            total_files_overall=num_of_eligible_files,
-            files_in_this_part=len(code_files_included_in_current_part)
-        )
+        
+        # Finish the last part if any content was written to it
+        if is_part_started:
+            is_final_part_truncated = (len(all_files_included_across_parts) < num_of_eligible_files) and not split_output_if_truncated
+            yield from finish_part(
+                current_part_number, 
+                is_truncated=is_final_part_truncated, 
+                total_parts=current_part_number,
+                total_files_overall=num_of_eligible_files,
+                files_in_this_part=len(code_files_included_in_current_part),
+                tokens_in_part=current_tokens_of_part
+            )
+
+    end_phase("render_and_write")
+
+    if state is not None:
+        # Keep the cache in memory; the manifest on disk is left as it was
+        state.cache_entries = new_cache_entries
+        state.outlines = used_outlines
+    elif use_cache:
+        # Cache hits reuse the loaded entries, so a warm run with no changes compares cheaply
+        if new_cache_entries != cached_entries:
+            _save_cache_manifest(cache_path, new_cache_entries)
+        if used_outlines and used_outlines != cached_outlines:
+            temp_path = outline_cache_path.with_name(outline_cache_path.name + ".tmp")
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": OUTLINE_CACHE_VERSION, "outlines": used_outlines}, f, ensure_ascii=False)
+            os.replace(temp_path, outline_cache_path)
+
+    end_phase("cache_save")
 
     # --- FINAL SUMMARY REPORT ---
-    print("\n--- Summary of Generated Context ---")
+    log("\n--- Summary of Generated Context ---")
+
+    if use_cache:
+        log("\n--- Incremental Cache ---")
+        log(f"Cache hits: {str(cache_hits)} (reused without re-rendering), cache misses: {str(cache_misses)} (read and rendered)")
+        log("------------------------------------------")
     
+    # List the estimated token total of every part.
+    log(f"\n--- Estimated Tokens per Part ({'budget: ' + str(max_output_tokens) + ' tokens' if use_token_budget else 'informational'}) ---")
+    for part_output_filename, tokens_in_part in token_totals_per_part:
+        log(f"- {part_output_filename}: ~{str(tokens_in_part)} tokens")
+    log("------------------------------------------")
+
+    # Summarize the dependency-driven selection.
+    if dependency_distances:
+        log(f"\n--- Dependency Selection (seeds: {', '.join(seed_paths)}) ---")
+        log(f"Files reachable from the seeds: {str(len(dependency_distances))} (max import distance {str(max(dependency_distances.values()))})")
+        included_reachable = sum(1 for p in all_files_included_across_parts if p in dependency_distances)
+        log(f"Reachable files included: {str(included_reachable)}/{str(len(dependency_distances))}")
+        log("------------------------------------------")
+    elif seed_paths and not (pack_parts and split_output_if_truncated):
+        warnings.append(f"No eligible files matched the seed paths: {', '.join(seed_paths)}")
+        log(f"\n[Warning] {warnings[-1]}")
+
+    # Report how much compact rendering reduced each file.
+    if render_mode == "compact" and compaction_sizes:
+        total_original = sum(original for original, _ in compaction_sizes.values())
+        total_compacted = sum(compacted for _, compacted in compaction_sizes.values())
+        log(f"\n--- Compact Rendering ({str(total_original)} -> {str(total_compacted)} characters, {(1 - total_compacted / total_original) * 100:.1f}% smaller) ---")
+        for file_path_str, (original, compacted) in compaction_sizes.items():
+            if compacted < original:
+                log(f"- {file_path_str}: {str(original)} -> {str(compacted)} characters ({(1 - compacted / original) * 100:.1f}% smaller)")
+        log("------------------------------------------")
+
+    # List the files that were included as an outline only, and why.
+    if outline_reasons:
+        log(f"\n--- Files Included as Outlines ({str(len(outline_reasons))}) ---")
+        for file_path_str, outline_reason in outline_reasons.items():
+            log(f"- {file_path_str}: {outline_reason}")
+        log("------------------------------------------")
+
+    # List the files that were replaced by a reference to identical content.
+    if duplicate_of:
+        log(f"\n--- Deduplicated Files ({str(len(duplicate_of))}) ---")
+        for file_path_str, first_file_path_str in duplicate_of.items():
+            log(f"- {file_path_str} (identical to {first_file_path_str})")
+        log(f"Saved {str(dedup_bytes_saved)} bytes of file content: {str(dedup_characters_saved)} characters and ~{str(dedup_tokens_saved)} tokens of output.")
+        log("------------------------------------------")
+
+    # List the files that were flagged as generated or data-heavy, and why.
+    if auto_exclude_reasons:
+        log(f"\n--- Files {'Excluded' if auto_exclude == 'exclude' else 'Stubbed'} as Generated or Data ({str(len(auto_exclude_reasons))}) ---")
+        for file_path_str, auto_exclude_reason in auto_exclude_reasons.items():
+            log(f"- {file_path_str}: {auto_exclude_reason}")
+        log("------------------------------------------")
+
+    # List the files whose content was replaced by a placeholder or preview, and why.
+    if skip_reasons_by_file:
+        log(f"\n--- Files Skipped or Truncated ({str(len(skip_reasons_by_file))}) ---")
+        for file_path_str, skip_reason in skip_reasons_by_file.items():
+            log(f"- {file_path_str}: {skip_reason}")
+        log("------------------------------------------")
+
     # List all documentation files that were included in the preamble.
-    print(f"\n--- Documentation Files Included in Preamble ({str(len(sorted_doc_paths))}) ---")
+    log(f"\n--- Documentation Files Included in Preamble ({str(len(sorted_doc_paths))}) ---")
     if sorted_doc_paths:
         for doc_path in sorted_doc_paths:
-            print(f"- {doc_path}")
+            log(f"- {doc_path}")
     else:
-        print("No optional documentation files were found or included.")
-    print("------------------------------------------")
+        log("No optional documentation files were found or included.")
+    log("------------------------------------------")
 
     # List all codebase files that were included.
-    print(f"\n--- Codebase Files Included ({str(len(all_files_included_across_parts))}/{str(num_of_eligible_files)}) ---")
+    log(f"\n--- Codebase Files Included ({str(len(all_files_included_across_parts))}/{str(num_of_eligible_files)}) ---")
     if all_files_included_across_parts:
         for file_path_str in all_files_included_across_parts:
-            print(f"- {file_path_str}")
+            log(f"- {file_path_str}")
         if len(all_files_included_across_parts) < num_of_eligible_files:
-            print(f"... and {str(num_of_eligible_files - len(all_files_included_across_parts))} more files were omitted due to character limit.")
+            log(f"... and {str(num_of_eligible_files - len(all_files_included_across_parts))} more files were omitted due to {'token' if use_token_budget else 'character'} limit.")
     else:
-        print("No codebase files were included (either none found or all filtered/truncated).")
-    print("------------------------------------------\n")
+        log("No codebase files were included (either none found or all filtered/truncated).")
+    log("------------------------------------------\n")
     
 
-    print("Please review the content.")
+    log("Please review the content.")
     if current_part_number > 1:
-        print(f"\nIMPORTANT: Multiple files were generated: {Path(output_filename).stem}_part_1.md through {Path(output_filename).stem}_part_{str(current_part_number)}.md.")
-        print("When starting a new conversation with an AI, you MUST copy the *entire content* of **ALL** generated parts, one after the other, into the prompt.")
-        print("Start with Part 1, then Part 2, and so on.")
+        log(f"\nIMPORTANT: Multiple files were generated: {Path(output_filename).stem}_part_1.md through {Path(output_filename).stem}_part_{str(current_part_number)}.md.")
+        log("When starting a new conversation with an AI, you MUST copy the *entire content* of **ALL** generated parts, one after the other, into the prompt.")
+        log("Start with Part 1, then Part 2, and so on.")
     else:
-        print("\nWhen starting a new conversation with an AI, copy the *entire content* of this file into the prompt.")
\ No newline at end of file
+        log("\nWhen starting a new conversation with an AI, copy the *entire content* of this file into the prompt.")
+    end_phase("summary")
+
+    # --- Optional profile report, passed on with the summary ---
+    profile_report = None
+    if profile:
+        slowest_files = sorted(render_seconds_by_file.items(), key=lambda item: item[1], reverse=True)[:PROFILE_TOP_FILES]
+        largest_files = sorted(file_sizes_by_path.items(), key=lambda item: item[1], reverse=True)[:PROFILE_TOP_FILES]
+        profile_report = {
+            "version": PROFILE_REPORT_VERSION,
+            "generated_on": generation_timestamp,
+            "options": {"file_source": file_source, "workers": workers, "use_cache": use_cache, "render_mode": render_mode},
+            "total_seconds": time.perf_counter() - run_started,
+            "phase_seconds": phase_seconds,
+            # Rendering overlaps writing (and runs on `workers` threads), so these are not phases
+            "render_seconds_summed": sum(render_seconds_by_file.values()),
+            "write_seconds": 0.0, # Filled in by the writer, with "bytes_written"
+            "counts": dict(
+                walk_counts,
+                gitignore_files_loaded=gitignore_matcher.gitignore_files_loaded,
+                gitignore_regex_evaluations=regex_evaluations,
+                eligible_files=num_of_eligible_files,
+                files_auto_excluded=len(auto_exclude_reasons),
+                files_included=len(all_files_included_across_parts),
+                cache_hits=cache_hits,
+                cache_misses=cache_misses,
+                parts=len(token_totals_per_part),
+            ),
+            "bytes_read": bytes_read,
+            "bytes_written": 0,
+            "slowest_files": [{"path": path, "seconds": seconds} for path, seconds in slowest_files],
+            "largest_files": [{"path": path, "bytes": size} for path, size in largest_files],
+            "peak_memory_kib": _peak_memory_kib(),
+        }
+    yield ContextEvent("summary", "", {
+        "files_included": list(all_files_included_across_parts),
+        "parts": [{"filename": part_output_filename, "tokens": tokens_in_part} for part_output_filename, tokens_in_part in token_totals_per_part],
+        "profile_report": profile_report,
+        "warnings": warnings,
+    })
+
+def generate_context_markdown(
+    output_filename: str = "output/project_context.md",
+    project_name: str = "Unnamed Project",
+    readme_filename: str = "README.md",
+    ai_instructions_filename: str = "docs/ai_instructions.md",
+    optional_docs: Optional[List[str]] = None,
+    doc_folders: Optional[List[str]] = None,
+    exclude_files: Optional[List[str]] = None,
+    exclude_folders: Optional[List[str]] = None,
+    max_output_characters: int = 500000,
+    split_output_if_truncated: bool = False,
+    use_cache: bool = False,
+    workers: int = 1,
+    max_output_tokens: Optional[int] = None,
+    token_estimator: Optional[Callable[[str, str], int]] = None,
+    pack_parts: bool = False,
+    file_source: str = "walk",
+    deduplicate: bool = False,
+    seed_paths: Optional[List[str]] = None,
+    render_mode: str = "full",
+    strip_comments: bool = False,
+    outline_fallback: bool = False,
+    outline_threshold_bytes: Optional[int] = None,
+    max_file_bytes: Optional[int] = None,
+    truncate_large_files: bool = False,
+    auto_exclude: str = "off",
+    profile: bool = False,
+    write_sidecar_index: bool = False,
+    output_format: str = "markdown",
+    state: Optional[GenerationState] = None,
+    project_root: Optional[Union[str, Path]] = None,
+    log: Callable[[str], None] = print
+) -> Dict[str, Any]:
+    """
+    Combines project information and code files into a single Markdown file(s)
+    for AI context preservation.
+
+    Writes the events of `iter_project_context` to files under the project
+    root and prints progress and a summary to the console.
+
+    Args:
+        The options of `iter_project_context` (`log` defaults to `print`), plus:
+        profile (bool): If True, writes the profile report next to the output
+                        (`<stem>.profile.json`), including the time spent and
+                        bytes written by this writer.
+        write_sidecar_index (bool): If True, writes `<stem>.index.json` next to the output,
+                                    giving for every emitted file its part, the byte
+                                    offset and length of its block (or JSONL record),
+                                    its language, content hash, estimated tokens and
+                                    whether it was emitted in full, as an outline, as a
+                                    placeholder or as a duplicate reference.
+        output_format (str): "markdown" (default) writes the Markdown part files.
+                             "jsonl" writes `<stem>.jsonl` instead: a preamble record
+                             followed by one record per file with its path, language,
+                             content hash, estimated tokens and content. The JSONL file
+                             is not budgeted or split; outline thresholds, compact
+                             rendering and deduplication still apply.
+        state (Optional[GenerationState]): As for `iter_project_context`; in addition,
+                                           part files whose content did not change
+                                           are left untouched.
+
+    Returns:
+        Dict[str, Any]: The metadata of the "summary" event, plus `written_files`
+        and `unchanged_files`: the output files (relative to the project root)
+        that were written and those left as they were.
+    """
+    project_root = Path(project_root) if project_root is not None else Path(__file__).parent.parent
+    events = iter_project_context(
+        output_filename=output_filename,
+        project_name=project_name,
+        readme_filename=readme_filename,
+        ai_instructions_filename=ai_instructions_filename,
+        optional_docs=optional_docs,
+        doc_folders=doc_folders,
+        exclude_files=exclude_files,
+        exclude_folders=exclude_folders,
+        max_output_characters=max_output_characters,
+        split_output_if_truncated=split_output_if_truncated,
+        use_cache=use_cache,
+        workers=workers,
+        max_output_tokens=max_output_tokens,
+        token_estimator=token_estimator,
+        pack_parts=pack_parts,
+        file_source=file_source,
+        deduplicate=deduplicate,
+        seed_paths=seed_paths,
+        render_mode=render_mode,
+        strip_comments=strip_comments,
+        outline_fallback=outline_fallback,
+        outline_threshold_bytes=outline_threshold_bytes,
+        max_file_bytes=max_file_bytes,
+        truncate_large_files=truncate_large_files,
+        auto_exclude=auto_exclude,
+        profile=profile,
+        output_format=output_format,
+        state=state,
+        project_root=project_root,
+        log=log,
+    )
+
+    part_writer: Optional[_StrippedPartWriter] = None
+    part_filename = ""
+    jsonl_file = None
+    jsonl_offset = 0 # Byte offset of the next record, for the sidecar index
+    jsonl_records = 0
+    preamble_texts: List[str] = [] # Held back until the JSONL preamble record is complete
+    generation_timestamp = ""
+    sidecar_entries: List[Dict[str, Any]] = []
+    write_seconds = 0.0 # Time spent writing output files, for the profile report
+    bytes_written = 0
+    streamed_bytes_read = 0 # Large files copied from disk while writing
+    summary: Dict[str, Any] = {}
+    written_files: List[str] = []
+    unchanged_files: List[str] = []
+
+    def write_jsonl(text: str) -> None:
+        nonlocal jsonl_offset
+        jsonl_file.write(text)
+        jsonl_offset += len(text) if text.isascii() else len(text.encode("utf-8"))
+
+    def write_jsonl_preamble() -> None:
+        """Writes the preamble record once all preamble sections were seen."""
+        nonlocal jsonl_records
+        if jsonl_records:
+            return
+        preamble_record = {"type": "preamble", "project_name": project_name, "generated_on": generation_timestamp, "content": "".join(preamble_texts).strip()}
+        write_jsonl(json.dumps(preamble_record, ensure_ascii=False) + "\n")
+        jsonl_records += 1
+
+    for event in events:
+        write_started = time.perf_counter()
+        if event.kind == "part_start":
+            part_filename = event.metadata["filename"]
+            generation_timestamp = event.metadata["generated_on"]
+            # Ensure the output directory exists before writing the file.
+            full_output_path = project_root / part_filename
+            full_output_path.parent.mkdir(parents=True, exist_ok=True)
+            if output_format == "jsonl":
+                jsonl_file = open(full_output_path, "w", encoding="utf-8", newline="\n")
+            elif state is None:
+                part_writer = _StrippedPartWriter(full_output_path)
+            else:
+                part_writer = _StrippedPartWriter(
+                    full_output_path,
+                    previous_digest=state.part_digests.get(full_output_path.as_posix(), ""),
+                    volatile_text=generation_timestamp,
+                )
+            if part_writer is not None:
+                part_writer.write(event.text)
+        elif event.kind == "preamble":
+            if output_format == "jsonl":
+                preamble_texts.append(event.text)
+            else:
+                part_writer.write(event.text)
+        elif event.kind == "file":
+            file_metadata = event.metadata
+            if output_format == "jsonl":
+                write_jsonl_preamble()
+                file_record = {"type": "file"}
+                file_record.update((key, value) for key, value in file_metadata.items() if key != "part")
+                record_start = jsonl_offset
+                # The content goes last so that large files can be streamed into it
+                write_jsonl(json.dumps(file_record, ensure_ascii=False)[:-1] + ', "content": ')
+                if isinstance(event.text, StreamedFileBlock):
+                    write_jsonl('"')
+                    streamed_bytes_read += _copy_streamed_content(
+                        event.text.file_path, lambda chunk: write_jsonl(json.dumps(chunk, ensure_ascii=False)[1:-1])
+                    )
+                    write_jsonl('"')
+                else:
+                    write_jsonl(json.dumps(_block_content(event.text), ensure_ascii=False))
+                write_jsonl("}\n")
+                jsonl_records += 1
+                block_offsets = (record_start, jsonl_offset - 1)
+            else:
+                block_offsets = part_writer.write_block(event.text)
+            if write_sidecar_index:
+                start_offset, end_offset = block_offsets
+                sidecar_entries.append({
+                    "path": file_metadata["path"],
+                    "part": file_metadata["part"],
+                    "file": part_filename,
+                    "offset": start_offset,
+                    "length": end_offset - start_offset,
+                    "lang": file_metadata["lang"],
+                    "sha256": file_metadata["sha256"],
+                    "tokens": file_metadata["tokens"],
+                    "kind": file_metadata["kind"],
+                })
+        elif event.kind == "part_end":
+            full_output_path = project_root / part_filename
+            if output_format == "jsonl":
+                write_jsonl_preamble()
+                jsonl_file.close()
+                jsonl_file = None
+                write_seconds += time.perf_counter() - write_started
+                bytes_written += jsonl_offset
+                written_files.append(part_filename)
+                log(f"Successfully generated '{part_filename}' in the project root directory.")
+                log(f"Records in '{full_output_path}': {str(jsonl_records)}")
+                log(f"Estimated tokens in '{full_output_path}': {str(event.metadata['tokens'])}")
+                continue
+            part_writer.write(event.text)
+            part_writer.close()
+            write_seconds += time.perf_counter() - write_started
+            streamed_bytes_read += part_writer.bytes_read
+            if not part_writer.is_unchanged:
+                bytes_written += part_writer.bytes_written
+            if state is not None:
+                state.part_digests[full_output_path.as_posix()] = part_writer.digest
+            if part_writer.is_unchanged:
+                unchanged_files.append(part_filename)
+                log(f"Unchanged '{part_filename}' was left as is.")
+            else:
+                written_files.append(part_filename)
+                log(f"Successfully generated '{part_filename}' in the project root directory.")
+            log(f"Characters in '{full_output_path}': {part_writer.characters_written}")
+            log(f"Estimated tokens in '{full_output_path}': {str(event.metadata['tokens'])}")
+            log(f"Code files in this part: {str(event.metadata['files'])}")
+            part_writer = None
+            continue
+        elif event.kind == "index":
+            index_output_path = project_root / event.metadata["filename"]
+            index_output_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(index_output_path, "w", encoding="utf-8") as f:
+                f.write(event.text)
+            bytes_written += os.path.getsize(index_output_path)
+            written_files.append(event.metadata["filename"])
+            log(f"Successfully generated '{event.metadata['filename']}' in the project root directory.")
+        elif event.kind == "summary":
+            summary = event.metadata
+        write_seconds += time.perf_counter() - write_started
+
+    # --- Optional sidecar index, written next to the output ---
+    if write_sidecar_index:
+        sidecar_index_filename = Path(output_filename).with_name(Path(output_filename).stem + ".index.json").as_posix()
+        sidecar_index_path = project_root / sidecar_index_filename
+        sidecar_index_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(sidecar_index_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": SIDECAR_INDEX_VERSION,
+                "generated_on": generation_timestamp,
+                "format": output_format,
+                "files": sidecar_entries,
+            }, f, indent=1, ensure_ascii=False)
+        bytes_written += os.path.getsize(sidecar_index_path)
+        written_files.append(sidecar_index_filename)
+        log(f"Sidecar index written to '{sidecar_index_path}'.")
+
+    # --- Optional profile report, written next to the output ---
+    profile_report = summary.get("profile_report")
+    if profile_report is not None:
+        profile_report["write_seconds"] = write_seconds
+        profile_report["bytes_read"] += streamed_bytes_read
+        profile_report["bytes_written"] = bytes_written
+        profile_filename = Path(output_filename).with_name(Path(output_filename).stem + ".profile.json").as_posix()
+        profile_path = project_root / profile_filename
+        profile_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(profile_path, "w", encoding="utf-8") as f:
+            json.dump(profile_report, f, indent=2)
+        written_files.append(profile_filename)
+        log(f"Profile report written to '{profile_path}'.")
+
+    return dict(summary, written_files=written_files, unchanged_files=unchanged_files)
@@ -40,12 +40,89 @@ FOLDERS_TO_EXCLUDE = [
     ".husky", 
 ]
 
+# How to find candidate files: "walk" scans the directory tree and applies
+# .gitignore rules; "git_index" reads the tracked files directly from
+# .git/index, which is much faster on large repositories.
+FILE_SOURCE = "walk"
+
+# Whether files with identical content (vendored copies, generated stubs,
+# copy-pasted configs) are emitted once and referenced afterwards.
+DEDUPLICATE = False
+
+# Files or folders to focus on. If set, code files are added in order of
+# import distance from these seeds instead of alphabetically, so the most
+# relevant files are kept when the output is truncated. Example: ["src/api"]
+SEED_PATHS = []
+
 # The maximum number of characters for each output file.
 MAX_CHARACTERS = 500000
 
+# The maximum number of estimated model tokens for each output file. When set,
+# this replaces MAX_CHARACTERS as the budget. Leave as None to budget by characters.
+MAX_TOKENS = None
+
+# Files larger than this many bytes are not read in full (None reads every file
+# in full). Binary files are detected from their first few KB regardless.
+MAX_FILE_BYTES = None
+
+# If True, files over MAX_FILE_BYTES are included as a truncated preview
+# instead of being replaced by a placeholder.
+TRUNCATE_LARGE_FILES = False
+
+# Files that look generated or data-heavy (lockfiles, minified bundles, source
+# maps, snapshots, files with a leading "@generated" or "DO NOT EDIT" comment,
+# encoded blobs, large CSV/JSON data) are detected from their first few KB.
+# "stub" replaces them with a one-line placeholder, "exclude" leaves them out
+# and "off" includes them. The summary lists every flagged file and why.
+AUTO_EXCLUDE = "off"
+
+# "full" includes every file verbatim. "compact" re-indents Python with one space
+# per level, collapses blank lines in Python and Markdown, minifies JSON and emits
+# each license header once. Other languages only lose trailing blank lines.
+RENDER_MODE = "full"
+
+# In "compact" mode, also drop comments and all license headers.
+STRIP_COMMENTS = False
+
+# If True, a file that does not fit in the current part is included as an
+# outline (class and function signatures with docstrings) when that fits.
+OUTLINE_FALLBACK = False
+
+# Text files larger than this many bytes are always included as an outline.
+# Leave as None to include every file in full.
+OUTLINE_THRESHOLD_BYTES = None
+
 # Whether to split the output into multiple files if it exceeds the character limit.
 SPLIT_FILES = True
 
+# Whether to pack files into as few parts as possible (keeping directories
+# together where possible) instead of filling parts in alphabetical order.
+# Also writes an index file listing which part holds each file.
+# Only used when SPLIT_FILES is True.
+PACK_PARTS = False
+
+# Whether to keep an incremental cache next to the output so that later runs
+# only re-read files that changed since the previous run. The manifest stores
+# every rendered block, so it is about as large as the output itself.
+USE_CACHE = False
+
+# The number of threads used to read and render files. Higher values help on
+# network-mounted or cold-cache checkouts; the output is always the same.
+WORKERS = 8
+
+# Whether to write a JSON report of phase timings, counters and peak memory
+# next to the output (output/project_context.profile.json).
+PROFILE = False
+
+# "markdown" writes the usual part files. "jsonl" writes output/project_context.jsonl
+# instead, with one record per file, for tools that stream or re-chunk the context.
+OUTPUT_FORMAT = "markdown"
+
+# Whether to write output/project_context.index.json, giving the part, byte offset,
+# length, language, content hash and estimated tokens of every file, so that tools
+# can seek straight to a file's block instead of re-parsing the output.
+WRITE_SIDECAR_INDEX = False
+
 # --------------------------------------
 
 if __name__ == "__main__":
@@ -61,7 +138,24 @@ if __name__ == "__main__":
         exclude_files=FILES_TO_EXCLUDE,
         exclude_folders=FOLDERS_TO_EXCLUDE,
         max_output_characters=MAX_CHARACTERS,
-        split_output_if_truncated=SPLIT_FILES
+        split_output_if_truncated=SPLIT_FILES,
+        use_cache=USE_CACHE,
+        workers=WORKERS,
+        max_output_tokens=MAX_TOKENS,
+        pack_parts=PACK_PARTS,
+        file_source=FILE_SOURCE,
+        deduplicate=DEDUPLICATE,
+        seed_paths=SEED_PATHS,
+        render_mode=RENDER_MODE,
+        strip_comments=STRIP_COMMENTS,
+        outline_fallback=OUTLINE_FALLBACK,
+        outline_threshold_bytes=OUTLINE_THRESHOLD_BYTES,
+        max_file_bytes=MAX_FILE_BYTES,
+        truncate_large_files=TRUNCATE_LARGE_FILES,
+        auto_exclude=AUTO_EXCLUDE,
+        profile=PROFILE,
+        output_format=OUTPUT_FORMAT,
+        write_sidecar_index=WRITE_SIDECAR_INDEX
     )
     
     print("\n--- AI Context Generation Complete ---")
\ No newline at end of file
@@ -0,0 +1,79 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from generate_context_markdown import ContextEvent, generate_context_markdown, iter_project_context  # noqa: E402
+
+requires_git = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+# Keep the user's and system's Git configuration (global excludes, default
+# index version, ...) out of the comparisons.
+GIT_ENV = dict(
+    os.environ,
+    GIT_CONFIG_GLOBAL=os.devnull,
+    GIT_CONFIG_NOSYSTEM="1",
+    GIT_AUTHOR_NAME="Test",
+    GIT_AUTHOR_EMAIL="test@example.com",
+    GIT_COMMITTER_NAME="Test",
+    GIT_COMMITTER_EMAIL="test@example.com",
+)
+
+_TIMESTAMP = re.compile(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d")
+
+
+def run_git(repo: Path, *args: str) -> bytes:
+    return subprocess.run(
+        ["git", *args], cwd=repo, env=GIT_ENV,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+    ).stdout
+
+
+def init_repo(repo: Path) -> None:
+    repo.mkdir(parents=True, exist_ok=True)
+    run_git(repo, "init", "-q")
+
+
+def write_files(root: Path, files, content: str = "x\n") -> None:
+    for relative_path in files:
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+
+
+def generate(root: Path, **options) -> Dict[str, Any]:
+    """Runs `generate_context_markdown` on `root`, without printing unless a `log` is given."""
+    options.setdefault("log", lambda message: None)
+    return generate_context_markdown(project_name="Test", project_root=root, **options)
+
+
+def collect_events(root: Path, **options) -> List[ContextEvent]:
+    return list(iter_project_context(project_name="Test", project_root=root, **options))
+
+
+def file_events(events: List[ContextEvent]) -> Dict[str, ContextEvent]:
+    """The "file" events by path."""
+    return {event.metadata["path"]: event for event in events if event.kind == "file"}
+
+
+def read_outputs(root: Path) -> Dict[str, str]:
+    """Every generated Markdown or JSONL file by name, with the generation timestamp masked."""
+    outputs = {}
+    for path in sorted(root.rglob("project_context*")):
+        if path.suffix in (".md", ".jsonl"):
+            outputs[path.relative_to(root).as_posix()] = _TIMESTAMP.sub("<timestamp>", path.read_text(encoding="utf-8"))
+    return outputs
+
+
+def remove_outputs(root: Path) -> None:
+    """Deletes the output folder and the later parts, which are written to the project root."""
+    shutil.rmtree(root / "output", ignore_errors=True)
+    for path in root.glob("project_context*"):
+        path.unlink()
@@ -0,0 +1,101 @@
+import base64
+import random
+
+from helpers import collect_events, file_events, generate
+
+from generate_context_markdown import DATA_FILE_MIN_BYTES, SNIFF_BYTES, _classify_generated
+
+
+def classify(path, text, size=None):
+    header = text.encode("utf-8")[:SNIFF_BYTES]
+    return _classify_generated(path, header, len(text.encode("utf-8")) if size is None else size)
+
+
+def test_classify_by_name():
+    assert "lockfile" in classify("web/package-lock.json", "{}")
+    assert "lockfile" in classify("Cargo.lock", "")
+    assert "minified bundle" in classify("static/app.min.js", "x")
+    assert "source map" in classify("app.js.map", "{}")
+    assert "snapshot" in classify("tests/__snapshots__/view.js.snap.txt", "x")
+    assert classify("src/package-lock.py", "x = 1\n") is None
+
+
+def test_classify_by_leading_comment():
+    assert "@generated" in classify("gen.py", "#!/usr/bin/env python\n# @generated by protoc\nx = 1\n")
+    assert "DO NOT EDIT" in classify("api.go", "// Code generated by mockgen. DO NOT EDIT.\npackage api\n")
+    # Only the comments that open the file count
+    assert classify("notes.py", "x = 1\n# @generated\n") is None
+    assert classify("notes.py", "'''Mentions @generated in a docstring'''\n") is None
+
+
+def test_classify_by_content():
+    source = "".join(f"def function_{str(index)}(value):\n    return value + {str(index)}\n\n" for index in range(200))
+    assert classify("module.py", source) is None
+    minified = "var a=1,b=2;" * 1000
+    assert "minified" in classify("bundle.js", minified)
+    rng = random.Random(0)
+    encoded = base64.b64encode(bytes(rng.getrandbits(8) for _ in range(6000))).decode("ascii")
+    assert "encoded data" in classify("blob.txt", encoded)
+    rows = "".join(f"{str(index)},name_{str(index)},{str(index * 3)}\n" for index in range(6000))
+    assert "data file" in classify("table.csv", rows)
+    assert classify("table.csv", rows[:DATA_FILE_MIN_BYTES // 2]) is None
+    assert classify("table.txt", rows) is None
+
+
+def write_project(root):
+    (root / "main.py").write_text("import helpers\n", encoding="utf-8")
+    (root / "helpers.py").write_text("def helper():\n    return 1\n", encoding="utf-8")
+    (root / "yarn.lock").write_text("# yarn lockfile v1\n", encoding="utf-8")
+    (root / "app.min.js").write_text("var a=1;" * 100, encoding="utf-8")
+
+
+def test_stub_replaces_flagged_files_with_placeholders(tmp_path):
+    write_project(tmp_path)
+
+    events = collect_events(tmp_path, auto_exclude="stub", profile=True)
+    files = file_events(events)
+
+    assert set(files) == {"main.py", "helpers.py", "yarn.lock", "app.min.js"}
+    for path in ("yarn.lock", "app.min.js"):
+        assert files[path].metadata["kind"] == "placeholder"
+        assert "[Content not included:" in files[path].text
+    assert "lockfile" in files["yarn.lock"].metadata["skip_reason"]
+    assert files["main.py"].metadata["kind"] == "full"
+    counts = events[-1].metadata["profile_report"]["counts"]
+    assert counts["eligible_files"] == 4
+    assert counts["files_auto_excluded"] == 2
+
+
+def test_exclude_leaves_flagged_files_out(tmp_path):
+    write_project(tmp_path)
+
+    events = collect_events(tmp_path, auto_exclude="exclude", profile=True)
+
+    assert set(file_events(events)) == {"main.py", "helpers.py"}
+    summary = events[-1].metadata
+    assert sorted(summary["files_included"]) == ["helpers.py", "main.py"]
+    # Excluded files no longer count as eligible, so the output is not reported as truncated
+    assert summary["profile_report"]["counts"]["eligible_files"] == 2
+    assert summary["profile_report"]["counts"]["files_auto_excluded"] == 2
+    assert "yarn.lock" not in "".join(event.text for event in events if isinstance(event.text, str))
+
+
+def test_flagged_files_are_listed_in_the_summary(tmp_path):
+    write_project(tmp_path)
+    messages = []
+
+    generate(tmp_path, auto_exclude="exclude", log=messages.append)
+
+    log_text = "\n".join(messages)
+    assert "Files Excluded as Generated or Data (2)" in log_text
+    assert "- yarn.lock: File is a package lockfile (yarn.lock), likely generated" in log_text
+    assert "Codebase Files Included (2/2)" in log_text
+
+
+def test_off_includes_flagged_files_in_full(tmp_path):
+    write_project(tmp_path)
+
+    files = file_events(collect_events(tmp_path))
+
+    assert files["yarn.lock"].metadata["kind"] == "full"
+    assert "# yarn lockfile v1" in files["yarn.lock"].text
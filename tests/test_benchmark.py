@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+from helpers import init_repo, requires_git, run_git
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+import benchmark_context_generator as benchmark  # noqa: E402
+
+SMALL_TREE = {"files": 120, "depth": 3, "gitignore_patterns": 30, "binary_blobs": 4, "oversized_files": 0}
+
+
+def read_tree(root):
+    return {path.relative_to(root).as_posix(): path.read_bytes() for path in sorted(root.rglob("*")) if path.is_file()}
+
+
+def test_synthetic_repo_is_deterministic(tmp_path):
+    counts = benchmark.build_synthetic_repo(tmp_path / "a", **SMALL_TREE)
+    benchmark.build_synthetic_repo(tmp_path / "b", **SMALL_TREE)
+    benchmark.build_synthetic_repo(tmp_path / "c", **SMALL_TREE, seed=1)
+
+    tree = read_tree(tmp_path / "a")
+    assert tree == read_tree(tmp_path / "b")
+    assert tree != read_tree(tmp_path / "c")
+    # The README is written on top of the counted files
+    assert counts == {"files": len(tree) - 1, "bytes": sum(len(data) for path, data in tree.items() if path != "README.md")}
+    assert any(path.startswith("d") and "/node_modules/" in path for path in tree)
+
+
+@requires_git
+def test_synthetic_gitignore_rules_prune_what_git_ignores(tmp_path):
+    init_repo(tmp_path)
+    benchmark.build_synthetic_repo(tmp_path, **SMALL_TREE)
+    git_files = run_git(tmp_path, "ls-files", "--others", "--exclude-standard", "-z").decode("utf-8").split("\0")
+
+    generator = benchmark.load_generator(tmp_path)
+    matcher = generator.GitIgnoreMatcher(tmp_path)
+    walked, _ = generator._walk_project(tmp_path, lambda path, is_dir: path in (".git", "scripts") or matcher.is_ignored(path, is_dir), [])
+
+    assert walked == sorted(path for path in git_files if path and not path.startswith("scripts/"))
+    assert not any("/node_modules/" in path or path.endswith(".log") for path in walked)
+
+
+def test_compare_to_baseline():
+    baseline = {"version": benchmark.BENCHMARK_VERSION, "scenarios": {"1k": {"phases": {"walk": 1.0, "read": 0.01}}}}
+    results = {"scenarios": {"1k": {"phases": {"walk": 1.5, "read": 0.03, "new_phase": 9.0}}}}
+
+    regressions = benchmark.compare_to_baseline(results, baseline)
+
+    # "read" is 200% slower but by less than MIN_REGRESSION_SECONDS
+    assert len(regressions) == 1 and regressions[0].startswith("1k/walk: 1.000s -> 1.500s")
+    assert "does not match" in benchmark.compare_to_baseline(results, dict(baseline, version=0))[0]
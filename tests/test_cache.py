@@ -0,0 +1,50 @@
+import os
+
+from helpers import generate, read_outputs, write_files
+
+FILES = [f"pkg/module_{str(n)}.py" for n in range(6)]
+
+
+def cache_counts(summary):
+    counts = summary["profile_report"]["counts"]
+    return counts["cache_hits"], counts["cache_misses"]
+
+
+def test_warm_run_reuses_every_entry_and_keeps_the_manifest(tmp_path):
+    write_files(tmp_path, FILES, "VALUE = 1\n")
+    manifest_path = tmp_path / "output" / "project_context.cache.json"
+
+    cold = generate(tmp_path, use_cache=True, profile=True)
+    cold_outputs = read_outputs(tmp_path)
+    manifest_stat = os.stat(manifest_path)
+    warm = generate(tmp_path, use_cache=True, profile=True)
+
+    assert cache_counts(cold) == (0, len(FILES))
+    assert cache_counts(warm) == (len(FILES), 0)
+    assert read_outputs(tmp_path) == cold_outputs
+    # An unchanged manifest is not rewritten
+    assert os.stat(manifest_path).st_mtime_ns == manifest_stat.st_mtime_ns
+
+
+def test_changed_file_and_render_options_miss_the_cache(tmp_path):
+    write_files(tmp_path, FILES, "VALUE = 1\n")
+    generate(tmp_path, use_cache=True)
+
+    write_files(tmp_path, ["pkg/module_2.py"], "VALUE = 'changed'\n")
+    changed = generate(tmp_path, use_cache=True, profile=True)
+    assert cache_counts(changed) == (len(FILES) - 1, 1)
+    assert "VALUE = 'changed'" in read_outputs(tmp_path)["output/project_context.md"]
+
+    # Touched without a content change: the hash matches, so the block is reused
+    os.utime(tmp_path / "pkg" / "module_3.py", ns=(1, 1))
+    assert cache_counts(generate(tmp_path, use_cache=True, profile=True)) == (len(FILES), 0)
+
+    # Blocks cached for another render mode are not reused
+    assert cache_counts(generate(tmp_path, use_cache=True, profile=True, render_mode="compact")) == (0, len(FILES))
+
+
+def test_cache_is_off_by_default(tmp_path):
+    write_files(tmp_path, FILES)
+    generate(tmp_path)
+
+    assert not (tmp_path / "output" / "project_context.cache.json").exists()
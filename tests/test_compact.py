@@ -0,0 +1,58 @@
+import ast
+import json
+
+from helpers import collect_events, file_events, write_files
+
+from generate_context_markdown import _split_license_header, compact_source
+
+LICENSE = "# Copyright (c) Example\n# SPDX-License-Identifier: MIT\n"
+SHEBANG = "#!/usr/bin/env python3\n# -*- coding: utf-8 -*-\n"
+
+
+def block_content(event):
+    return event.text.split("```python\n", 1)[1].rsplit("\n```", 1)[0]
+
+
+def test_python_is_compacted_without_changing_its_meaning():
+    source = 'def f(a,  b):\n\n\n    """Doc."""\n    x = [1,\n         2]  # note\n    return "a  b"\n\n\n\nclass C:\n    pass\n'
+
+    for strip_comments in (False, True):
+        compacted = compact_source(source, "python", strip_comments)
+        assert ast.dump(ast.parse(compacted)) == ast.dump(ast.parse(source))
+        assert len(compacted) < len(source)
+        assert ("# note" in compacted) is not strip_comments
+
+
+def test_json_and_other_text():
+    assert json.loads(compact_source('{\n  "a": [1, 2],\n  "b": "x  y"\n}\n', "json")) == {"a": [1, 2], "b": "x  y"}
+    assert compact_source('{\n  "a": [1, 2]\n}\n', "json") == '{"a":[1,2]}'
+    yaml = "a:\n\n\n  b: 1\n\n\n"
+    assert compact_source(yaml, "yaml") == "a:\n\n\n  b: 1"
+
+
+def test_split_license_header_keeps_the_shebang_and_cookie_apart():
+    assert _split_license_header(SHEBANG + LICENSE + "import os\n") == (SHEBANG.rstrip("\n"), LICENSE.rstrip("\n"), "import os\n")
+    assert _split_license_header(LICENSE + "import os\n") == ("", LICENSE.rstrip("\n"), "import os\n")
+    # Without a license keyword nothing is split off
+    assert _split_license_header("#!/bin/sh\n# just a comment\necho\n") == ("", "", "#!/bin/sh\n# just a comment\necho\n")
+
+
+def test_shebang_stays_first_and_each_license_is_emitted_once(tmp_path):
+    write_files(tmp_path, ["a.py", "b.py"], SHEBANG + LICENSE + "\n\nimport os\n\n\nprint(os.name)\n")
+
+    events = file_events(collect_events(tmp_path, render_mode="compact"))
+
+    assert block_content(events["a.py"]) == SHEBANG + LICENSE + "import os\n\nprint(os.name)"
+    assert block_content(events["b.py"]) == SHEBANG + "import os\n\nprint(os.name)"
+
+
+def test_markdown_lists_and_indented_code_are_left_alone():
+    tight_list = "- item one\n  ```python\n  x = 1\n  ```\n- item two\n"
+    assert compact_source(tight_list, "markdown") == tight_list.rstrip("\n")
+
+    indented_code = "Text:\n\n    line one\n\n\n    line two\n"
+    assert compact_source(indented_code, "markdown") == indented_code.rstrip("\n")
+
+    prose = "# Title\n\n\n\nText <!-- hidden -->\n\n\n```\nkept\n\n\nverbatim\n```\n\n\n"
+    assert compact_source(prose, "markdown") == "# Title\n\nText <!-- hidden -->\n\n```\nkept\n\n\nverbatim\n```"
+    assert compact_source(prose, "markdown", strip_comments=True) == "# Title\n\nText \n\n```\nkept\n\n\nverbatim\n```"
@@ -0,0 +1,44 @@
+from helpers import collect_events, file_events, write_files
+
+CONTENT = "VALUE = 1\n" * 50
+
+
+def test_duplicates_reference_the_first_copy(tmp_path):
+    write_files(tmp_path, ["a/one.py", "b/two.py", "c/three.py"], CONTENT)
+    write_files(tmp_path, ["d/other.py"], "OTHER = 2\n" * 50)
+
+    events = file_events(collect_events(tmp_path, deduplicate=True))
+
+    assert events["a/one.py"].metadata["kind"] == "full"
+    for path in ("b/two.py", "c/three.py"):
+        assert events[path].metadata["kind"] == "duplicate"
+        assert events[path].metadata["duplicate_of"] == "a/one.py"
+        assert events[path].text == f"### File: `{path}`\n\nIdentical to `a/one.py` (content not repeated).\n\n"
+    assert events["d/other.py"].metadata["kind"] == "full"
+
+
+def test_deduplication_is_off_by_default_and_skips_tiny_files(tmp_path):
+    write_files(tmp_path, ["a/one.py", "b/two.py"], CONTENT)
+    write_files(tmp_path, ["a/tiny.py", "b/tiny.py"], "x\n")
+
+    assert {event.metadata["kind"] for event in file_events(collect_events(tmp_path)).values()} == {"full"}
+    # A reference longer than the block itself is not worth it
+    events = file_events(collect_events(tmp_path, deduplicate=True))
+    assert events["b/tiny.py"].metadata["kind"] == "full"
+    assert events["b/two.py"].metadata["kind"] == "duplicate"
+
+
+def test_references_point_to_an_emitted_full_block(tmp_path):
+    body = "".join(f"def function_{str(n)}():\n    return {str(n)}\n\n" for n in range(100))
+    write_files(tmp_path, ["b.py", "c.py", "d.py"], body)
+    write_files(tmp_path, ["a_filler.py"], "# filler\n" * 2000)
+
+    # Only an outline of b.py fits after the filler, so c.py is the first full copy
+    events = file_events(collect_events(
+        tmp_path, deduplicate=True, outline_fallback=True, split_output_if_truncated=True, max_output_characters=21800
+    ))
+
+    assert [(events[path].metadata["kind"], events[path].metadata["part"]) for path in ("b.py", "c.py", "d.py")] == [
+        ("outline", 1), ("full", 2), ("duplicate", 2)
+    ]
+    assert events["d.py"].metadata["duplicate_of"] == "c.py"
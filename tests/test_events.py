@@ -0,0 +1,83 @@
+import itertools
+import re
+
+from helpers import collect_events, generate, read_outputs, write_files
+
+from generate_context_markdown import iter_project_context
+
+TIMESTAMP = re.compile(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d")
+
+
+def test_event_sequence_of_a_single_part(tmp_path):
+    write_files(tmp_path, ["a.py", "b.py"], "x = 1\n")
+    (tmp_path / "README.md").write_text("# Readme\n", encoding="utf-8")
+
+    events = collect_events(tmp_path)
+    kinds = [event.kind for event in events]
+
+    assert kinds[0] == "part_start"
+    assert kinds[-2:] == ["part_end", "summary"]
+    assert set(kinds[1:kinds.index("file")]) == {"preamble"}
+    # The README is a preamble section rather than a file block
+    sections = [event.metadata["section"] for event in events if event.kind == "preamble"]
+    assert sections[0] == "title" and "readme" in sections and sections[-1] == "codebase_heading"
+    assert [event.metadata["path"] for event in events if event.kind == "file"] == ["a.py", "b.py"]
+    assert events[0].metadata["part"] == 1
+    assert events[-2].metadata["files"] == 2
+    summary = events[-1].metadata
+    assert summary["files_included"] == ["a.py", "b.py"]
+    assert summary["parts"][0]["tokens"] == events[-2].metadata["tokens"]
+    assert summary["profile_report"] is None
+
+
+def test_event_texts_give_the_written_parts(tmp_path):
+    write_files(tmp_path, [f"f{str(index)}.py" for index in range(8)], "value = '" + "v" * 300 + "'\n")
+    options = dict(max_output_characters=1200, split_output_if_truncated=True)
+
+    events = collect_events(tmp_path, **options)
+    generate(tmp_path, **options)
+    outputs = read_outputs(tmp_path)
+
+    parts = {}
+    for event in events:
+        if event.kind == "part_start":
+            filename, texts = event.metadata["filename"], []
+        texts.append(event.text)
+        if event.kind == "part_end":
+            parts[filename] = "".join(texts).strip()
+    assert len(parts) > 1
+    assert [event.kind for event in events].count("part_start") == len(parts)
+    for filename, text in parts.items():
+        # The generation timestamp is the only difference between the two runs
+        assert outputs[filename].strip() == TIMESTAMP.sub("<timestamp>", text)
+
+
+def test_packed_output_yields_an_index_before_the_summary(tmp_path):
+    write_files(tmp_path, [f"f{str(index)}.py" for index in range(8)], "value = '" + "v" * 300 + "'\n")
+
+    kinds = [event.kind for event in collect_events(tmp_path, max_output_characters=1200, split_output_if_truncated=True, pack_parts=True)]
+
+    assert kinds[-2:] == ["index", "summary"]
+
+
+def test_stopping_early_writes_nothing(tmp_path):
+    write_files(tmp_path, [f"f{str(index)}.py" for index in range(100)], "x = 1\n")
+
+    for workers in (1, 4):
+        events = iter_project_context(project_name="Test", project_root=tmp_path, workers=workers, use_cache=True)
+        first_events = list(itertools.islice((event for event in events if event.kind == "file"), 3))
+        events.close()
+
+        assert [event.metadata["path"] for event in first_events] == ["f0.py", "f1.py", "f10.py"]
+        assert not (tmp_path / "output").exists()
+
+
+def test_iterating_without_a_log_prints_nothing(tmp_path, capsys):
+    write_files(tmp_path, ["a.py", "b.py"], "x = 1\n" * 50)
+    (tmp_path / "image.png").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(64))
+
+    events = collect_events(tmp_path, max_output_characters=600, split_output_if_truncated=True)
+
+    assert capsys.readouterr() == ("", "")
+    # The warnings are still passed on with the summary
+    assert any("image.png" in warning for warning in events[-1].metadata["warnings"])
@@ -0,0 +1,48 @@
+from helpers import collect_events, file_events, write_files
+
+from generate_context_markdown import SNIFF_BYTES, _sniff_binary
+
+
+def test_sniff_binary():
+    assert "PNG image" in _sniff_binary(b"\x89PNG\r\n\x1a\n" + b"rest", False)
+    assert "MP4" in _sniff_binary(b"\x00\x00\x00\x18ftypmp42", False)
+    assert "NUL bytes" in _sniff_binary(b"text\x00more", False)
+    assert "not UTF-8" in _sniff_binary(b"caf\xe9 au lait", False)
+    assert _sniff_binary("café".encode("utf-8"), True) is None
+    # A character cut off at the end of the sniffed bytes is only an error if the file ends there
+    cut = "é".encode("utf-8")[:1]
+    assert _sniff_binary(b"abc" + cut, False) is None
+    assert _sniff_binary(b"abc" + cut, True) is not None
+
+
+def test_binary_files_are_placeholders(tmp_path):
+    (tmp_path / "image.py").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(range(256)))
+    # Not UTF-8, but only after the sniffed bytes
+    (tmp_path / "late.txt").write_bytes(b"a" * (SNIFF_BYTES + 100) + b"\xff\xfe")
+    write_files(tmp_path, ["text.py"], "x = 1\n")
+
+    events = file_events(collect_events(tmp_path))
+
+    assert events["image.py"].metadata["kind"] == "placeholder"
+    assert "PNG image" in events["image.py"].metadata["skip_reason"]
+    assert "\x89PNG" not in events["image.py"].text
+    assert events["late.txt"].metadata["kind"] == "placeholder"
+    assert "not UTF-8" in events["late.txt"].metadata["skip_reason"]
+    assert events["text.py"].metadata["kind"] == "full"
+
+
+def test_max_file_bytes_placeholder_and_preview(tmp_path):
+    write_files(tmp_path, ["small.py"], "x = 1\n")
+    # 2-byte characters so that the limit falls inside one
+    write_files(tmp_path, ["large.py"], "# " + "é" * 500 + "\n")
+
+    skipped = file_events(collect_events(tmp_path, max_file_bytes=101))
+    assert skipped["small.py"].metadata["kind"] == "full"
+    assert skipped["large.py"].metadata["kind"] == "placeholder"
+    assert "larger than max_file_bytes (101)" in skipped["large.py"].metadata["skip_reason"]
+    assert "é" not in skipped["large.py"].text
+
+    truncated = file_events(collect_events(tmp_path, max_file_bytes=101, truncate_large_files=True))
+    assert truncated["large.py"].metadata["kind"] == "placeholder"
+    assert "# " + "é" * 49 + "\n[... Truncated to the first 101 of 1003 bytes (max_file_bytes) ...]" in truncated["large.py"].text
+    assert "é" * 50 not in truncated["large.py"].text
@@ -0,0 +1,103 @@
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+from helpers import GIT_ENV, collect_events, file_events, init_repo, requires_git, run_git, write_files
+
+from generate_context_markdown import read_git_index_entries, read_git_index_paths
+
+pytestmark = requires_git
+
+requires_symlinks = pytest.mark.skipif(not hasattr(os, "symlink"), reason="symlinks are not supported")
+
+
+def git_ls_files(repo: Path):
+    """The tracked paths in index order, each conflicted path listed once."""
+    paths = []
+    for path in run_git(repo, "ls-files", "-z").split(b"\0"):
+        name = path.decode("utf-8", errors="surrogateescape")
+        if path and (not paths or paths[-1] != name):
+            paths.append(name)
+    return paths
+
+
+@pytest.mark.parametrize("index_version", [2, 3, 4])
+def test_read_git_index_paths_agrees_with_git_ls_files(tmp_path, index_version):
+    init_repo(tmp_path)
+    write_files(tmp_path, ["a.py", "b/c.py", "b/d/e.md", "b-c.txt", "b.txt", "unicodé/ñ.py", "z" * 120 + ".py"])
+    if hasattr(os, "symlink"):
+        os.symlink("a.py", tmp_path / "link.py")
+    run_git(tmp_path, "add", "-A")
+    run_git(tmp_path, "commit", "-q", "-m", "initial")
+    if index_version == 3:
+        # Intent-to-add entries use the extended flags of version 3
+        write_files(tmp_path, ["intent.py"])
+        run_git(tmp_path, "add", "-N", "intent.py")
+    run_git(tmp_path, "update-index", "--index-version", str(index_version))
+
+    assert read_git_index_paths(tmp_path / ".git" / "index") == git_ls_files(tmp_path)
+
+
+def test_read_git_index_paths_lists_conflicted_paths_once(tmp_path):
+    init_repo(tmp_path)
+    write_files(tmp_path, ["both_modified.txt"], "base\n")
+    run_git(tmp_path, "add", "-A")
+    run_git(tmp_path, "commit", "-q", "-m", "base")
+    base_branch = run_git(tmp_path, "rev-parse", "--abbrev-ref", "HEAD").decode().strip()
+    run_git(tmp_path, "checkout", "-q", "-b", "other")
+    write_files(tmp_path, ["both_modified.txt", "both_added.txt"], "theirs\n")
+    run_git(tmp_path, "add", "-A")
+    run_git(tmp_path, "commit", "-q", "-m", "theirs")
+    run_git(tmp_path, "checkout", "-q", base_branch)
+    write_files(tmp_path, ["both_modified.txt", "both_added.txt"], "ours\n")
+    run_git(tmp_path, "add", "-A")
+    run_git(tmp_path, "commit", "-q", "-m", "ours")
+    subprocess.run(["git", "merge", "-q", "other"], cwd=tmp_path, env=GIT_ENV, capture_output=True, check=False)
+
+    assert read_git_index_paths(tmp_path / ".git" / "index") == ["both_added.txt", "both_modified.txt"]
+    assert git_ls_files(tmp_path) == ["both_added.txt", "both_modified.txt"]
+
+
+def test_read_git_index_paths_merges_a_split_index(tmp_path):
+    init_repo(tmp_path)
+    write_files(tmp_path, [f"dir{str(n % 4)}/file{str(n)}.py" for n in range(40)])
+    run_git(tmp_path, "add", "-A")
+    run_git(tmp_path, "commit", "-q", "-m", "initial")
+    run_git(tmp_path, "update-index", "--split-index")
+    # Replace, delete and add entries on top of the shared index
+    write_files(tmp_path, ["dir0/file0.py", "dir1/file5.py", "dir3/file39.py"], "changed\n")
+    run_git(tmp_path, "rm", "-q", "dir2/file2.py", "dir2/file6.py", "dir1/file37.py")
+    write_files(tmp_path, ["dir0/new.py", "aaa.py", "zzz/new.py"])
+    run_git(tmp_path, "add", "-A")
+    assert list((tmp_path / ".git").glob("sharedindex.*"))
+
+    assert read_git_index_paths(tmp_path / ".git" / "index") == git_ls_files(tmp_path)
+
+    # Without its shared index the split index cannot be read
+    for shared_index in (tmp_path / ".git").glob("sharedindex.*"):
+        shared_index.unlink()
+    with pytest.raises(ValueError):
+        read_git_index_paths(tmp_path / ".git" / "index")
+
+
+@requires_symlinks
+def test_git_index_skips_symlinked_directories_like_the_walk(tmp_path):
+    init_repo(tmp_path)
+    write_files(tmp_path, ["real/a.py", "b.py"])
+    os.symlink("real", tmp_path / "alias")
+    os.symlink("real/a.py", tmp_path / "link.py")
+    os.symlink("missing.py", tmp_path / "dangling.py")
+    run_git(tmp_path, "add", "-A")
+    run_git(tmp_path, "commit", "-q", "-m", "initial")
+    assert ("alias", True) in read_git_index_entries(tmp_path / ".git" / "index")
+
+    files = {}
+    for file_source in ("git_index", "walk"):
+        events = collect_events(tmp_path, file_source=file_source, exclude_folders=[".git"])
+        files[file_source] = {path: event.metadata["kind"] for path, event in file_events(events).items()}
+        assert events[-1].metadata["warnings"] == []
+
+    assert files["git_index"] == files["walk"] == {
+        "b.py": "full", "dangling.py": "missing", "link.py": "full", "real/a.py": "full"
+    }
@@ -0,0 +1,123 @@
+import os
+import random
+import subprocess
+from pathlib import Path
+
+from helpers import GIT_ENV, init_repo, requires_git, write_files
+
+from generate_context_markdown import GitIgnoreMatcher, _walk_project
+
+pytestmark = requires_git
+
+ROOT_GITIGNORE = """\
+# Comments and blank lines are skipped
+
+*.log
+!keep.log
+/build/
+dist
+*.py[co]
+**/cache/**
+docs/**/*.tmp
+a/**/b
+\\#literal
+trailing\\ space\\\x20
+spaces\x20\x20\x20
+[Tt]emp*/
+/anchored.txt
+nested/deeper/
+sub/*.txt
+!sub/important.txt
+"""
+
+NESTED_GITIGNORE = """\
+*.txt
+!readme.txt
+/local_only
+generated/
+"""
+
+TREE_FILES = [
+    "app.py", "app.pyc", "debug.log", "keep.log", "logs/keep.log", "logs/other.log",
+    "build/out.js", "src/build/out.js", "dist", "src/dist/bundle.js",
+    "cache/a.txt", "src/cache/deep/b.txt", "docs/x/y/z.tmp", "docs/z.tmp", "docs/readme.md",
+    "spaces", "a/b", "a/x/b", "a/x/y/b", "a/c", "#literal", "trailing space ", "Temp1/f.py", "temp2/f.py",
+    "tempfile.py", "anchored.txt", "src/anchored.txt", "nested/deeper/f.py", "x/nested/deeper/f.py",
+    "sub/a.txt", "sub/important.txt", "sub/inner/a.txt",
+    "pkg/notes.txt", "pkg/readme.txt", "pkg/local_only", "pkg/inner/local_only",
+    "pkg/generated/code.py", "pkg/inner/generated/code.py", "pkg/inner/data.txt", "pkg/main.py",
+]
+
+
+def all_project_files(root: Path):
+    return {
+        Path(dirpath, filename).relative_to(root).as_posix()
+        for dirpath, _, filenames in os.walk(root)
+        if ".git" not in Path(dirpath).relative_to(root).parts
+        for filename in filenames
+    }
+
+
+def matcher_ignored_paths(root: Path):
+    """The files that `_walk_project`, asking the matcher, leaves out."""
+    matcher = GitIgnoreMatcher(root)
+    code_files, _ = _walk_project(root, lambda path, is_dir: path == ".git" or matcher.is_ignored(path, is_dir), [])
+    return all_project_files(root) - set(code_files)
+
+
+def git_ignored_paths(root: Path):
+    # check-ignore exits with 1 when no path is ignored
+    result = subprocess.run(
+        ["git", "check-ignore", "--stdin", "-z"], cwd=root, env=GIT_ENV,
+        input="\0".join(sorted(all_project_files(root))).encode("utf-8") + b"\0", stdout=subprocess.PIPE, check=False
+    )
+    assert result.returncode in (0, 1)
+    return {path.decode("utf-8") for path in result.stdout.split(b"\0") if path}
+
+
+def test_matcher_agrees_with_git_check_ignore(tmp_path):
+    init_repo(tmp_path)
+    write_files(tmp_path, TREE_FILES)
+    (tmp_path / ".gitignore").write_text(ROOT_GITIGNORE, encoding="utf-8")
+    (tmp_path / "pkg" / ".gitignore").write_text(NESTED_GITIGNORE, encoding="utf-8")
+
+    assert matcher_ignored_paths(tmp_path) == git_ignored_paths(tmp_path)
+
+
+def test_matcher_agrees_with_git_on_a_large_gitignore(tmp_path):
+    # Enough patterns of every kind (names, suffixes, ancestor names, basename
+    # and path globs, negations) to fill the lookup tables and regex buckets
+    rng = random.Random(0)
+    words = ["alpha", "beta", "gamma", "delta", "omega", "util", "core", "test"]
+    patterns, files = [], []
+    for index in range(400):
+        word, other = rng.choice(words), rng.choice(words)
+        kind = index % 6
+        if kind == 0:
+            patterns.append(f"{word}{str(index)}.txt")
+        elif kind == 1:
+            patterns.append(f"*.{word}{str(index % 40)}")
+        elif kind == 2:
+            patterns.append(f"**/{word}_cache{str(index % 30)}/**")
+        elif kind == 3:
+            patterns.append(f"{word}*{str(index % 50)}.py")
+        elif kind == 4:
+            patterns.append(f"{word}/{other}*/{str(index % 20)}.md")
+        else:
+            patterns.append(f"!{word}{str(index - 5)}.txt")
+    for index in range(600):
+        word, other = rng.choice(words), rng.choice(words)
+        files.extend([
+            f"{word}{str(index)}.txt",
+            f"src/file{str(index)}.{word}{str(index % 45)}",
+            f"lib/{word}_cache{str(index % 35)}/x.py",
+            f"{word}_{str(index)}_{str(index % 55)}.py",
+            f"{word}/{other}{str(index % 3)}/{str(index % 25)}.md",
+        ])
+    init_repo(tmp_path)
+    write_files(tmp_path, sorted(set(files)))
+    (tmp_path / ".gitignore").write_text("\n".join(patterns) + "\n", encoding="utf-8")
+
+    git_ignored = git_ignored_paths(tmp_path)
+    assert 0 < len(git_ignored) < len(set(files))
+    assert matcher_ignored_paths(tmp_path) == git_ignored
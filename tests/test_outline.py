@@ -0,0 +1,89 @@
+from helpers import collect_events, file_events, generate, write_files
+
+from generate_context_markdown import outline_file_lines, outline_source
+
+SOURCE = '''"""Module docstring."""
+import os
+
+LIMIT = 10
+
+
+@decorator
+def compute(a, b=1):
+    """Adds things."""
+    total = a + b
+    for _ in range(LIMIT):
+        total += 1
+    return total
+
+
+class Service(Base):
+    """A service."""
+
+    def run(self):
+        return os.getcwd()
+'''
+
+
+def large_module(index):
+    body = "    total = value\n" + "    total = total * 3 + len(str(total)) - value\n" * 6
+    return "".join(f"def function_{str(index)}_{str(n)}(value):\n{body}    return total * {str(n)}\n\n" for n in range(20))
+
+
+def test_python_outline_keeps_signatures_and_docstrings():
+    outline = outline_source(SOURCE, "python")
+
+    for kept in ('"""Module docstring."""', "import os", "LIMIT = 10", "@decorator", "def compute(a, b=1):",
+                 '"""Adds things."""', "class Service(Base):", "def run(self):"):
+        assert kept in outline
+    assert "total += 1" not in outline and "os.getcwd()" not in outline
+
+
+def test_outlines_of_other_text(tmp_path):
+    assert outline_source("# Title\ntext\n## Section\nmore\n", "markdown") == "# Title\n## Section"
+    javascript = "export function load(path) {\n  return read(path);\n}\nclass Cache {\n}\n"
+    assert outline_source(javascript, "javascript") == "export function load(path) {\nclass Cache {"
+    # Python that does not parse falls back to the declaration lines
+    assert "def broken(:" in outline_source("def broken(:\n    pass\n", "python")
+
+    path = tmp_path / "big.js"
+    path.write_text(javascript, encoding="utf-8")
+    assert outline_file_lines(path, "javascript") == outline_source(javascript, "javascript")
+
+
+def test_files_over_the_threshold_are_outlined(tmp_path):
+    write_files(tmp_path, ["large.py"], large_module(0))
+    write_files(tmp_path, ["small.py"], "x = 1\n")
+
+    events = file_events(collect_events(tmp_path, outline_threshold_bytes=1000))
+
+    assert events["small.py"].metadata["kind"] == "full"
+    assert events["large.py"].metadata["kind"] == "outline"
+    assert events["large.py"].text.startswith("### File: `large.py` (outline)\n\n")
+    assert "def function_0_19(value):" in events["large.py"].text
+    assert "return total * 19" not in events["large.py"].text
+
+
+def test_files_that_do_not_fit_fall_back_to_an_outline(tmp_path):
+    for index in range(6):
+        write_files(tmp_path, [f"module_{str(index)}.py"], large_module(index))
+    logged = []
+
+    summary = generate(tmp_path, max_output_characters=12000, outline_fallback=True, log=logged.append)
+
+    assert len(summary["files_included"]) == 6
+    output = (tmp_path / "output" / "project_context.md").read_text(encoding="utf-8")
+    assert "### File: `module_0.py`\n" in output
+    assert "### File: `module_5.py` (outline)" in output
+    assert len(output) <= 12000 + 200
+    assert "- module_5.py: did not fit in full" in "\n".join(logged)
+
+
+def test_outline_fallback_is_off_by_default(tmp_path):
+    for index in range(6):
+        write_files(tmp_path, [f"module_{str(index)}.py"], large_module(index))
+
+    events = file_events(collect_events(tmp_path, max_output_characters=12000))
+
+    assert "outline" not in {event.metadata["kind"] for event in events.values()}
+    assert len(events) < 6
@@ -0,0 +1,96 @@
+import re
+
+from helpers import generate, write_files
+
+from generate_context_markdown import STREAMING_THRESHOLD_BYTES, _pack_files_into_parts
+
+INDEX_ROW = re.compile(r"^\| `(.+)` \| (\d+) \| (\d+) \| (\d+) \|$", re.MULTILINE)
+
+
+def build_modules(root):
+    for index in range(40):
+        write_files(root, [f"dir{str(index % 5)}/module_{str(index)}.py"], "x = 1\n" * (index * 7 + 5))
+
+
+def read_parts(root, summary):
+    """The content of each part, without the closing note that the budget leaves out."""
+    return [
+        (root / part["filename"]).read_text(encoding="utf-8").split("\n---\n**This is Part")[0]
+        for part in summary["parts"]
+    ]
+
+
+def test_packed_parts_stay_within_budget_and_match_the_index(tmp_path):
+    build_modules(tmp_path)
+
+    summary = generate(tmp_path, split_output_if_truncated=True, pack_parts=True, max_output_characters=3000)
+
+    parts = read_parts(tmp_path, summary)
+    assert len(parts) > 1
+    assert all(len(part) <= 3000 for part in parts)
+    assert sorted(summary["files_included"]) == sorted(f"dir{str(i % 5)}/module_{str(i)}.py" for i in range(40))
+    rows = INDEX_ROW.findall((tmp_path / "output" / "project_context_index.md").read_text(encoding="utf-8"))
+    assert len(rows) == 40
+    for path, part_number, characters, _ in rows:
+        heading = f"### File: `{path}`"
+        assert [heading in part for part in parts].count(True) == 1
+        assert heading in parts[int(part_number) - 1]
+        assert int(characters) > len(heading)
+
+
+def test_pack_files_into_parts():
+    costs = [("a/1", 60), ("a/2", 50), ("b/1", 40), ("b/2", 30), ("c/1", 20)]
+
+    parts = _pack_files_into_parts(costs, 100, 100)
+
+    assert sorted(path for part in parts for path in part) == sorted(path for path, _ in costs)
+    assert len(parts) == 2
+    cost_by_path = dict(costs)
+    assert all(sum(cost_by_path[path] for path in part) <= 100 for part in parts)
+
+
+class GrowFileAfterMeasuring:
+    """A token estimator that appends to `path` once `trigger` has been measured."""
+
+    def __init__(self, path, trigger, extra):
+        self.path, self.trigger, self.extra = path, trigger, extra
+
+    def __call__(self, text, lang):
+        if f"### File: `{self.trigger}`" in text:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(self.extra)
+        return len(text) // 4
+
+
+def test_emitted_blocks_are_the_measured_ones(tmp_path):
+    build_modules(tmp_path)
+    original = (tmp_path / "dir0" / "module_0.py").read_text(encoding="utf-8")
+    # module_0 grows after every file was measured (dir4 sorts last)
+    estimator = GrowFileAfterMeasuring(tmp_path / "dir0" / "module_0.py", "dir4/module_39.py", "y = 2\n" * 2000)
+
+    summary = generate(
+        tmp_path, split_output_if_truncated=True, pack_parts=True, max_output_characters=3000, token_estimator=estimator
+    )
+
+    parts = read_parts(tmp_path, summary)
+    assert all(len(part) <= 3000 for part in parts)
+    assert "y = 2" not in "".join(parts)
+    assert any(original.strip() in part for part in parts)
+
+
+def test_streamed_file_that_changed_is_replaced_by_a_placeholder(tmp_path):
+    big_content = "line of text\n" * (STREAMING_THRESHOLD_BYTES // 13 + 10)
+    write_files(tmp_path, ["a_big.txt"], big_content)
+    write_files(tmp_path, ["b.py"], "x = 1\n")
+    budget = 2 * STREAMING_THRESHOLD_BYTES
+    estimator = GrowFileAfterMeasuring(tmp_path / "a_big.txt", "b.py", "more text\n" * 200000)
+
+    summary = generate(
+        tmp_path, split_output_if_truncated=True, pack_parts=True, max_output_characters=budget, token_estimator=estimator
+    )
+
+    output = "".join(read_parts(tmp_path, summary))
+    assert len(output) <= budget
+    assert "more text" not in output
+    assert "[Content not included: File changed while the output was generated]" in output
+    assert any("a_big.txt" in warning for warning in summary["warnings"])
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import pytest
+from helpers import generate, read_outputs, remove_outputs, requires_git, write_files
+
+from generate_context_markdown import STREAMING_THRESHOLD_BYTES
+
+pytestmark = requires_git
+
+
+def build_project(root: Path) -> None:
+    for index in range(120):
+        body = "".join(f"def function_{str(index)}_{str(n)}():\n    return {str(n)}\n\n" for n in range(index % 17 + 1))
+        write_files(root, [f"pkg{str(index % 7)}/module_{str(index)}.py"], f"# Copyright Example\n# MIT License\n{body}")
+    write_files(root, ["copies/one.py", "copies/two.py"], "VALUE = 1\n" * 50)
+    write_files(root, ["data/config.json"], '{"a": [1, 2, 3], "b": {"c": true}}\n')
+    write_files(root, ["docs/guide.md"], "# Guide\n\nSome text.\n")
+    (root / "data" / "blob.bin").write_bytes(bytes(range(256)) * 8)
+    (root / "data" / "big.txt").write_text("line of text\n" * (STREAMING_THRESHOLD_BYTES // 13 + 10), encoding="utf-8")
+
+
+@pytest.mark.parametrize("options", [
+    dict(split_output_if_truncated=True, max_output_characters=40000),
+    dict(split_output_if_truncated=True, max_output_tokens=15000, outline_fallback=True),
+    dict(split_output_if_truncated=True, max_output_characters=40000, pack_parts=True, deduplicate=True),
+    dict(max_output_characters=60000, render_mode="compact", deduplicate=True),
+    dict(output_format="jsonl", deduplicate=True, outline_threshold_bytes=2000),
+], ids=["split", "tokens_outline", "packed_dedup", "compact_truncated", "jsonl"])
+def test_parallel_output_matches_serial_output(tmp_path, options):
+    build_project(tmp_path)
+    outputs = {}
+    for workers in (1, 4):
+        generate(tmp_path, workers=workers, **options)
+        outputs[workers] = read_outputs(tmp_path)
+        remove_outputs(tmp_path)
+
+    assert outputs[1]
+    assert outputs[4] == outputs[1]
@@ -0,0 +1,78 @@
+import random
+
+from helpers import collect_events, file_events, generate, write_files
+
+from generate_context_markdown import STREAMING_THRESHOLD_BYTES, StreamedFileBlock, _StrippedPartWriter
+
+
+def test_writer_output_matches_stripping_the_concatenation(tmp_path):
+    rng = random.Random(0)
+    pieces = ["\n\n", "  ", "### File: `a.py`\n\n```python\nx = 1\n```\n\n", "text", " \n", "\t", "", "ünïcode\n", "\n"]
+    for attempt in range(50):
+        chosen = [rng.choice(pieces) for _ in range(rng.randint(0, 12))]
+        path = tmp_path / f"part_{str(attempt)}.md"
+        writer = _StrippedPartWriter(path)
+        for piece in chosen:
+            writer.write(piece)
+        writer.close()
+
+        expected = "".join(chosen).strip()
+        assert path.read_text(encoding="utf-8") == expected
+        assert writer.characters_written == len(expected)
+        assert writer.bytes_written == path.stat().st_size
+
+
+def test_write_block_offsets_cover_each_block(tmp_path):
+    streamed_path = tmp_path / "big.txt"
+    streamed_path.write_text("streamed line\n" * 1000, encoding="utf-8")
+    blocks = [
+        "### File: `a.py`\n\n```python\nprint('é')\n```\n\n",
+        StreamedFileBlock("### File: `big.txt`\n\n```text\n", streamed_path, "\n```\n\n"),
+        "### File: `b.py`\n\n```python\npass\n```\n\n",
+    ]
+    path = tmp_path / "part.md"
+    writer = _StrippedPartWriter(path)
+    writer.write("# Header\n\n")
+    offsets = [writer.write_block(block) for block in blocks]
+    writer.close()
+
+    data = path.read_bytes()
+    for block, (start, end) in zip(blocks, offsets):
+        text = block if isinstance(block, str) else block.header + streamed_path.read_text(encoding="utf-8") + block.footer
+        assert data[start:end].decode("utf-8") == text.strip()
+
+
+def test_unchanged_part_is_left_untouched(tmp_path):
+    path = tmp_path / "part.md"
+    first = _StrippedPartWriter(path, volatile_text="12:00")
+    first.write("Generated at 12:00\n\nbody\n")
+    first.close()
+    path.write_text("Generated at 12:00\n\nbody", encoding="utf-8")
+    mtime_ns = path.stat().st_mtime_ns
+
+    # Only the volatile text changed
+    second = _StrippedPartWriter(path, previous_digest=first.digest, volatile_text="12:05")
+    second.write("Generated at 12:05\n\nbody\n")
+    second.close()
+    assert second.is_unchanged
+    assert path.stat().st_mtime_ns == mtime_ns
+    assert not (tmp_path / "part.md.tmp").exists()
+
+    third = _StrippedPartWriter(path, previous_digest=first.digest, volatile_text="12:10")
+    third.write("Generated at 12:10\n\nnew body\n")
+    third.close()
+    assert not third.is_unchanged
+    assert path.read_text(encoding="utf-8") == "Generated at 12:10\n\nnew body"
+
+
+def test_large_file_is_streamed_verbatim(tmp_path):
+    content = "".join(f"line {str(n)} of a large file\n" for n in range(STREAMING_THRESHOLD_BYTES // 20))
+    write_files(tmp_path, ["big.txt"], content)
+    write_files(tmp_path, ["small.py"], "x = 1\n")
+
+    events = file_events(collect_events(tmp_path, max_output_characters=4 * STREAMING_THRESHOLD_BYTES))
+    assert isinstance(events["big.txt"].text, StreamedFileBlock)
+    assert isinstance(events["small.py"].text, str)
+
+    generate(tmp_path, max_output_characters=4 * STREAMING_THRESHOLD_BYTES)
+    assert content in (tmp_path / "output" / "project_context.md").read_text(encoding="utf-8")
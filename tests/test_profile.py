@@ -0,0 +1,75 @@
+import json
+
+from helpers import generate
+
+from generate_context_markdown import PROFILE_REPORT_VERSION, SNIFF_BYTES, STREAMING_THRESHOLD_BYTES
+
+
+def profile_of(root, **options):
+    return generate(root, profile=True, **options)["profile_report"]
+
+
+def test_report_is_written_with_counts(tmp_path):
+    (tmp_path / "a.py").write_text("a = 1\n", encoding="utf-8")
+    (tmp_path / "b.py").write_text("b = 2\n", encoding="utf-8")
+
+    report = profile_of(tmp_path)
+
+    assert report["version"] == PROFILE_REPORT_VERSION
+    assert report == json.loads((tmp_path / "output" / "project_context.profile.json").read_text(encoding="utf-8"))
+    assert report["counts"]["eligible_files"] == 2
+    assert report["counts"]["files_included"] == 2
+    assert report["counts"]["parts"] == 1
+    assert {"setup", "enumerate", "render_and_write", "summary"} <= set(report["phase_seconds"])
+    assert report["bytes_written"] == sum(
+        path.stat().st_size for path in (tmp_path / "output").glob("project_context*.md")
+    )
+    assert [entry["path"] for entry in report["largest_files"]] == ["a.py", "b.py"]
+
+
+def test_small_files_are_read_once(tmp_path):
+    (tmp_path / "a.py").write_text("a = 1\n", encoding="utf-8")
+    (tmp_path / "b.py").write_text("b" * (SNIFF_BYTES * 2), encoding="utf-8")
+
+    # The sniffed bytes of a small file are its whole content
+    assert profile_of(tmp_path)["bytes_read"] == 6 + SNIFF_BYTES * 2 + SNIFF_BYTES
+
+
+def test_placeholders_count_only_what_was_read(tmp_path):
+    (tmp_path / "image.py").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(SNIFF_BYTES * 4))
+    (tmp_path / "big.py").write_text("x" * (SNIFF_BYTES * 4), encoding="utf-8")
+
+    assert profile_of(tmp_path, max_file_bytes=SNIFF_BYTES * 2)["bytes_read"] == SNIFF_BYTES * 2
+    # A truncated preview is read again after the sniff
+    truncated = profile_of(tmp_path, max_file_bytes=SNIFF_BYTES * 2, truncate_large_files=True)
+    assert truncated["bytes_read"] == SNIFF_BYTES * 2 + SNIFF_BYTES * 2
+
+
+def test_streamed_files_count_the_scan_and_the_copy(tmp_path):
+    size = STREAMING_THRESHOLD_BYTES + 10
+    (tmp_path / "large.py").write_text("x" * size, encoding="utf-8")
+
+    report = profile_of(tmp_path, max_output_characters=4 * STREAMING_THRESHOLD_BYTES)
+
+    assert report["bytes_read"] == SNIFF_BYTES + size + size
+
+
+def test_packed_measuring_pass_is_counted_once(tmp_path):
+    for index in range(6):
+        (tmp_path / f"f{str(index)}.py").write_text(f"value_{str(index)} = {'1' * 200}\n", encoding="utf-8")
+
+    report = profile_of(tmp_path, max_output_characters=800, split_output_if_truncated=True, pack_parts=True)
+
+    assert report["counts"]["parts"] > 1
+    assert report["bytes_read"] == sum(path.stat().st_size for path in tmp_path.glob("f*.py"))
+
+
+def test_warm_cache_reads_nothing(tmp_path):
+    (tmp_path / "a.py").write_text("a = 1\n", encoding="utf-8")
+    (tmp_path / "b.py").write_text("b = 2\n", encoding="utf-8")
+    profile_of(tmp_path, use_cache=True)
+
+    report = profile_of(tmp_path, use_cache=True)
+
+    assert report["counts"]["cache_hits"] == 2
+    assert report["bytes_read"] == 0
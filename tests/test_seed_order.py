@@ -0,0 +1,75 @@
+from helpers import collect_events, write_files
+
+from generate_context_markdown import _order_by_dependency_distance
+
+FILES = {
+    "pkg/__init__.py": "",
+    "pkg/app.py": "from pkg import service\n",
+    "pkg/service.py": "from . import util\n",
+    "pkg/util.py": "import os\n",
+    "pkg/cli.py": "import pkg.app\n",
+    "tools/script.py": "from pkg.cli import main\n",
+    "web/index.js": "import { api } from './api';\n",
+    "web/api.js": "export const api = 1;\n",
+    "aaa_unrelated.py": "x = 1\n",
+}
+
+
+def build_project(root):
+    for path, content in FILES.items():
+        write_files(root, [path], content)
+
+
+def file_order(events):
+    return [event.metadata["path"] for event in events if event.kind == "file"]
+
+
+def test_files_follow_dependency_distance_from_the_seeds(tmp_path):
+    build_project(tmp_path)
+
+    order = file_order(collect_events(tmp_path, seed_paths=["pkg/app.py"]))
+
+    assert order[:3] == ["pkg/app.py", "pkg/service.py", "pkg/util.py"]
+    # Then the files that import the seed, nearest first, then the rest in path order
+    assert order[3:5] == ["pkg/cli.py", "tools/script.py"]
+    assert order[5:] == sorted(order[5:])
+
+
+def test_directory_seeds_and_javascript_imports(tmp_path):
+    build_project(tmp_path)
+
+    order = file_order(collect_events(tmp_path, seed_paths=["web/"]))
+
+    assert order[:2] == ["web/api.js", "web/index.js"]
+
+
+def test_budget_is_spent_on_related_files_first(tmp_path):
+    build_project(tmp_path)
+    for index in range(20):
+        write_files(tmp_path, [f"aab_filler_{str(index)}.py"], "y = 2\n" * 100)
+
+    events = collect_events(tmp_path, seed_paths=["pkg/app.py"], max_output_characters=4000)
+
+    included = file_order(events)
+    assert included[:3] == ["pkg/app.py", "pkg/service.py", "pkg/util.py"]
+    # Unrelated files sort before the seeds alphabetically, but only fill what is left
+    assert 0 < len([path for path in included if path.startswith("aab_filler")]) < 20
+
+
+def test_unmatched_seeds_are_reported(tmp_path):
+    build_project(tmp_path)
+
+    events = collect_events(tmp_path, seed_paths=["missing.py"])
+
+    assert file_order(events) == sorted(file_order(events))
+    assert "No eligible files matched the seed paths: missing.py" in events[-1].metadata["warnings"]
+
+
+def test_order_by_dependency_distance():
+    graph = {"a": ["b"], "b": ["c"], "d": ["a"], "e": []}
+
+    order, distances = _order_by_dependency_distance(["a", "b", "c", "d", "e", "f"], graph, ["a"])
+
+    assert order == ["a", "b", "c", "d", "e", "f"]
+    assert distances == {"a": 0, "b": 1, "c": 2}
+    assert _order_by_dependency_distance(["a", "b", "c", "d", "e"], graph, ["c"])[0] == ["c", "b", "a", "d", "e"]
@@ -0,0 +1,91 @@
+import json
+
+from helpers import generate, write_files
+
+from generate_context_markdown import SIDECAR_INDEX_VERSION, STREAMING_THRESHOLD_BYTES
+
+FILES = {
+    "a.py": "a = 1\n" * 40,
+    "café.py": "name = 'café ☕'\n",
+    "copy.py": "a = 1\n" * 40,
+    "image.bin": None,
+    "large.txt": "x" * (STREAMING_THRESHOLD_BYTES + 10) + "\n",
+}
+
+
+def write_project(root):
+    for path, content in FILES.items():
+        if content is None:
+            (root / path).write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(64))
+        else:
+            (root / path).write_text(content, encoding="utf-8")
+
+
+def read_sidecar(root, output_format="markdown"):
+    stem = "project_context"
+    sidecar = json.loads((root / "output" / f"{stem}.index.json").read_text(encoding="utf-8"))
+    assert sidecar["version"] == SIDECAR_INDEX_VERSION
+    assert sidecar["format"] == output_format
+    return sidecar["files"]
+
+
+def read_slice(root, entry):
+    with open(root / entry["file"], "rb") as f:
+        f.seek(entry["offset"])
+        return f.read(entry["length"]).decode("utf-8")
+
+
+def test_markdown_offsets_seek_to_the_blocks(tmp_path):
+    write_project(tmp_path)
+    generate(tmp_path, write_sidecar_index=True, deduplicate=True, max_output_characters=4 * STREAMING_THRESHOLD_BYTES)
+
+    entries = {entry["path"]: entry for entry in read_sidecar(tmp_path)}
+
+    assert set(entries) == set(FILES)
+    for path, entry in entries.items():
+        block = read_slice(tmp_path, entry)
+        assert block.startswith(f"### File: `{path}`")
+        assert block == block.rstrip()
+    assert read_slice(tmp_path, entries["café.py"]).endswith("name = 'café ☕'\n\n```")
+    assert FILES["large.txt"].strip() in read_slice(tmp_path, entries["large.txt"])
+    assert {path: entry["kind"] for path, entry in entries.items()} == {
+        "a.py": "full", "café.py": "full", "copy.py": "duplicate", "image.bin": "placeholder", "large.txt": "full",
+    }
+    assert entries["a.py"]["lang"] == "python"
+    assert entries["a.py"]["sha256"] == entries["copy.py"]["sha256"]
+
+
+def test_offsets_follow_the_blocks_into_later_parts(tmp_path):
+    write_files(tmp_path, [f"f{str(index)}.py" for index in range(8)], "value = '" + "v" * 300 + "'\n")
+    generate(tmp_path, write_sidecar_index=True, max_output_characters=1200, split_output_if_truncated=True)
+
+    entries = read_sidecar(tmp_path)
+
+    assert len({entry["file"] for entry in entries}) > 1
+    assert len(entries) == 8
+    for entry in entries:
+        assert read_slice(tmp_path, entry).startswith(f"### File: `{entry['path']}`")
+
+
+def test_jsonl_records_and_offsets(tmp_path):
+    write_project(tmp_path)
+    generate(tmp_path, output_format="jsonl", write_sidecar_index=True, deduplicate=True)
+
+    lines = (tmp_path / "output" / "project_context.jsonl").read_text(encoding="utf-8").splitlines()
+    records = [json.loads(line) for line in lines]
+    entries = read_sidecar(tmp_path, "jsonl")
+
+    assert records[0]["type"] == "preamble"
+    assert records[0]["project_name"] == "Test"
+    assert [record["type"] for record in records[1:]] == ["file"] * len(FILES)
+    by_path = {record["path"]: record for record in records[1:]}
+    assert by_path["café.py"]["content"] == FILES["café.py"]
+    assert by_path["large.txt"]["content"] == FILES["large.txt"]
+    assert by_path["copy.py"]["kind"] == "duplicate"
+    assert by_path["image.bin"]["kind"] == "placeholder"
+    # Each record is found from its sidecar entry without reading the ones before it
+    for entry in entries:
+        record = json.loads(read_slice(tmp_path, entry))
+        assert record == by_path[entry["path"]]
+        assert record["sha256"] == entry["sha256"]
+        assert record["tokens"] == entry["tokens"]
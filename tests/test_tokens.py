@@ -0,0 +1,54 @@
+from helpers import collect_events, file_events, generate, write_files
+
+from generate_context_markdown import _token_estimator_key, estimate_tokens
+
+
+def one_token_per_line(text, lang):
+    return text.count("\n") + 1
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    # Every non-ASCII character counts as about one token
+    assert estimate_tokens("é" * 10) == 10
+    spaced = "value = compute(a, b)\n" * 20
+    dense = "QUJDREVGR0hJSktMTU5PUFFSU1RVVldYWVo" * 13
+    assert estimate_tokens(dense[:len(spaced)]) > estimate_tokens(spaced[:len(dense)])
+    assert estimate_tokens(spaced, "python") != estimate_tokens(spaced, "json")
+
+
+def test_parts_stay_within_the_token_budget(tmp_path):
+    for index in range(30):
+        write_files(tmp_path, [f"pkg/module_{str(index)}.py"], f"def f_{str(index)}():\n    return {str(index)}\n" * 20)
+
+    summary = generate(tmp_path, split_output_if_truncated=True, max_output_tokens=1500)
+
+    assert len(summary["parts"]) > 1
+    assert all(part["tokens"] <= 1500 for part in summary["parts"])
+    assert len(summary["files_included"]) == 30
+
+
+def test_custom_estimator_counts_every_block(tmp_path):
+    write_files(tmp_path, ["a.py", "b.py"], "x = 1\ny = 2\n")
+
+    events = file_events(collect_events(tmp_path, token_estimator=one_token_per_line))
+
+    assert len(events) == 2
+    for event in events.values():
+        assert event.metadata["tokens"] == one_token_per_line(event.text, "python")
+
+
+def test_cached_counts_are_not_reused_for_anonymous_estimators(tmp_path):
+    write_files(tmp_path, ["a.py", "b.py"], "x = 1\n")
+
+    # Both lambdas have the same name; the second must not reuse the first one's counts
+    for tokens_per_block in (1, 1000):
+        events = file_events(collect_events(tmp_path, use_cache=True, token_estimator=lambda text, lang: tokens_per_block))
+        assert {event.metadata["tokens"] for event in events.values()} == {tokens_per_block}
+
+
+def test_token_estimator_key():
+    assert _token_estimator_key(estimate_tokens) == "generate_context_markdown.estimate_tokens"
+    assert _token_estimator_key(one_token_per_line).endswith(".one_token_per_line")
+    assert _token_estimator_key(lambda text, lang: 1) is None
+    assert _token_estimator_key(str.count) is None
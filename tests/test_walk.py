@@ -0,0 +1,68 @@
+import os
+
+import pytest
+from helpers import collect_events, file_events, init_repo, requires_git, run_git, write_files
+
+from generate_context_markdown import _walk_project
+
+TREE_FILES = [
+    "app.py", "debug.log", "src/main.py", "src/cache/data.py", "build/out.js",
+    "node_modules/pkg/index.js", "docs/guide.md", "docs/api/reference.md", "docs/notes.txt",
+    "vendor/docs/readme.md", "vendor/lib.py", "pkg/inner/module.py", "pkg/inner/generated.py",
+]
+GITIGNORE = "*.log\ncache/\n/build/\nnode_modules/\nvendor/\ngenerated.py\n"
+
+
+def build_tree(root):
+    write_files(root, TREE_FILES)
+    (root / ".gitignore").write_text(GITIGNORE, encoding="utf-8")
+
+
+@requires_git
+def test_walked_files_agree_with_git(tmp_path):
+    init_repo(tmp_path)
+    build_tree(tmp_path)
+    git_files = run_git(tmp_path, "ls-files", "--others", "--exclude-standard", "-z").decode("utf-8").split("\0")
+
+    events = collect_events(tmp_path, exclude_folders=[".git"], doc_folders=[])
+
+    assert sorted(file_events(events)) == sorted(path for path in git_files if path)
+
+
+def test_ignored_directories_are_pruned(tmp_path):
+    build_tree(tmp_path)
+    asked = []
+
+    def should_ignore(path, is_dir):
+        asked.append(path)
+        return path in ("node_modules", "vendor", "src/cache")
+
+    code_files, doc_files = _walk_project(tmp_path, should_ignore, [])
+
+    assert not any(path.startswith(("node_modules/", "vendor/", "src/cache/")) for path in asked)
+    assert "src/main.py" in code_files and "vendor/lib.py" not in code_files
+    assert doc_files == []
+
+
+def test_doc_folders_are_collected_even_inside_ignored_folders(tmp_path):
+    build_tree(tmp_path)
+
+    code_files, doc_files = _walk_project(
+        tmp_path, lambda path, is_dir: path in ("docs", "vendor"), ["docs", "vendor/docs", "missing"]
+    )
+
+    assert doc_files == ["docs/api/reference.md", "docs/guide.md", "vendor/docs/readme.md"]
+    # Only Markdown files of the doc folders are collected from ignored folders
+    assert not any(path.startswith(("docs/", "vendor/")) for path in code_files)
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="symlinks are not supported")
+def test_symlinked_directories_are_not_followed(tmp_path):
+    build_tree(tmp_path)
+    os.symlink("src", tmp_path / "alias")
+    os.symlink("app.py", tmp_path / "link.py")
+
+    code_files, _ = _walk_project(tmp_path, lambda path, is_dir: False, [])
+
+    assert "link.py" in code_files
+    assert not any(path.startswith("alias/") for path in code_files)
@@ -0,0 +1,71 @@
+from helpers import generate, write_files
+
+import watch_context_generator
+from generate_context_markdown import GenerationState
+
+
+def test_regeneration_only_rewrites_what_changed(tmp_path):
+    write_files(tmp_path, ["a.py", "pkg/b.py"], "x = 1\n")
+    state = GenerationState()
+
+    first = generate(tmp_path, state=state)
+    assert first["written_files"] == ["output/project_context.md"]
+    assert state.file_lists == (["a.py", "pkg/b.py"], [])
+    assert {"a.py", "pkg/b.py"} <= set(state.content_paths)
+    assert {"", "pkg"} <= state.tree_paths
+
+    unchanged = generate(tmp_path, state=state)
+    assert unchanged["written_files"] == []
+    assert unchanged["unchanged_files"] == ["output/project_context.md"]
+
+    write_files(tmp_path, ["pkg/b.py"], "x = 'changed'\n")
+    changed = generate(tmp_path, state=state)
+    assert changed["written_files"] == ["output/project_context.md"]
+    assert "x = 'changed'" in (tmp_path / "output" / "project_context.md").read_text(encoding="utf-8")
+    # The in-memory cache is kept; nothing is written next to the output
+    assert not (tmp_path / "output" / "project_context.cache.json").exists()
+
+
+def test_new_files_are_found_after_invalidate_tree(tmp_path):
+    write_files(tmp_path, ["a.py"], "x = 1\n")
+    state = GenerationState()
+    generate(tmp_path, state=state)
+
+    write_files(tmp_path, ["new.py"], "y = 2\n")
+    assert "new.py" not in generate(tmp_path, state=state)["files_included"]
+    state.invalidate_tree()
+    assert "new.py" in generate(tmp_path, state=state)["files_included"]
+
+
+def test_take_snapshot_sees_content_changes(tmp_path, monkeypatch):
+    write_files(tmp_path, ["a.py"], "x = 1\n")
+    state = GenerationState()
+    generate(tmp_path, state=state)
+    monkeypatch.setattr(watch_context_generator, "project_root", tmp_path)
+
+    before = watch_context_generator.take_snapshot(state)
+    assert before == watch_context_generator.take_snapshot(state)
+    write_files(tmp_path, ["a.py"], "x = 12\n")
+    after = watch_context_generator.take_snapshot(state)
+
+    assert after[1]["a.py"] != before[1]["a.py"]
+    assert after[0] == before[0]
+
+
+def test_regenerate_reports_rewritten_files_and_new_warnings(monkeypatch, capsys):
+    summaries = iter([
+        {"written_files": ["output/project_context.md"], "warnings": ["first"]},
+        {"written_files": [], "warnings": ["first", "second"]},
+    ])
+    monkeypatch.setattr(watch_context_generator, "run_generation", lambda state: next(summaries))
+    monkeypatch.setattr(watch_context_generator, "reported_warnings", set())
+
+    watch_context_generator.regenerate(GenerationState(), "a.py changed")
+    first = capsys.readouterr().out
+    watch_context_generator.regenerate(GenerationState(), "b.py changed")
+    second = capsys.readouterr().out
+
+    assert "a.py changed: regenerated in" in first and "(1 file(s) rewritten)" in first
+    assert "[Warning] first" in first
+    assert "(0 file(s) rewritten)" in second
+    assert "[Warning] first" not in second and "[Warning] second" in second
@@ -0,0 +1,259 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import run_context_generator as config
+from generate_context_markdown import GenerationState, generate_context_markdown
+
+# --- Watch Configuration ---
+# The project options are taken from run_context_generator.py.
+
+# Seconds between two checks for changes when inotify is not available.
+POLL_INTERVAL_SECONDS = 0.5
+
+# Seconds to wait for more changes after the first one, so that an editor's
+# burst of writes (temp file, rename, chmod) leads to a single regeneration.
+DEBOUNCE_SECONDS = 0.05
+
+# Whether to use inotify on Linux instead of polling. Falls back to polling
+# automatically if inotify cannot be loaded.
+USE_INOTIFY = True
+
+# --------------------------------------
+
+# inotify event masks (see `man 7 inotify`)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+TREE_EVENTS = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF
+WATCH_MASK = TREE_EVENTS | IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE
+EVENT_HEADER = struct.Struct("iIII")
+
+project_root = Path(__file__).parent.parent
+# run_context_generator.py keeps the default output filename; events for it are ours
+output_stem = Path("output/project_context.md").stem
+
+
+def run_generation(state: GenerationState) -> Dict[str, Any]:
+    """Regenerates the context quietly with the options of run_context_generator.py."""
+    return generate_context_markdown(
+        project_name=config.PROJECT_NAME,
+        optional_docs=config.OPTIONAL_DOCS_TO_INCLUDE,
+        doc_folders=config.DOC_FOLDERS_TO_SCAN,
+        exclude_files=config.FILES_TO_EXCLUDE,
+        exclude_folders=config.FOLDERS_TO_EXCLUDE,
+        max_output_characters=config.MAX_CHARACTERS,
+        split_output_if_truncated=config.SPLIT_FILES,
+        use_cache=config.USE_CACHE,
+        workers=config.WORKERS,
+        max_output_tokens=config.MAX_TOKENS,
+        pack_parts=config.PACK_PARTS,
+        file_source=config.FILE_SOURCE,
+        deduplicate=config.DEDUPLICATE,
+        seed_paths=config.SEED_PATHS,
+        render_mode=config.RENDER_MODE,
+        strip_comments=config.STRIP_COMMENTS,
+        outline_fallback=config.OUTLINE_FALLBACK,
+        outline_threshold_bytes=config.OUTLINE_THRESHOLD_BYTES,
+        max_file_bytes=config.MAX_FILE_BYTES,
+        truncate_large_files=config.TRUNCATE_LARGE_FILES,
+        auto_exclude=config.AUTO_EXCLUDE,
+        write_sidecar_index=config.WRITE_SIDECAR_INDEX,
+        output_format=config.OUTPUT_FORMAT,
+        state=state,
+        log=lambda message: None
+    )
+
+
+# Warnings of the previous regeneration; only new ones are printed again
+reported_warnings: set = set()
+
+
+def regenerate(state: GenerationState, reason: str) -> None:
+    """Regenerates and prints a one-line report, followed by any new warnings."""
+    global reported_warnings
+    start_time = time.perf_counter()
+    summary = run_generation(state)
+    elapsed = time.perf_counter() - start_time
+    print(f"[{time.strftime('%H:%M:%S')}] {reason}: regenerated in {elapsed:.2f}s ({str(len(summary['written_files']))} file(s) rewritten).")
+    for warning in summary["warnings"]:
+        if warning not in reported_warnings:
+            print(f"  [Warning] {warning}")
+    reported_warnings = set(summary["warnings"])
+
+
+def take_snapshot(state: GenerationState) -> Tuple[Dict[str, int], Dict[str, Tuple[int, int]]]:
+    """
+    Stats the watched paths of `state`.
+
+    Returns:
+        Tuple[Dict[str, int], Dict[str, Tuple[int, int]]]: The mtime of every
+        tree path, and the (size, mtime) of every content path (-1 if missing).
+    """
+    tree_mtimes = {}
+    for path_str in state.tree_paths:
+        try:
+            tree_mtimes[path_str] = os.stat(os.path.join(project_root, path_str)).st_mtime_ns
+        except OSError:
+            tree_mtimes[path_str] = -1
+    content_stats = {}
+    for path_str in state.content_paths:
+        try:
+            file_stat = os.stat(os.path.join(project_root, path_str))
+            content_stats[path_str] = (file_stat.st_size, file_stat.st_mtime_ns)
+        except OSError:
+            content_stats[path_str] = (-1, -1)
+    return tree_mtimes, content_stats
+
+
+def watch_by_polling(state: GenerationState) -> None:
+    """Regenerates whenever a polled directory mtime or file stat changes."""
+    print(f"Watching {str(len(state.tree_paths))} directories and {str(len(state.content_paths))} files by polling every {POLL_INTERVAL_SECONDS}s.")
+    tree_mtimes, content_stats = take_snapshot(state)
+    while True:
+        time.sleep(POLL_INTERVAL_SECONDS)
+        current_tree_mtimes, current_content_stats = take_snapshot(state)
+        if current_tree_mtimes == tree_mtimes and current_content_stats == content_stats:
+            continue
+        time.sleep(DEBOUNCE_SECONDS)
+        changed_files = [p for p, s in current_content_stats.items() if content_stats.get(p) != s]
+        is_tree_changed = current_tree_mtimes != tree_mtimes or any(Path(p).name == ".gitignore" for p in changed_files)
+        if is_tree_changed:
+            state.invalidate_tree()
+        regenerate(state, "Files added or removed" if is_tree_changed else f"{str(len(changed_files))} file(s) changed")
+        # Directory mtimes are taken after the run so that writing the output
+        # does not count as a change; file stats keep the values seen before
+        # the run, so edits made while it ran trigger another one.
+        tree_mtimes, content_stats = take_snapshot(state)
+        content_stats.update({p: s for p, s in current_content_stats.items() if p in content_stats})
+
+
+class InotifyWatcher:
+    """A minimal ctypes binding of Linux inotify that watches a set of directories."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watched_dirs: Dict[int, str] = {} # Watch descriptor -> relative directory
+
+    def watch(self, relative_dirs) -> None:
+        """Adds watches for directories that are not watched yet."""
+        already_watched = set(self.watched_dirs.values())
+        for relative_dir in relative_dirs:
+            if relative_dir in already_watched:
+                continue
+            watch_descriptor = self._add_watch(self.fd, os.fsencode(os.path.join(project_root, relative_dir)), WATCH_MASK)
+            if watch_descriptor >= 0:
+                self.watched_dirs[watch_descriptor] = relative_dir
+
+    def read_changes(self, timeout: Optional[float]) -> Tuple[set, bool]:
+        """
+        Waits up to `timeout` seconds for events.
+
+        Returns:
+            Tuple[set, bool]: The relative paths that changed, and whether a
+            file or directory was added, removed or renamed (or events were lost).
+        """
+        changed_paths = set()
+        is_tree_changed = False
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed_paths, is_tree_changed
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                watch_descriptor, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + name_length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+                offset += EVENT_HEADER.size + name_length
+                if mask & IN_Q_OVERFLOW:
+                    is_tree_changed = True
+                    continue
+                if output_stem in name:
+                    continue # Our own output files
+                relative_dir = self.watched_dirs.get(watch_descriptor)
+                if relative_dir is None:
+                    continue
+                if mask & IN_DELETE_SELF:
+                    del self.watched_dirs[watch_descriptor]
+                relative_path = f"{relative_dir}/{name}" if relative_dir else name
+                changed_paths.add(relative_path)
+                if mask & TREE_EVENTS or name in ("", ".gitignore"):
+                    # An empty name is an event on a watched path itself, e.g. the Git index
+                    is_tree_changed = True
+        return changed_paths, is_tree_changed
+
+
+def watched_paths(state: GenerationState) -> set:
+    """The tree paths plus the directories of all content paths."""
+    return state.tree_paths | {os.path.dirname(p) for p in state.content_paths}
+
+
+def watch_with_inotify(state: GenerationState, watcher: InotifyWatcher) -> None:
+    """Regenerates whenever inotify reports a change in a watched directory."""
+    watcher.watch(watched_paths(state))
+    watched_content = set(state.content_paths)
+    print(f"Watching {str(len(watcher.watched_dirs))} directories with inotify.")
+    while True:
+        changed_paths, is_tree_changed = watcher.read_changes(None)
+        # Collect the rest of an editor's burst of events
+        while True:
+            more_paths, more_tree_changes = watcher.read_changes(DEBOUNCE_SECONDS)
+            if not more_paths and not more_tree_changes:
+                break
+            changed_paths |= more_paths
+            is_tree_changed = is_tree_changed or more_tree_changes
+        changed_files = [p for p in changed_paths if p in watched_content]
+        if not is_tree_changed and not changed_files:
+            continue # Only ignored files changed
+        if is_tree_changed:
+            state.invalidate_tree()
+        regenerate(state, "Files added or removed" if is_tree_changed else f"{str(len(changed_files))} file(s) changed")
+        watcher.watch(watched_paths(state))
+        watched_content = set(state.content_paths)
+
+
+if __name__ == "__main__":
+    """
+    Generates the AI context once, then keeps the file list, .gitignore rules and
+    rendered blocks in memory and regenerates whenever a watched file changes.
+    Only the part files whose content changed are rewritten. Stop with Ctrl+C.
+    """
+    print("--- Starting AI Context Watch Mode ---")
+    generation_state = GenerationState()
+    regenerate(generation_state, "Initial generation")
+
+    inotify_watcher = None
+    if USE_INOTIFY and sys.platform.startswith("linux"):
+        try:
+            inotify_watcher = InotifyWatcher()
+        except (OSError, AttributeError):
+            print("  [Warning] inotify is not available; falling back to polling.")
+
+    try:
+        if inotify_watcher is not None:
+            watch_with_inotify(generation_state, inotify_watcher)
+        else:
+            watch_by_polling(generation_state)
+    except KeyboardInterrupt:
+        print("\n--- AI Context Watch Mode Stopped ---")